@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+# Startup budget for the CLI. Each case runs a real command under
+# `python -X importtime` and fails when its imports take longer than the
+# budget (median of --runs) or when it loads a module it should never need.
+# The module checks catch most regressions on any machine; the budgets are
+# generous for a laptop and are scaled with --scale on slower hosts.
+#
+#   python benchmarks/startup.py
+#   python benchmarks/startup.py --runs 10 --scale 2
+import argparse
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CLI = os.path.join(ROOT, 'cli.py')
+
+PROBING = ('asyncio', 'mtu_diagnostics.core.tcp_probe', 'mtu_diagnostics.core.tracepath')
+PACKAGE = ('psutil', 'sqlite3', 'mtu_diagnostics.core', 'mtu_diagnostics.diagnostics')
+
+# (name, argv, budget in ms, modules that must not be imported, forwarded)
+CASES = [
+    ('help', ['--help'], 90, PACKAGE + PROBING + ('mtu_diagnostics.utils.ratelimit',), False),
+    ('interfaces', ['interfaces', '--format', 'json'], 140,
+     PROBING + ('sqlite3', 'mtu_diagnostics.diagnostics.analyzer'), False),
+    ('detect', ['detect', '--format', 'json'], 140,
+     PROBING + ('sqlite3', 'mtu_diagnostics.diagnostics.analyzer'), False),
+    ('cache', ['cache', '--format', 'json'], 110, PROBING + ('psutil', 'mtu_diagnostics.core'), False),
+    ('forwarded test', ['test', '192.0.2.1', '--format', 'json'], 90, PACKAGE + PROBING, True),
+]
+
+def serve_stub(path):
+    # Answers every forwarded command at once, so only the client is measured
+    server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    server.bind(path)
+    server.listen(16)
+    
+    def loop():
+        while True:
+            try:
+                conn, _ = server.accept()
+            except OSError:
+                return
+            with conn:
+                conn.makefile('rb').readline()
+                conn.sendall(json.dumps({'stdout': '{}\n', 'stderr': '', 'exit_code': 0}).encode() + b'\n')
+    
+    threading.Thread(target=loop, daemon=True).start()
+    return server
+
+def measure(argv, env):
+    # Total import time in ms and the modules imported
+    proc = subprocess.run([sys.executable, '-X', 'importtime', CLI] + argv, env=env, cwd=ROOT,
+                          stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True)
+    total = 0
+    modules = set()
+    for line in proc.stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        if not name[1:].startswith(' '):
+            total += int(cumulative)
+        modules.add(name.strip())
+    return proc.returncode, total / 1000, modules
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--runs', type=int, default=5, help='Runs per case, the median counts')
+    parser.add_argument('--scale', type=float, default=1.0, help='Multiply every budget by this')
+    args = parser.parse_args()
+    
+    with tempfile.TemporaryDirectory() as state_dir:
+        path = os.path.join(state_dir, 'stub.sock')
+        stub = serve_stub(path)
+        env = dict(os.environ, MTU_DIAG_STATE_DIR=state_dir)
+        env.pop('MTU_DIAG_SERVER', None)
+        
+        failed = False
+        for name, argv, budget, forbidden, forwarded in CASES:
+            case_env = dict(env, MTU_DIAG_SERVER=path) if forwarded else env
+            runs = [measure(argv, case_env) for _ in range(args.runs)]
+            median = statistics.median(total for _, total, _ in runs)
+            limit = budget * args.scale
+            
+            problems = []
+            if any(code != 0 for code, _, _ in runs):
+                problems.append('command failed')
+            if median > limit:
+                problems.append(f'over budget by {median - limit:.1f} ms')
+            loaded = sorted({module for _, _, modules in runs for module in modules
+                             if any(module == bad or module.startswith(bad + '.') for bad in forbidden)})
+            if loaded:
+                problems.append('imports ' + ', '.join(loaded))
+            
+            failed = failed or bool(problems)
+            status = 'FAIL ' + '; '.join(problems) if problems else 'ok'
+            print(f'{name:<16} {median:7.1f} ms  (budget {limit:.0f} ms)  {status}')
+        
+        stub.close()
+    
+    sys.exit(1 if failed else 0)
+
+if __name__ == '__main__':
+    main()
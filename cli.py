@@ -1,14 +1,147 @@
 #!/usr/bin/env python3
+import io
+import os
+import sys
+import threading
+from collections import OrderedDict
 import click
-from mtu_diagnostics.core.detector import MTUDetector
-from mtu_diagnostics.diagnostics.analyzer import DiagnosticAnalyzer
-from mtu_diagnostics.diagnostics.reporter import MTUReporter
 
-@click.group()
+# Package modules are imported by the commands that use them, so a command
+# only pays for its own imports (see benchmarks/startup.py)
+
+# Commands that run on a `serve` process when MTU_DIAG_SERVER names its socket
+FORWARDED = {'detect', 'interfaces', 'test', 'analyze', 'trace', 'tcp', 'cache'}
+
+# Detectors by probe options while serving, None otherwise
+_warm_detectors = None
+_warm_lock = threading.Lock()
+
+class MTUGroup(click.Group):
+    # Keeps the raw command line, which is what gets forwarded
+    def parse_args(self, ctx, args):
+        ctx.meta['argv'] = list(args)
+        return super().parse_args(ctx, args)
+
+@click.group(cls=MTUGroup)
 @click.version_option(version="0.1.0")
-def main():
+@click.option('--rate', default=1000.0, type=click.FloatRange(min=0),
+              help='Most probes per second across all targets (0 = unlimited)')
+@click.option('--burst', default=50, type=click.IntRange(min=1),
+              help='Probes allowed back to back before --rate applies')
+@click.option('--target-rate', default=100.0, type=click.FloatRange(min=0),
+              help='Most probes per second to any one target (0 = unlimited)')
+@click.option('--target-burst', default=20, type=click.IntRange(min=1),
+              help='Probes allowed back to back to one target before --target-rate applies')
+@click.option('--debug', is_flag=True, help='Keep the raw output of ping subprocesses in probe results')
+@click.pass_context
+def main(ctx, rate, burst, target_rate, target_burst, debug):
     """MTU Diagnostics Tool - Detect and diagnose network MTU issues."""
-    pass
+    if _warm_detectors is not None:
+        # A forwarded command inside `serve`, which keeps its own rate limits
+        if ctx.invoked_subcommand not in FORWARDED:
+            raise click.UsageError(f"'{ctx.invoked_subcommand}' cannot run on the server")
+        return
+    
+    server = os.environ.get('MTU_DIAG_SERVER')
+    if server and ctx.invoked_subcommand in FORWARDED:
+        from mtu_diagnostics.utils.client import forward
+        
+        # Without a server listening, the command just runs here
+        response = forward(server, ctx.meta['argv'])
+        if response is not None:
+            sys.stdout.write(response['stdout'])
+            sys.stderr.write(response['stderr'])
+            ctx.exit(response['exit_code'])
+    
+    from mtu_diagnostics.utils.ratelimit import ProbeRateLimiter, set_rate_limiter
+    
+    set_rate_limiter(ProbeRateLimiter(rate=rate, burst=burst, per_destination_rate=target_rate,
+                                      per_destination_burst=target_burst))
+    if debug:
+        from mtu_diagnostics.utils.network import set_keep_output
+        set_keep_output(True)
+
+def probe_options(command):
+    # Options shared by every command that sends probes, see make_detector
+    options = [
+        click.option('--udp', type=click.IntRange(1, 65535), metavar='PORT',
+                     help='Probe with UDP datagrams to a `responder` on PORT instead of ICMP echo'),
+        click.option('--min-timeout', default=0.02, type=click.FloatRange(min=0),
+                     help='Shortest per-probe timeout in seconds derived from the measured RTT'),
+        click.option('--fixed-timeout', is_flag=True,
+                     help='Wait the full timeout for every probe instead of adapting it to the RTT'),
+        click.option('--confidence', default=0.999,
+                     type=click.FloatRange(min=0, max=1, min_open=True, max_open=True),
+                     help='Confidence required before repeated timeouts count as a dropped size'),
+        click.option('--max-attempts', default=8, type=click.IntRange(min=1),
+                     help='Most times one size is probed after timeouts (1 = never retry)'),
+        click.option('--no-cache', is_flag=True, help='Do not read or write the path MTU result cache')
+    ]
+    for option in reversed(options):
+        command = option(command)
+    return command
+
+def _udp_default_port():
+    from mtu_diagnostics.utils.udp import DEFAULT_PORT
+    return DEFAULT_PORT
+
+def make_detector(no_cache=False, fixed_timeout=False, min_timeout=0.02, confidence=0.999,
+                  max_attempts=8, udp=None):
+    # Commands that never search for a path MTU pass no_cache, which also
+    # skips opening the result cache
+    if _warm_detectors is None:
+        return _new_detector(no_cache, fixed_timeout, min_timeout, confidence, max_attempts, udp)
+    
+    # Served commands share one detector per set of options, with its
+    # interface snapshot, resolver cache, RTT and loss estimates
+    key = (no_cache, fixed_timeout, min_timeout, confidence, max_attempts, udp)
+    with _warm_lock:
+        detector = _warm_detectors.get(key)
+        if detector is None:
+            detector = _warm_detectors[key] = _new_detector(*key)
+            while len(_warm_detectors) > 16:
+                _warm_detectors.popitem(last=False)
+        _warm_detectors.move_to_end(key)
+        return detector
+
+def _new_detector(no_cache, fixed_timeout, min_timeout, confidence, max_attempts, udp):
+    from mtu_diagnostics.core.detector import MTUDetector
+    from mtu_diagnostics.utils.loss import LossTracker
+    from mtu_diagnostics.utils.rtt import RTTTracker
+    
+    cache = None
+    if not no_cache:
+        from mtu_diagnostics.utils.cache import PathMTUCache
+        cache = PathMTUCache()
+    
+    rtt = RTTTracker(min_timeout=min_timeout, adaptive=not fixed_timeout)
+    loss = LossTracker(confidence=confidence, max_attempts=max_attempts)
+    return MTUDetector(cache=cache, rtt=rtt, loss=loss, udp_port=udp)
+
+def echo_live(line, err=False):
+    # Output printed while probes are still running. Once the reader has gone
+    # away (`mtu-diag ... | head`) nobody is left to probe for, so the run
+    # stops and the rest of its output is discarded.
+    try:
+        click.echo(line, err=err)
+    except BrokenPipeError:
+        from mtu_diagnostics.core.detector import StopProbing
+        
+        devnull = os.open(os.devnull, os.O_WRONLY)
+        os.dup2(devnull, (sys.stderr if err else sys.stdout).fileno())
+        raise StopProbing()
+
+def progress_printer(reporter):
+    # Probe and phase events as they happen: NDJSON records on stdout, or text
+    # lines on stderr so the report on stdout stays the same. JSON output has
+    # no progress.
+    if reporter.format_type == 'json':
+        return None
+    err = reporter.format_type == 'text'
+    
+    def on_event(event):
+        echo_live(reporter.format_event(event), err)
+    return on_event
 
 @main.command()
 @click.option('--interface', '-i', help='Specific network interface to check')
@@ -16,7 +149,9 @@ def main():
               help='Output format')
 def detect(interface, format):
     """Detect MTU size for network interface."""
-    detector = MTUDetector()
+    from mtu_diagnostics.diagnostics.reporter import MTUReporter
+    
+    detector = make_detector(no_cache=True)
     reporter = MTUReporter(format)
     
     result = detector.detect_interface_mtu(interface)
@@ -25,30 +160,67 @@ def detect(interface, format):
 @main.command()
 @click.argument('target')
 @click.option('--interface', '-i', help='Specific network interface to use')
-@click.option('--format', '-f', default='text', type=click.Choice(['text', 'json']), 
+@click.option('--format', '-f', default='text', type=click.Choice(['text', 'json', 'ndjson']), 
               help='Output format')
-def test(target, interface, format):
+@click.option('--fanout', '-k', default=1, type=click.IntRange(min=1),
+              help='Sizes probed concurrently per search round (1 = binary search)')
+@click.option('--ptb/--no-ptb', default=True,
+              help='Jump to the next-hop MTU reported by Frag-Needed errors')
+@click.option('--cached', is_flag=True,
+              help="Use the kernel's cached path MTU when it has one instead of probing")
+@click.option('--dual-stack', is_flag=True,
+              help='Test the IPv4 and IPv6 addresses of the target concurrently')
+@probe_options
+@click.option('--refresh', is_flag=True, help='Ignore cached path MTU results and re-probe')
+def test(target, interface, format, fanout, ptb, cached, dual_stack, refresh, **probing):
     """Test MTU size to a specific target."""
-    detector = MTUDetector()
+    from mtu_diagnostics.diagnostics.reporter import MTUReporter
+    
+    detector = make_detector(**probing)
     reporter = MTUReporter(format)
+    on_event = progress_printer(reporter)
+    
+    if dual_stack:
+        if interface:
+            raise click.UsageError('--dual-stack cannot be combined with --interface')
+        result = detector.detect_dual_stack(target, fanout=fanout, use_ptb=ptb,
+                                            use_kernel_cache=cached, refresh=refresh, on_event=on_event)
+        click.echo(reporter.format_dual_stack_result(result))
+        return
     
-    result = detector.detect_path_mtu(target, interface)
+    result = detector.detect_path_mtu(target, interface, fanout=fanout, use_ptb=ptb,
+                                     use_kernel_cache=cached, refresh=refresh, on_event=on_event)
     click.echo(reporter.format_path_mtu_result(result))
 
 @main.command()
 @click.argument('target')
 @click.option('--interface', '-i', help='Specific network interface to use')
-@click.option('--format', '-f', default='text', type=click.Choice(['text', 'json']), 
+@click.option('--format', '-f', default='text', type=click.Choice(['text', 'json', 'ndjson']), 
               help='Output format')
-def analyze(target, interface, format):
+@click.option('--concurrent', is_flag=True, help='Probe all common MTU sizes at once')
+@click.option('--fanout', '-k', default=1, type=click.IntRange(min=1),
+              help='Sizes probed concurrently per search round (1 = binary search)')
+@click.option('--tcp-port', type=click.IntRange(1, 65535),
+              help='Also check the TCP MSS negotiated with this port')
+@click.option('--tcp-push', default=0, type=click.IntRange(min=0),
+              help='Full-sized TCP segments to send to check for a PMTU black hole')
+@probe_options
+@click.option('--refresh', is_flag=True, help='Ignore cached path MTU results and re-probe')
+def analyze(target, interface, format, concurrent, fanout, tcp_port, tcp_push, refresh, **probing):
     """Perform comprehensive MTU analysis with recommendations."""
-    detector = MTUDetector()
+    from mtu_diagnostics.diagnostics.analyzer import DiagnosticAnalyzer
+    from mtu_diagnostics.diagnostics.reporter import MTUReporter
+    
+    detector = make_detector(**probing)
     analyzer = DiagnosticAnalyzer()
     reporter = MTUReporter(format)
     
-    click.echo("Running comprehensive MTU analysis...")
+    if format != 'ndjson':
+        click.echo("Running comprehensive MTU analysis...")
     
-    result = detector.comprehensive_mtu_test(target, interface)
+    result = detector.comprehensive_mtu_test(target, interface, concurrent=concurrent, fanout=fanout,
+                                             refresh=refresh, tcp_port=tcp_port, tcp_push=tcp_push,
+                                             on_event=progress_printer(reporter))
     
     if result.get('success'):
         recommendations = analyzer.analyze_mtu_results(result)
@@ -56,10 +228,13 @@ def analyze(target, interface, format):
         
         # Show test results
         click.echo(reporter.format_comprehensive_test(result))
-        click.echo()
+        if format != 'ndjson':
+            click.echo()
         
         # Show analysis
         click.echo(reporter.format_analysis_results(recommendations, summary))
+    elif format == 'ndjson':
+        click.echo(reporter.format_comprehensive_test(result))
     else:
         click.echo(f"Error: {result.get('error', 'Unknown error')}")
 
@@ -68,7 +243,9 @@ def analyze(target, interface, format):
               help='Output format')
 def interfaces(format):
     """List all network interfaces and their MTU settings."""
-    detector = MTUDetector()
+    from mtu_diagnostics.diagnostics.reporter import MTUReporter
+    
+    detector = make_detector(no_cache=True)
     reporter = MTUReporter(format)
     
     result = detector.get_all_interfaces_info()
@@ -77,38 +254,232 @@ def interfaces(format):
 @main.command()
 @click.argument('target')
 @click.option('--interface', '-i', help='Specific network interface to use')
-@click.option('--timeout', '-t', default=5, help='Ping timeout in seconds')
-def trace(target, interface, timeout):
-    """Trace path MTU discovery (basic implementation)."""
-    from mtu_diagnostics.core.tester import MTUTester
-    from mtu_diagnostics.utils.network import resolve_hostname
+@click.option('--format', '-f', default='text', type=click.Choice(['text', 'json', 'ndjson']), 
+              help='Output format')
+@click.option('--max-hops', '-m', default=30, type=click.IntRange(1, 255), help='Largest TTL probed')
+@click.option('--timeout', '-t', default=2.0, type=click.FloatRange(min=0, min_open=True),
+              help='Longest wait for a hop to answer in seconds')
+def trace(target, interface, format, max_hops, timeout):
+    """Trace the path hop by hop and show where the MTU drops."""
+    from mtu_diagnostics.diagnostics.reporter import MTUReporter
     
-    tester = MTUTester()
+    detector = make_detector(no_cache=True)
+    reporter = MTUReporter(format)
+    
+    if format == 'json':
+        result = detector.trace_path(target, interface, max_hops=max_hops, timeout=timeout)
+        click.echo(reporter.format_trace_result(result))
+        return
     
-    click.echo(f"Tracing path MTU to {target}...")
+    if format == 'ndjson':
+        def on_hop(hop):
+            echo_live(reporter.format_event({'event': 'hop', **hop}))
+        
+        result = detector.trace_path(target, interface, max_hops=max_hops, timeout=timeout,
+                                     on_hop=on_hop)
+        click.echo(reporter.format_trace_result(result))
+        return
     
-    ip = resolve_hostname(target)
+    ip = detector.resolver.resolve(target)
     if not ip:
         click.echo(f"Error: Could not resolve {target}")
         return
+    click.echo(reporter.format_trace_header(target, ip))
     
-    click.echo(f"Target IP: {ip}")
+    # Hops are printed as they are settled, not when the trace ends
+    def on_hop(hop):
+        echo_live(reporter.format_hop(hop))
     
-    # Test common MTU sizes
-    result = tester.test_common_sizes(target, timeout)
-    
-    if result['success']:
-        click.echo("\nMTU Size Test Results:")
-        for test in result['results']:
-            status = "✓" if test['success'] else "✗"
-            click.echo(f"{status} {test['mtu_size']}: {test['reason']}")
-        
-        # Find optimal MTU
-        mtu_result = tester.find_max_mtu(target)
-        if mtu_result['success']:
-            click.echo(f"\nOptimal MTU: {mtu_result['max_mtu']}")
+    result = detector.trace_path(target, interface, max_hops=max_hops, timeout=timeout,
+                                 on_hop=on_hop)
+    if result.get('success'):
+        click.echo(reporter.format_trace_summary(result))
     else:
         click.echo(f"Error: {result.get('error', 'Unknown error')}")
 
+@main.command()
+@click.argument('targets', type=click.File('r'), default='-')
+@click.option('--mode', '-m', default='test', type=click.Choice(['test', 'analyze']),
+              help='Run a path MTU test or a comprehensive analysis per target')
+@click.option('--interface', '-i', help='Specific network interface to use')
+@click.option('--concurrency', '-c', default=32, type=click.IntRange(min=1),
+              help='Targets probed at the same time')
+@click.option('--deadline', '-d', default=60.0, type=click.FloatRange(min=0, min_open=True),
+              help='Seconds allowed per target before it is reported as failed')
+@click.option('--fanout', '-k', default=1, type=click.IntRange(min=1),
+              help='Sizes probed concurrently per search round (1 = binary search)')
+@click.option('--group-routes', is_flag=True,
+              help='Search once per egress route and only check the other targets behind it')
+@click.option('--group-hops', default=0, type=click.IntRange(0, 30),
+              help='Also group by the first N routers (implies --group-routes)')
+@probe_options
+@click.option('--refresh', is_flag=True, help='Ignore cached path MTU results and re-probe')
+def batch(targets, mode, interface, concurrency, deadline, fanout, group_routes, group_hops, refresh,
+          **probing):
+    """Probe every target listed in a file (or stdin) and stream NDJSON results."""
+    from mtu_diagnostics.core.batch import BatchRunner, read_targets
+    from mtu_diagnostics.core.route_groups import RouteGroups
+    from mtu_diagnostics.diagnostics.reporter import MTUReporter
+    
+    if (group_routes or group_hops) and mode != 'test':
+        raise click.UsageError('Route grouping only applies to --mode test')
+    
+    detector = make_detector(**probing)
+    route_groups = RouteGroups(detector, hops=group_hops) if group_routes or group_hops else None
+    reporter = MTUReporter('json')
+    runner = BatchRunner(detector, mode=mode, concurrency=concurrency, deadline=deadline,
+                         route_groups=route_groups, interface_name=interface, fanout=fanout,
+                         refresh=refresh)
+    
+    for record in runner.run(read_targets(targets)):
+        click.echo(reporter.format_batch_record(record))
+
+@main.command()
+@click.argument('targets', nargs=-1, required=True)
+@click.option('--port', '-p', default=443, type=click.IntRange(1, 65535), help='TCP port to connect to')
+@click.option('--push', default=0, type=click.IntRange(min=0),
+              help='Full-sized segments to send and wait to be acknowledged (0 = connect only)')
+@click.option('--timeout', '-t', default=5.0, type=click.FloatRange(min=0, min_open=True),
+              help='Connect and push timeout in seconds')
+@click.option('--format', '-f', default='text', type=click.Choice(['text', 'json']), 
+              help='Output format')
+def tcp(targets, port, push, timeout, format):
+    """Check the TCP MSS and PMTU that connections to TARGETS actually get."""
+    from mtu_diagnostics.diagnostics.reporter import MTUReporter
+    
+    detector = make_detector(no_cache=True)
+    reporter = MTUReporter(format)
+    
+    for i, result in enumerate(detector.tcp_mss_tests(list(targets), port, push, timeout)):
+        if i:
+            click.echo()
+        click.echo(reporter.format_tcp_result(result))
+
+@main.command()
+@click.option('--bind', '-b', default='::', help='Address to listen on (:: answers IPv4 and IPv6)')
+@click.option('--port', '-p', default=_udp_default_port, type=click.IntRange(1, 65535),
+              help='UDP port to listen on')
+def responder(bind, port):
+    """Answer UDP probes from `--udp` on other hosts until interrupted."""
+    from mtu_diagnostics.core.responder import run_responder
+    
+    def ready(address):
+        host = f"[{address[0]}]" if ':' in address[0] else address[0]
+        click.echo(f"Answering UDP MTU probes on {host}:{address[1]} (Ctrl-C to stop)")
+    
+    try:
+        stats = run_responder(bind, port, ready)
+    except OSError as e:
+        raise click.ClickException(f"Could not listen on {bind}:{port}: {e}")
+    click.echo(f"Answered {stats.get('probes', 0)} probes, largest {stats.get('largest', 0)} bytes")
+
+@main.command()
+@click.argument('targets', type=click.File('r'))
+@click.option('--interval', default=300.0, type=click.FloatRange(min=0, min_open=True),
+              help='Seconds between checks of a target without its own interval')
+@click.option('--jitter', default=0.1, type=click.FloatRange(0, 0.5),
+              help='Fraction by which each interval is randomly shortened or stretched')
+@click.option('--concurrency', '-c', default=32, type=click.IntRange(min=1),
+              help='Checks running at the same time')
+@click.option('--bind', '-b', default='127.0.0.1', help='Address to serve /metrics on')
+@click.option('--port', '-p', default=9821, type=click.IntRange(1, 65535), help='Port to serve /metrics on')
+@click.option('--interface', '-i', help='Specific network interface to use')
+@click.option('--fanout', '-k', default=1, type=click.IntRange(min=1),
+              help='Sizes probed concurrently per search round (1 = binary search)')
+@probe_options
+def monitor(targets, interval, jitter, concurrency, bind, port, interface, fanout, **probing):
+    """Check TARGETS periodically and serve OpenMetrics on /metrics.
+    
+    TARGETS lists one target per line, optionally followed by its own
+    interval in seconds. Path MTU changes and targets going down or coming
+    back are printed as NDJSON events.
+    """
+    from mtu_diagnostics.core.monitor import Monitor, read_monitor_targets, run_monitor
+    from mtu_diagnostics.diagnostics.reporter import MTUReporter
+    
+    # The monitor keeps its own state, every check probes
+    probing['no_cache'] = True
+    detector = make_detector(**probing)
+    reporter = MTUReporter('json')
+    
+    def on_event(event):
+        click.echo(reporter.format_batch_record(event))
+    
+    daemon = Monitor(detector, interval=interval, jitter=jitter, concurrency=concurrency,
+                     on_event=on_event, interface_name=interface, fanout=fanout)
+    try:
+        for target, target_interval in read_monitor_targets(targets):
+            daemon.add(target, target_interval)
+    except ValueError as e:
+        raise click.BadParameter(str(e), param_hint='TARGETS')
+    
+    def ready(address):
+        click.echo(f"Monitoring {len(daemon.targets)} targets, metrics on "
+                   f"http://{address[0]}:{address[1]}/metrics (Ctrl-C to stop)", err=True)
+    
+    try:
+        run_monitor(daemon, bind, port, ready)
+    except OSError as e:
+        raise click.ClickException(f"Could not listen on {bind}:{port}: {e}")
+
+@main.command()
+@click.option('--socket', 'path', help='Unix socket to listen on (default: server.sock in the state directory)')
+@click.option('--workers', default=16, type=click.IntRange(min=1), help='Commands run at the same time')
+def serve(path, workers):
+    """Run forwarded commands with warm state until interrupted.
+    
+    With MTU_DIAG_SERVER set to the socket path, detect, interfaces, test,
+    analyze, trace, tcp and cache run here instead of in a new process, and
+    print the same output. Rate limits are the server's.
+    """
+    global _warm_detectors
+    from mtu_diagnostics.core.server import CommandServer, capture_streams, run_server
+    from mtu_diagnostics.utils.client import default_socket_path
+    
+    path = path or default_socket_path()
+    _warm_detectors = OrderedDict()
+    capture_streams()
+    server = CommandServer(_execute, path, workers)
+    
+    def ready(address):
+        click.echo(f"Serving on {address}, set MTU_DIAG_SERVER={address} to use it (Ctrl-C to stop)", err=True)
+    
+    try:
+        run_server(server, ready)
+    except OSError as e:
+        raise click.ClickException(f"Could not listen on {path}: {e}")
+    click.echo(f"Served {server.requests} commands, {server.failures} failed", err=True)
+
+def _execute(argv):
+    # One forwarded command line, with this thread's output captured
+    out, err = io.StringIO(), io.StringIO()
+    with sys.stdout.capture(out), sys.stderr.capture(err):
+        try:
+            exit_code = main.main(args=argv, prog_name='mtu-diag', standalone_mode=False)
+        except click.ClickException as e:
+            e.show()
+            exit_code = e.exit_code
+        except click.Abort:
+            click.echo('Aborted!', err=True)
+            exit_code = 1
+    return out.getvalue(), err.getvalue(), exit_code if isinstance(exit_code, int) else 0
+
+@main.command()
+@click.option('--format', '-f', default='text', type=click.Choice(['text', 'json']), 
+              help='Output format')
+@click.option('--clear', is_flag=True, help='Remove all cached results and counters')
+def cache(format, clear):
+    """Show path MTU result cache statistics."""
+    from mtu_diagnostics.diagnostics.reporter import MTUReporter
+    from mtu_diagnostics.utils.cache import PathMTUCache
+    
+    path_cache = PathMTUCache()
+    reporter = MTUReporter(format)
+    
+    if clear:
+        path_cache.clear()
+    
+    click.echo(reporter.format_cache_stats(path_cache.stats()))
+
 if __name__ == '__main__':
     main()
\ No newline at end of file
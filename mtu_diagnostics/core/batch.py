@@ -0,0 +1,115 @@
+import time
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from typing import Dict, Iterable, Iterator, Optional, Any, TextIO
+from .detector import MTUDetector
+from .route_groups import RouteGroups
+from ..utils.ratelimit import get_rate_limiter
+
+def read_targets(stream: TextIO) -> Iterator[str]:
+    for line in stream:
+        target = line.split('#', 1)[0].strip()
+        if target:
+            yield target
+
+class BatchRunner:
+    def __init__(self, detector: Optional[MTUDetector] = None, mode: str = 'test',
+                 concurrency: int = 32, deadline: float = 60, route_groups: Optional[RouteGroups] = None,
+                 **options):
+        self.detector = detector or MTUDetector()
+        self.mode = mode
+        self.concurrency = max(1, concurrency)
+        self.deadline = deadline
+        # Path MTU tests only: one full search per shared route
+        self.route_groups = route_groups
+        self.options = options
+    
+    def run(self, targets: Iterable[str]) -> Iterator[Dict[str, Any]]:
+        # Yields one record per target as it finishes, then a summary record.
+        # At most `concurrency` targets are in flight, so memory stays bounded
+        # however long the target list is.
+        summary = {'summary': True, 'targets': 0, 'succeeded': 0, 'failed': 0, 'deadline_exceeded': 0}
+        started = time.monotonic()
+        targets = iter(targets)
+        exhausted = False
+        pending = {}
+        running = set()
+        
+        executor = ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix='mtu-batch')
+        try:
+            while True:
+                # Futures past their deadline still hold a worker until their
+                # probes time out, so they count against the concurrency limit
+                running = {future for future in running if not future.done()}
+                while not exhausted and len(running) < self.concurrency:
+                    target = next(targets, None)
+                    if target is None:
+                        exhausted = True
+                        break
+                    future = executor.submit(self._check, target)
+                    pending[future] = (target, time.monotonic())
+                    running.add(future)
+                
+                if not pending and exhausted:
+                    break
+                
+                # Abandoned futures are waited on too, one finishing frees a
+                # slot for the next target; with nothing pending, that is all
+                # there is to wait for
+                timeout = None
+                if pending:
+                    next_deadline = min(start for _, start in pending.values()) + self.deadline
+                    timeout = max(0, next_deadline - time.monotonic())
+                done, _ = wait(set(pending) | running, timeout=timeout, return_when=FIRST_COMPLETED)
+                
+                now = time.monotonic()
+                for future in list(pending):
+                    target, start = pending[future]
+                    if future in done:
+                        record = self._record(target, future, now - start)
+                    elif now - start >= self.deadline:
+                        record = {
+                            'target': target,
+                            'success': False,
+                            'error': f'Deadline of {self.deadline}s exceeded',
+                            'elapsed': round(now - start, 3)
+                        }
+                        summary['deadline_exceeded'] += 1
+                    else:
+                        continue
+                    
+                    del pending[future]
+                    summary['targets'] += 1
+                    summary['succeeded' if record['success'] else 'failed'] += 1
+                    yield record
+        finally:
+            # Don't hold the summary back for targets abandoned at their deadline
+            executor.shutdown(wait=False)
+        
+        summary['elapsed'] = round(time.monotonic() - started, 3)
+        limiter = get_rate_limiter()
+        if limiter is not None:
+            summary['rate_limit'] = limiter.stats()
+        if self.route_groups is not None and self.mode == 'test':
+            summary['route_groups'] = self.route_groups.stats()
+        yield summary
+    
+    def _check(self, target: str) -> Dict[str, Any]:
+        if self.mode == 'analyze':
+            return self.detector.comprehensive_mtu_test(target, **self.options)
+        if self.route_groups is not None:
+            return self.route_groups.detect_path_mtu(target, **self.options)
+        return self.detector.detect_path_mtu(target, **self.options)
+    
+    def _record(self, target: str, future, elapsed: float) -> Dict[str, Any]:
+        try:
+            result = future.result()
+        except Exception as e:
+            result = {'success': False, 'error': str(e)}
+        
+        record = {'target': target, 'success': bool(result.get('success'))}
+        record.update({key: value for key, value in result.items()
+                       if key not in ('target', 'success', 'interface')})
+        if result.get('interface'):
+            record['interface'] = result['interface']['name']
+        record['elapsed'] = round(elapsed, 3)
+        return record
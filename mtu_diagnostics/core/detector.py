@@ -1,11 +1,61 @@
-from typing import Dict, List, Optional, Any
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import TYPE_CHECKING, Callable, Dict, List, Optional, Any
 from .interface import InterfaceManager, NetworkInterface
+from .probe_plan import IOStep, resolve_step, run_blocking
 from .tester import MTUTester
+from ..utils.icmp import get_route_info
+from ..utils.loss import LossTracker
+from ..utils.network import close_thread_probers
+from ..utils.ratelimit import get_rate_limiter
+from ..utils.resolver import Resolver
+from ..utils.rtt import RTTTracker
 
+if TYPE_CHECKING:
+    from ..utils.cache import PathMTUCache
+    from ..utils.network import ProberSet
+
+# Raised by an `on_event` or `on_hop` callback to end a run early, once the
+# consumer has what it needs or nobody is reading any more. The run returns
+# at once, marked 'stopped', with whatever it had finished.
+class StopProbing(Exception):
+    pass
+
+# Like MTUTester, the probing checks are coroutines with blocking wrappers.
+# Route, interface and cache lookups stay synchronous in both: they are local
+# and answer in microseconds.
 class MTUDetector:
-    def __init__(self):
+    def __init__(self, cache: Optional['PathMTUCache'] = None, rtt: Optional[RTTTracker] = None,
+                 loss: Optional[LossTracker] = None, udp_port: Optional[int] = None,
+                 probers: Optional['ProberSet'] = None):
         self.interface_manager = InterfaceManager()
-        self.tester = MTUTester()
+        self.resolver = Resolver()
+        self.tester = MTUTester(resolver=self.resolver, rtt=rtt, loss=loss, udp_port=udp_port,
+                                probers=probers)
+        self.cache = cache
+        self._tcp_prober = None
+        self._lock = threading.Lock()
+    
+    @property
+    def tcp_prober(self):
+        # Created on first use: the TCP and trace probers pull in asyncio,
+        # which commands that never use them should not pay for
+        if self._tcp_prober is None:
+            from .tcp_probe import TCPProber
+            
+            with self._lock:
+                if self._tcp_prober is None:
+                    self._tcp_prober = TCPProber()
+        return self._tcp_prober
+    
+    def close(self):
+        # Pooled TCP connections, resolver threads and the cache connection
+        if self._tcp_prober is not None:
+            self._tcp_prober.close()
+        self.resolver.close()
+        if self.cache is not None:
+            self.cache.close()
     
     def detect_interface_mtu(self, interface_name: Optional[str] = None) -> Dict[str, Any]:
         if interface_name:
@@ -34,32 +84,238 @@ class MTUDetector:
             }
         }
     
-    def detect_path_mtu(self, target: str, interface_name: Optional[str] = None) -> Dict[str, Any]:
-        interface_info = self.detect_interface_mtu(interface_name)
+    def detect_path_mtu(self, target: str, interface_name: Optional[str] = None,
+                        fanout: int = 1, use_ptb: bool = True,
+                        use_kernel_cache: bool = False, refresh: bool = False,
+                        on_event: Optional[Callable[[Dict[str, Any]], None]] = None) -> Dict[str, Any]:
+        return run_blocking(self.detect_path_mtu_async(target, interface_name, fanout, use_ptb,
+                                                       use_kernel_cache, refresh, on_event))
+    
+    async def detect_path_mtu_async(self, target: str, interface_name: Optional[str] = None,
+                                    fanout: int = 1, use_ptb: bool = True,
+                                    use_kernel_cache: bool = False, refresh: bool = False,
+                                    on_event: Optional[Callable[[Dict[str, Any]], None]] = None
+                                    ) -> Dict[str, Any]:
+        # `on_event` gets every probe as it is answered, see ProbeMemo. The
+        # target is resolved first so that the lookups below hit the cache.
+        await resolve_step(self.resolver, target)
+        interface_info = self._egress_interface_info(target, interface_name)
         if not interface_info['success']:
             return interface_info
         
         interface = interface_info['interface']
         
+        kernel_cache = None
+        if use_kernel_cache:
+            kernel_cache = self._kernel_cached_mtu(target, interface)
+            if kernel_cache and kernel_cache['source'] == 'pmtu_exception':
+                return {
+                    'success': True,
+                    'interface': interface,
+                    'target': target,
+                    'path_mtu': kernel_cache['mtu'],
+                    'interface_mtu': interface['mtu'],
+                    'mtu_optimal': kernel_cache['mtu'] >= interface['mtu'],
+                    'target_ip': kernel_cache['ip'],
+                    'kernel_cache': kernel_cache
+                }
+        
         # Test maximum working MTU to target
-        mtu_result = self.tester.find_max_mtu(target, start_size=interface['mtu'])
+        memo = self.tester.new_memo(on_event)
+        try:
+            mtu_result = await self.find_max_mtu_async(target, interface, refresh=refresh, fanout=fanout,
+                                                       use_ptb=use_ptb, memo=memo)
+        except StopProbing:
+            mtu_result = {'success': False, 'stopped': True, 'error': f'Stopped after {memo.sent} probes'}
         
         result = {
             'success': mtu_result['success'],
             'interface': interface,
             'target': target
         }
+        if 'route' in interface_info:
+            result['route'] = interface_info['route']
+        if mtu_result.get('stopped'):
+            result['stopped'] = True
         
         if mtu_result['success']:
             result.update({
                 'path_mtu': mtu_result['max_mtu'],
                 'interface_mtu': interface['mtu'],
                 'mtu_optimal': mtu_result['max_mtu'] >= interface['mtu'],
-                'target_ip': mtu_result['ip']
+                'target_ip': mtu_result['ip'],
+                'search': mtu_result['search']
             })
+            if mtu_result.get('cached'):
+                result['cached'] = True
+            else:
+                for key in ('rtt', 'loss'):
+                    if mtu_result.get(key):
+                        result[key] = mtu_result[key]
         else:
             result['error'] = mtu_result.get('error', 'MTU detection failed')
         
+        if kernel_cache:
+            result['kernel_cache'] = kernel_cache
+        
+        return result
+    
+    def detect_dual_stack(self, target: str, **options) -> Dict[str, Any]:
+        # Path MTU over IPv4 and IPv6 at once, to the first A and the first
+        # AAAA address, each through its own egress route. Probers are per
+        # thread and family, so the two searches share nothing but the rate
+        # limiter and take as long as the slower one. The worker threads exit
+        # with the executor and close their probers first.
+        addresses = self.resolver.resolve_all(target)
+        ips = {family: addresses[family][0] for family in ('ipv4', 'ipv6') if addresses[family]}
+        if not ips:
+            return {'success': False, 'target': target, 'error': f'Could not resolve hostname: {target}'}
+        
+        start = time.monotonic()
+        with ThreadPoolExecutor(max_workers=len(ips), thread_name_prefix='mtu-family') as executor:
+            futures = {family: executor.submit(self._detect_in_worker, ip, options)
+                       for family, ip in ips.items()}
+            results = {family: future.result() for family, future in futures.items()}
+        
+        for family, result in results.items():
+            result['target'] = target
+            result.setdefault('target_ip', ips[family])
+        
+        return {
+            'success': any(result['success'] for result in results.values()),
+            'target': target,
+            'ipv4': results.get('ipv4'),
+            'ipv6': results.get('ipv6'),
+            'elapsed': round(time.monotonic() - start, 3)
+        }
+    
+    def _detect_in_worker(self, ip: str, options: Dict[str, Any]) -> Dict[str, Any]:
+        try:
+            return self.detect_path_mtu(ip, **options)
+        finally:
+            close_thread_probers()
+    
+    def trace_path(self, target: str, interface_name: Optional[str] = None, max_hops: int = 30,
+                   timeout: float = 2,
+                   on_hop: Optional[Callable[[Dict[str, Any]], None]] = None) -> Dict[str, Any]:
+        # Hop-by-hop MTU from the egress interface MTU down, see Tracepath
+        ip = self.resolver.resolve(target)
+        if not ip:
+            return {'success': False, 'target': target, 'error': f'Could not resolve hostname: {target}'}
+        
+        interface_info = self._egress_interface_info(target, interface_name)
+        if not interface_info['success']:
+            return interface_info
+        interface = interface_info['interface']
+        
+        from .tracepath import Tracepath
+        
+        tracer = Tracepath(max_hops=max_hops, timeout=timeout, limiter=get_rate_limiter())
+        try:
+            result = tracer.trace(ip, interface['mtu'], on_hop)
+        except StopProbing:
+            # The hops so far were all passed to on_hop already
+            result = {'success': False, 'ip': ip, 'stopped': True,
+                      'error': f'Stopped after {tracer.probes} probes'}
+        result.update({'target': target, 'interface': interface})
+        return result
+    
+    def tcp_mss_test(self, target: str, port: int, push_segments: int = 0,
+                     timeout: float = 5) -> Dict[str, Any]:
+        return self.tcp_mss_tests([target], port, push_segments, timeout)[0]
+    
+    async def tcp_mss_test_async(self, target: str, port: int, push_segments: int = 0,
+                                 timeout: float = 5) -> Dict[str, Any]:
+        ip = await self.resolver.aresolve(target)
+        if ip:
+            result = await self.tcp_prober.probe_async(ip, port, timeout, push_segments)
+        else:
+            result = {'success': False, 'error': f'Could not resolve hostname: {target}'}
+        result['target'] = target
+        return result
+    
+    def tcp_mss_tests(self, targets: List[str], port: int, push_segments: int = 0,
+                      timeout: float = 5) -> List[Dict[str, Any]]:
+        # All connections are opened concurrently; results keep target order
+        ips = {target: self.resolver.resolve(target) for target in targets}
+        resolved = [target for target in targets if ips[target]]
+        probes = self.tcp_prober.probe_many([(ips[target], port) for target in resolved],
+                                            timeout=timeout, push_segments=push_segments)
+        by_target = dict(zip(resolved, probes))
+        
+        results = []
+        for target in targets:
+            result = by_target.get(target) or {
+                'success': False,
+                'error': f'Could not resolve hostname: {target}'
+            }
+            result['target'] = target
+            results.append(result)
+        return results
+    
+    def _egress_interface_info(self, target: str, interface_name: Optional[str] = None) -> Dict[str, Any]:
+        # Without an explicit interface, use the one the kernel actually routes
+        # the target through (policy routing, VRFs, split tunnels) rather than
+        # the default route's
+        route = None
+        if not interface_name:
+            ip = self.resolver.resolve(target)
+            route = self.interface_manager.get_route(ip) if ip else None
+            if route and route['interface']:
+                interface_name = route['interface']
+        
+        interface_info = self.detect_interface_mtu(interface_name)
+        if interface_info['success'] and route and route['interface'] == interface_info['interface']['name']:
+            interface_info['route'] = route
+        return interface_info
+    
+    def find_max_mtu(self, target: str, interface: Dict[str, Any], refresh: bool = False,
+                     **kwargs) -> Dict[str, Any]:
+        return run_blocking(self.find_max_mtu_async(target, interface, refresh, **kwargs))
+    
+    async def find_max_mtu_async(self, target: str, interface: Dict[str, Any], refresh: bool = False,
+                                 **kwargs) -> Dict[str, Any]:
+        # MTUTester.find_max_mtu behind the on-disk result cache, if any
+        ip = await resolve_step(self.resolver, target) if self.cache else None
+        
+        if ip and not refresh:
+            cached = self.cache.get(ip, interface['name'], interface['mtu'])
+            if cached:
+                cached.update({'target': target, 'cached': True})
+                return cached
+        
+        kwargs.setdefault('start_size', interface['mtu'])
+        result = await self.tester.find_max_mtu_async(target, **kwargs)
+        
+        if ip and result['success']:
+            self.cache.put(ip, interface['name'], interface['mtu'], result)
+        
+        return result
+    
+    def _kernel_cached_mtu(self, target: str, interface: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        # The kernel keeps a PMTU exception per destination once it has seen a
+        # Frag-Needed, and lets it expire. Without one, IP_MTU is the egress
+        # interface MTU or a configured route MTU (`mtu lock`), neither of
+        # which was learned from the path.
+        ip = self.resolver.resolve(target)
+        if not ip:
+            return None
+        
+        route = get_route_info(ip)
+        if not route:
+            return None
+        
+        mtu, source_ip = route
+        egress = self.interface_manager.get_interface_by_ip(source_ip)
+        egress_mtu = egress.mtu if egress else interface['mtu']
+        
+        result = {'ip': ip, 'mtu': mtu, 'egress_mtu': egress_mtu, 'source': 'interface'}
+        if mtu < egress_mtu:
+            kernel_route = self.interface_manager.get_route(ip)
+            expires = kernel_route['expires'] if kernel_route else None
+            result['source'] = 'pmtu_exception' if expires else 'route'
+            if expires:
+                result['expires'] = expires
         return result
     
     def get_all_interfaces_info(self) -> Dict[str, Any]:
@@ -79,30 +335,77 @@ class MTUDetector:
             ]
         }
     
-    def comprehensive_mtu_test(self, target: str, interface_name: Optional[str] = None) -> Dict[str, Any]:
-        # Get interface info
-        interface_info = self.detect_interface_mtu(interface_name)
+    def comprehensive_mtu_test(self, target: str, interface_name: Optional[str] = None,
+                               concurrent: bool = False, fanout: int = 1,
+                               use_ptb: bool = True, refresh: bool = False,
+                               tcp_port: Optional[int] = None, tcp_push: int = 0,
+                               on_event: Optional[Callable[[Dict[str, Any]], None]] = None) -> Dict[str, Any]:
+        return run_blocking(self.comprehensive_mtu_test_async(target, interface_name, concurrent, fanout,
+                                                              use_ptb, refresh, tcp_port, tcp_push, on_event))
+    
+    async def comprehensive_mtu_test_async(self, target: str, interface_name: Optional[str] = None,
+                                           concurrent: bool = False, fanout: int = 1,
+                                           use_ptb: bool = True, refresh: bool = False,
+                                           tcp_port: Optional[int] = None, tcp_push: int = 0,
+                                           on_event: Optional[Callable[[Dict[str, Any]], None]] = None
+                                           ) -> Dict[str, Any]:
+        # Get interface info, once the target is in the resolver cache
+        await resolve_step(self.resolver, target)
+        interface_info = self._egress_interface_info(target, interface_name)
         if not interface_info['success']:
             return interface_info
         
         interface = interface_info['interface']
+        include_jumbo = interface['mtu'] > 1500
         
-        # Test path MTU
-        path_mtu_result = self.tester.find_max_mtu(target, start_size=interface['mtu'])
-        
-        # Test common MTU sizes
-        common_sizes_result = self.tester.test_common_sizes(target)
-        
-        # Test jumbo frames if interface supports them
-        jumbo_result = None
-        if interface['mtu'] > 1500:
-            jumbo_result = self.tester.test_jumbo_frames(target)
+        # Every phase reads from one memo so each (ip, size) is probed once,
+        # and every probe sent is passed to on_event
+        memo = self.tester.new_memo(on_event)
+        plan = self.tester.plan(interface['mtu'], include_jumbo)
         
-        return {
+        result = {
             'success': True,
             'interface': interface,
+            'route': interface_info.get('route'),
             'target': target,
-            'path_mtu': path_mtu_result,
-            'common_sizes_test': common_sizes_result,
-            'jumbo_frames_test': jumbo_result
-        }
\ No newline at end of file
+            'path_mtu': None,
+            'common_sizes_test': None,
+            'jumbo_frames_test': None,
+            'tcp_test': None
+        }
+        
+        try:
+            await self.tester.execute_plan_async(target, plan, memo, concurrent=concurrent)
+            
+            # Test path MTU, starting from the common size outcomes
+            result['path_mtu'] = await self.find_max_mtu_async(target, interface, refresh=refresh,
+                                                               fanout=fanout, use_ptb=use_ptb, memo=memo)
+            self._phase_done(on_event, 'path_mtu', result['path_mtu'])
+            
+            # Test common MTU sizes
+            result['common_sizes_test'] = await self.tester.test_common_sizes_async(
+                target, concurrent=concurrent, memo=memo)
+            self._phase_done(on_event, 'common_sizes', result['common_sizes_test'])
+            
+            # Test jumbo frames if interface supports them
+            if include_jumbo:
+                result['jumbo_frames_test'] = await self.tester.test_jumbo_frames_async(target, memo=memo)
+                self._phase_done(on_event, 'jumbo_frames', result['jumbo_frames_test'])
+            
+            # What TCP negotiates on the same path, for MSS clamp and black hole checks
+            if tcp_port:
+                result['tcp_test'] = await IOStep(
+                    lambda: self.tcp_mss_test(target, tcp_port, push_segments=tcp_push),
+                    lambda: self.tcp_mss_test_async(target, tcp_port, push_segments=tcp_push))
+                self._phase_done(on_event, 'tcp', result['tcp_test'])
+        except StopProbing:
+            result.update({'success': False, 'stopped': True, 'error': f'Stopped after {memo.sent} probes'})
+        
+        result['probe_plan'] = {'planned': len(plan['sizes']), **memo.stats()}
+        return result
+    
+    def _phase_done(self, on_event: Optional[Callable[[Dict[str, Any]], None]], phase: str,
+                    result: Dict[str, Any]):
+        # Each phase's result as soon as it is known, before the next starts
+        if on_event is not None:
+            on_event({'event': 'phase', 'phase': phase, 'result': result})
\ No newline at end of file
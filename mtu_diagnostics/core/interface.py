@@ -1,8 +1,46 @@
+import os
+import time
 import psutil
 import platform
-from typing import Dict, List, Optional
+from typing import Dict, List, Optional, Any
 from dataclasses import dataclass
 from ..utils.platform import run_command
+from ..utils.netlink import get_route, get_default_route
+
+SYSFS_NET = '/sys/class/net'
+IFF_UP = 0x1
+
+# ARPHRD_* link types from include/uapi/linux/if_arp.h
+ARPHRD_TYPES = {
+    1: 'ethernet',
+    32: 'infiniband',
+    512: 'ppp',
+    768: 'tunnel',      # IPIP
+    769: 'tunnel',      # IP6 in IP6
+    772: 'loopback',
+    776: 'tunnel',      # SIT
+    778: 'tunnel',      # GRE
+    801: 'wireless',    # IEEE 802.11
+    803: 'wireless',    # IEEE 802.11 + radiotap
+    823: 'tunnel',      # IP6GRE
+    65534: 'tunnel',    # NONE: tun, wireguard
+}
+
+# DEVTYPE from the device's uevent refines ARPHRD_ETHER and friends
+DEVTYPE_TYPES = {
+    'wlan': 'wireless',
+    'bridge': 'bridge',
+    'bond': 'bond',
+    'vlan': 'vlan',
+    'macvlan': 'virtual',
+    'ipvlan': 'virtual',
+    'wireguard': 'tunnel',
+    'vxlan': 'tunnel',
+    'geneve': 'tunnel',
+    'gretap': 'tunnel',
+    'ip6gretap': 'tunnel',
+    'ppp': 'ppp',
+}
 
 @dataclass
 class NetworkInterface:
@@ -11,38 +49,135 @@ class NetworkInterface:
     is_up: bool
     addresses: List[str]
     type: str = "unknown"
+    index: Optional[int] = None
 
-class InterfaceManager:
-    def __init__(self):
-        self.system = platform.system().lower()
+class InterfaceSnapshot:
+    def __init__(self, interfaces: List[NetworkInterface]):
+        self.interfaces = interfaces
+        self.by_name = {iface.name: iface for iface in interfaces}
+        self.by_index = {iface.index: iface for iface in interfaces if iface.index is not None}
+        self.by_address = {}
+        for iface in interfaces:
+            for address in iface.addresses:
+                self.by_address.setdefault(address, iface)
+        self.created = time.monotonic()
     
-    def get_all_interfaces(self) -> List[NetworkInterface]:
+    def age(self) -> float:
+        return time.monotonic() - self.created
+    
+    @classmethod
+    def capture(cls, system: Optional[str] = None) -> 'InterfaceSnapshot':
+        system = system or platform.system().lower()
+        addrs = psutil.net_if_addrs()
+        
+        if system == 'linux' and os.path.isdir(SYSFS_NET):
+            return cls(cls._read_sysfs(addrs))
+        
+        stats = psutil.net_if_stats()
+        interfaces = []
+        for interface_name, iface_addrs in addrs.items():
+            iface_stats = stats.get(interface_name)
+            if not iface_stats:
+                continue
+            interfaces.append(NetworkInterface(
+                name=interface_name,
+                mtu=iface_stats.mtu,
+                is_up=iface_stats.isup,
+                addresses=_addresses(iface_addrs),
+                type=_guess_interface_type(interface_name)
+            ))
+        return cls(interfaces)
+    
+    @classmethod
+    def _read_sysfs(cls, addrs: Dict[str, list]) -> List[NetworkInterface]:
         interfaces = []
         
-        for interface_name, addrs in psutil.net_if_addrs().items():
-            stats = psutil.net_if_stats().get(interface_name)
-            if not stats:
+        for interface_name in os.listdir(SYSFS_NET):
+            path = os.path.join(SYSFS_NET, interface_name)
+            try:
+                mtu = int(_read(path, 'mtu'))
+                index = int(_read(path, 'ifindex'))
+                arphrd = int(_read(path, 'type'))
+                flags = int(_read(path, 'flags'), 16)
+                operstate = _read(path, 'operstate')
+            except (OSError, ValueError):
+                # Interface vanished while we were reading it
                 continue
-                
-            addresses = [addr.address for addr in addrs 
-                        if addr.family in (psutil.AF_LINK, 2, 10)]  # MAC, IPv4, IPv6
             
-            interface = NetworkInterface(
+            devtype = None
+            try:
+                for line in _read(path, 'uevent').splitlines():
+                    if line.startswith('DEVTYPE='):
+                        devtype = line[len('DEVTYPE='):]
+            except OSError:
+                pass
+            
+            if devtype in DEVTYPE_TYPES:
+                iface_type = DEVTYPE_TYPES[devtype]
+            elif arphrd == 1 and os.path.isdir(os.path.join(path, 'wireless')):
+                iface_type = 'wireless'
+            else:
+                iface_type = ARPHRD_TYPES.get(arphrd, 'unknown')
+            
+            # Loopback and tun devices report operstate "unknown" while up
+            is_up = operstate == 'up' or (operstate == 'unknown' and bool(flags & IFF_UP))
+            
+            interfaces.append(NetworkInterface(
                 name=interface_name,
-                mtu=stats.mtu,
-                is_up=stats.isup,
-                addresses=addresses,
-                type=self._get_interface_type(interface_name)
-            )
-            interfaces.append(interface)
+                mtu=mtu,
+                is_up=is_up,
+                addresses=_addresses(addrs.get(interface_name, [])),
+                type=iface_type,
+                index=index
+            ))
         
+        interfaces.sort(key=lambda iface: iface.index)
         return interfaces
+
+class InterfaceManager:
+    def __init__(self, max_age: float = 5.0):
+        self.system = platform.system().lower()
+        self.max_age = max_age
+        self._snapshot = None
+    
+    def snapshot(self, refresh: bool = False) -> InterfaceSnapshot:
+        if refresh or self._snapshot is None or self._snapshot.age() > self.max_age:
+            self._snapshot = InterfaceSnapshot.capture(self.system)
+        return self._snapshot
+    
+    def refresh(self) -> InterfaceSnapshot:
+        return self.snapshot(refresh=True)
+    
+    def get_all_interfaces(self) -> List[NetworkInterface]:
+        return list(self.snapshot().interfaces)
     
     def get_interface_by_name(self, name: str) -> Optional[NetworkInterface]:
-        for interface in self.get_all_interfaces():
-            if interface.name == name:
-                return interface
-        return None
+        return self.snapshot().by_name.get(name)
+    
+    def get_interface_by_index(self, index: int) -> Optional[NetworkInterface]:
+        return self.snapshot().by_index.get(index)
+    
+    def get_interface_by_ip(self, ip: str) -> Optional[NetworkInterface]:
+        return self.snapshot().by_address.get(ip)
+    
+    def get_route(self, ip: str) -> Optional[Dict[str, Any]]:
+        # Egress route the kernel would use for this exact destination
+        if self.system != 'linux':
+            return None
+        
+        route = get_route(ip)
+        if not route or route['ifindex'] is None:
+            return None
+        
+        interface = self.get_interface_by_index(route['ifindex'])
+        return {
+            'interface': interface.name if interface else None,
+            'ifindex': route['ifindex'],
+            'gateway': route['gateway'],
+            'source': route['source'],
+            'mtu': route['mtu'],
+            'expires': route['expires']
+        }
     
     def get_default_interface(self) -> Optional[NetworkInterface]:
         try:
@@ -55,7 +190,7 @@ class InterfaceManager:
                             parts = line.split()
                             if len(parts) >= 4:
                                 interface_ip = parts[3]
-                                return self._find_interface_by_ip(interface_ip)
+                                return self.get_interface_by_ip(interface_ip)
             
             elif self.system == 'darwin':
                 result = run_command(['route', 'get', 'default'])
@@ -66,6 +201,13 @@ class InterfaceManager:
                             return self.get_interface_by_name(interface_name)
             
             else:  # Linux
+                route = get_default_route()
+                if route:
+                    interface = self.get_interface_by_index(route['ifindex'])
+                    if interface:
+                        return interface
+                
+                # Netlink unavailable (e.g. seccomp), ask iproute2 instead
                 result = run_command(['ip', 'route', 'show', 'default'])
                 if result['success']:
                     line = result['stdout'].split('\n')[0]
@@ -84,20 +226,26 @@ class InterfaceManager:
         return active_interfaces[0] if active_interfaces else None
     
     def _get_interface_type(self, name: str) -> str:
-        name_lower = name.lower()
-        if 'eth' in name_lower or 'en' in name_lower:
-            return 'ethernet'
-        elif 'wlan' in name_lower or 'wi-fi' in name_lower or 'wifi' in name_lower:
-            return 'wireless'
-        elif 'lo' in name_lower or 'loopback' in name_lower:
-            return 'loopback'
-        elif 'tun' in name_lower or 'tap' in name_lower:
-            return 'tunnel'
-        else:
-            return 'unknown'
-    
-    def _find_interface_by_ip(self, ip: str) -> Optional[NetworkInterface]:
-        for interface in self.get_all_interfaces():
-            if ip in interface.addresses:
-                return interface
-        return None
\ No newline at end of file
+        return _guess_interface_type(name)
+
+def _read(path: str, name: str) -> str:
+    with open(os.path.join(path, name)) as f:
+        return f.read().strip()
+
+def _addresses(addrs: list) -> List[str]:
+    return [addr.address for addr in addrs
+            if addr.family in (psutil.AF_LINK, 2, 10)]  # MAC, IPv4, IPv6
+
+def _guess_interface_type(name: str) -> str:
+    # Name heuristics for platforms without sysfs
+    name_lower = name.lower()
+    if 'eth' in name_lower or 'en' in name_lower:
+        return 'ethernet'
+    elif 'wlan' in name_lower or 'wi-fi' in name_lower or 'wifi' in name_lower:
+        return 'wireless'
+    elif 'lo' in name_lower or 'loopback' in name_lower:
+        return 'loopback'
+    elif 'tun' in name_lower or 'tap' in name_lower:
+        return 'tunnel'
+    else:
+        return 'unknown'
@@ -0,0 +1,311 @@
+import asyncio
+import heapq
+import itertools
+import json
+import random
+import time
+from collections import OrderedDict, deque
+from typing import Callable, Dict, Iterator, Optional, Any, TextIO, Tuple
+from .batch import read_targets
+from .detector import MTUDetector
+from ..utils.metrics import CONTENT_TYPE, Exposition, Histogram
+from ..utils.network import ProberSet
+
+DEFAULT_PORT = 9821
+
+CHECK_DURATION_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+PROBE_RTT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1)
+
+# Largest request head the metrics endpoint reads
+MAX_REQUEST = 8192
+
+def read_monitor_targets(stream: TextIO) -> Iterator[Tuple[str, Optional[float]]]:
+    # One target per line, optionally followed by its own interval in seconds
+    for line in read_targets(stream):
+        fields = line.split()
+        interval = None
+        if len(fields) > 1:
+            try:
+                interval = float(fields[1])
+            except ValueError:
+                raise ValueError(f'Invalid interval for {fields[0]}: {fields[1]}')
+            if interval <= 0:
+                raise ValueError(f'Invalid interval for {fields[0]}: {fields[1]}')
+        yield fields[0], interval
+
+# What the monitor knows about one target: its latest path MTU and counters,
+# never the results themselves, so memory does not grow with uptime
+class MonitoredTarget:
+    def __init__(self, name: str, interval: float):
+        self.name = name
+        self.interval = interval
+        self.ip = None
+        self.path_mtu = None
+        self.previous_mtu = None
+        self.up = None
+        self.checks = 0
+        self.failures = 0
+        self.probes = 0
+        self.changes = 0
+        self.last_check = None
+        self.last_change = None
+        self.last_error = None
+
+# Periodic path MTU checks of a fixed target list. Scheduling, the checks and
+# the HTTP endpoint serving /metrics (OpenMetrics) and /events (recent changes
+# as JSON) run on one event loop. At most `concurrency` checks run at once,
+# as coroutines awaiting each round of probes on one set of probe sockets
+# (a ProberSet, read on a thread of its own). Interface, route and result
+# cache lookups are quick blocking calls made on the loop.
+# Every check is rescheduled `interval` seconds (+/- jitter) after it ends,
+# and the first round is spread over one interval, so a large target list
+# does not probe in bursts.
+class Monitor:
+    def __init__(self, detector: MTUDetector, interval: float = 300, jitter: float = 0.1,
+                 concurrency: int = 32, max_events: int = 1000,
+                 on_event: Optional[Callable[[Dict[str, Any]], None]] = None, **options):
+        self.detector = detector
+        self.interval = interval
+        self.jitter = jitter
+        self.concurrency = max(1, concurrency)
+        self.on_event = on_event
+        self.options = options
+        self.targets = OrderedDict()
+        self.events = deque(maxlen=max_events)
+        self.check_duration = Histogram(CHECK_DURATION_BUCKETS)
+        self.probe_rtt = Histogram(PROBE_RTT_BUCKETS)
+        self.in_flight = 0
+        self.started = None
+        # Every probe reply the searches see ends up in the RTT histogram
+        self.detector.tester.rtt.observer = self.probe_rtt.observe
+        self._queue = []
+        self._seq = itertools.count()
+        self._wakeup = None
+    
+    def add(self, name: str, interval: Optional[float] = None):
+        if name not in self.targets:
+            self.targets[name] = MonitoredTarget(name, interval or self.interval)
+    
+    async def run(self, host: str = '127.0.0.1', port: int = DEFAULT_PORT,
+                  ready: Optional[Callable[[Tuple], None]] = None):
+        # Runs until cancelled
+        loop = asyncio.get_running_loop()
+        self.started = time.time()
+        self._wakeup = asyncio.Event()
+        # Unless the detector already probes through sockets of its own
+        probers = None
+        if self.detector.tester.probers is None:
+            probers = self.detector.tester.probers = ProberSet()
+        
+        now = loop.time()
+        for target in self.targets.values():
+            self._push(now + random.uniform(0, target.interval), target)
+        
+        server = await asyncio.start_server(self._handle, host, port, limit=MAX_REQUEST)
+        if ready is not None:
+            ready(server.sockets[0].getsockname())
+        try:
+            await self._schedule()
+        finally:
+            server.close()
+            if probers is not None:
+                probers.close()
+                self.detector.tester.probers = None
+    
+    def metrics(self) -> str:
+        exposition = Exposition()
+        targets = list(self.targets.values())
+        
+        exposition.family('mtu_diag_start_time_seconds', 'gauge', 'Time the monitor started', 'seconds')
+        exposition.sample('mtu_diag_start_time_seconds', self.started)
+        exposition.family('mtu_diag_targets', 'gauge', 'Targets being monitored')
+        exposition.sample('mtu_diag_targets', len(targets))
+        exposition.family('mtu_diag_checks_in_flight', 'gauge', 'Path MTU checks running right now')
+        exposition.sample('mtu_diag_checks_in_flight', self.in_flight)
+        
+        exposition.family('mtu_diag_path_mtu_bytes', 'gauge',
+                          'Path MTU found by the last successful check', 'bytes')
+        for target in targets:
+            if target.path_mtu is not None:
+                exposition.sample('mtu_diag_path_mtu_bytes', target.path_mtu, {'target': target.name})
+        
+        exposition.family('mtu_diag_target_up', 'gauge', 'Whether the last check of the target succeeded')
+        for target in targets:
+            if target.up is not None:
+                exposition.sample('mtu_diag_target_up', int(target.up), {'target': target.name})
+        
+        exposition.family('mtu_diag_checks', 'counter', 'Path MTU checks by outcome')
+        for target in targets:
+            exposition.sample('mtu_diag_checks_total', target.checks - target.failures,
+                              {'target': target.name, 'result': 'success'})
+            exposition.sample('mtu_diag_checks_total', target.failures,
+                              {'target': target.name, 'result': 'failure'})
+        
+        exposition.family('mtu_diag_probes', 'counter', 'Probes sent by path MTU searches')
+        for target in targets:
+            exposition.sample('mtu_diag_probes_total', target.probes, {'target': target.name})
+        
+        exposition.family('mtu_diag_path_mtu_changes', 'counter', 'Times the path MTU changed between checks')
+        for target in targets:
+            exposition.sample('mtu_diag_path_mtu_changes_total', target.changes, {'target': target.name})
+        
+        exposition.family('mtu_diag_path_mtu_previous_bytes', 'gauge',
+                          'Path MTU before the most recent change', 'bytes')
+        for target in targets:
+            if target.previous_mtu is not None:
+                exposition.sample('mtu_diag_path_mtu_previous_bytes', target.previous_mtu,
+                                  {'target': target.name})
+        
+        exposition.family('mtu_diag_last_change_timestamp_seconds', 'gauge',
+                          'Time of the most recent path MTU change', 'seconds')
+        for target in targets:
+            if target.last_change is not None:
+                exposition.sample('mtu_diag_last_change_timestamp_seconds', target.last_change,
+                                  {'target': target.name})
+        
+        exposition.family('mtu_diag_last_check_timestamp_seconds', 'gauge',
+                          'Time the last check of the target finished', 'seconds')
+        for target in targets:
+            if target.last_check is not None:
+                exposition.sample('mtu_diag_last_check_timestamp_seconds', target.last_check,
+                                  {'target': target.name})
+        
+        exposition.family('mtu_diag_check_duration_seconds', 'histogram',
+                          'Wall time of one path MTU check', 'seconds')
+        exposition.histogram('mtu_diag_check_duration_seconds', self.check_duration)
+        exposition.family('mtu_diag_probe_rtt_seconds', 'histogram',
+                          'Round-trip time of answered probes', 'seconds')
+        exposition.histogram('mtu_diag_probe_rtt_seconds', self.probe_rtt)
+        
+        return exposition.render()
+    
+    async def _schedule(self):
+        loop = asyncio.get_running_loop()
+        slots = asyncio.Semaphore(self.concurrency)
+        tasks = set()
+        try:
+            while True:
+                if not self._queue:
+                    await self._wait(None)
+                    continue
+                
+                delay = self._queue[0][0] - loop.time()
+                if delay > 0:
+                    await self._wait(delay)
+                    continue
+                
+                await slots.acquire()
+                _, _, target = heapq.heappop(self._queue)
+                task = loop.create_task(self._check(target, slots))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+        finally:
+            for task in tasks:
+                task.cancel()
+    
+    async def _wait(self, timeout: Optional[float]):
+        try:
+            await asyncio.wait_for(self._wakeup.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+        self._wakeup.clear()
+    
+    async def _check(self, target: MonitoredTarget, slots: asyncio.Semaphore):
+        loop = asyncio.get_running_loop()
+        start = loop.time()
+        self.in_flight += 1
+        try:
+            result = await self._detect(target.name)
+        finally:
+            self.in_flight -= 1
+            slots.release()
+        
+        elapsed = loop.time() - start
+        self.check_duration.observe(elapsed)
+        self._record(target, result)
+        
+        spread = 1 + random.uniform(-self.jitter, self.jitter)
+        self._push(loop.time() + target.interval * spread, target)
+    
+    async def _detect(self, name: str) -> Dict[str, Any]:
+        try:
+            return await self.detector.detect_path_mtu_async(name, **self.options)
+        except Exception as e:
+            return {'success': False, 'error': str(e)}
+    
+    def _record(self, target: MonitoredTarget, result: Dict[str, Any]):
+        now = time.time()
+        target.checks += 1
+        target.last_check = now
+        was_up = target.up
+        target.up = bool(result.get('success'))
+        
+        if not target.up:
+            target.failures += 1
+            target.last_error = result.get('error', 'MTU detection failed')
+            if was_up is not False:
+                self._event('down', target, now, error=target.last_error)
+            return
+        
+        target.last_error = None
+        target.ip = result.get('target_ip')
+        target.probes += (result.get('search') or {}).get('probes', 0)
+        if was_up is False:
+            self._event('up', target, now, path_mtu=result['path_mtu'])
+        
+        path_mtu = result['path_mtu']
+        if target.path_mtu is not None and path_mtu != target.path_mtu:
+            target.previous_mtu = target.path_mtu
+            target.changes += 1
+            target.last_change = now
+            self._event('mtu_changed', target, now, previous=target.path_mtu, path_mtu=path_mtu)
+        target.path_mtu = path_mtu
+    
+    def _event(self, kind: str, target: MonitoredTarget, now: float, **fields):
+        event = {'event': kind, 'target': target.name, 'ip': target.ip, 'time': round(now, 3)}
+        event.update(fields)
+        self.events.append(event)
+        if self.on_event is not None:
+            self.on_event(event)
+    
+    def _push(self, due: float, target: MonitoredTarget):
+        # The sequence number keeps targets themselves out of comparisons
+        heapq.heappush(self._queue, (due, next(self._seq), target))
+        if self._wakeup is not None:
+            self._wakeup.set()
+    
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        # Just enough HTTP/1.1 for scrapers: GET, one response, close
+        try:
+            head = await asyncio.wait_for(reader.readuntil(b'\r\n\r\n'), 10)
+            request = head.split(b'\r\n', 1)[0].decode('latin-1').split()
+            if len(request) < 2 or request[0] not in ('GET', 'HEAD'):
+                status, content_type, body = '405 Method Not Allowed', 'text/plain', 'Method not allowed\n'
+            else:
+                path = request[1].split('?', 1)[0]
+                if path == '/metrics':
+                    status, content_type, body = '200 OK', CONTENT_TYPE, self.metrics()
+                elif path == '/events':
+                    status, content_type, body = '200 OK', 'application/json', json.dumps(list(self.events))
+                else:
+                    status, content_type, body = '404 Not Found', 'text/plain', 'Not found\n'
+            
+            data = body.encode()
+            writer.write(f'HTTP/1.1 {status}\r\nContent-Type: {content_type}\r\n'
+                         f'Content-Length: {len(data)}\r\nConnection: close\r\n\r\n'.encode())
+            if request and request[0] != 'HEAD':
+                writer.write(data)
+            await writer.drain()
+        except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, asyncio.TimeoutError,
+                ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+def run_monitor(monitor: Monitor, host: str = '127.0.0.1', port: int = DEFAULT_PORT,
+                ready: Optional[Callable[[Tuple], None]] = None):
+    # Serves until interrupted, like run_responder
+    try:
+        asyncio.run(monitor.run(host, port, ready))
+    except KeyboardInterrupt:
+        pass
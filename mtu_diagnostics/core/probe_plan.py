@@ -0,0 +1,256 @@
+import socket
+import threading
+from typing import TYPE_CHECKING, Awaitable, Callable, Coroutine, Dict, Iterable, List, Optional, Any
+from ..utils.icmp import address_family
+from ..utils.network import ping_result, ping_sizes, udp_probe_with_size, udp_probe_sizes
+from ..utils.loss import LossTracker
+from ..utils.probe_result import OUTCOMES, Outcome, ProbeResult, ProbeSeries
+from ..utils.rtt import RTTTracker
+
+if TYPE_CHECKING:
+    from ..utils.network import ProberSet
+    from ..utils.resolver import Resolver
+
+# IP (20) and ICMP (8) headers; ICMPv6 and UDP headers are 8 bytes too, the
+# IPv6 header is 40
+HEADER_OVERHEAD = 28
+IPV6_HEADER_OVERHEAD = 48
+
+def header_overhead(ip: str) -> int:
+    return IPV6_HEADER_OVERHEAD if address_family(ip) == socket.AF_INET6 else HEADER_OVERHEAD
+
+_driver = threading.local()
+
+# The probing algorithms (ProbeMemo, MTUTester, MTUDetector) are written once,
+# as coroutines whose only awaits are IOSteps. Under asyncio a step awaits its
+# nonblocking I/O; run_blocking instead drives the coroutine without an event
+# loop and does each step's blocking I/O in the calling thread.
+class IOStep:
+    __slots__ = ('blocking', 'nonblocking')
+    
+    def __init__(self, blocking: Callable[[], Any], nonblocking: Callable[[], Awaitable]):
+        self.blocking = blocking
+        self.nonblocking = nonblocking
+    
+    def __await__(self):
+        if getattr(_driver, 'blocking', False):
+            return (yield self)
+        return (yield from self.nonblocking().__await__())
+
+def run_blocking(coroutine: Coroutine) -> Any:
+    previous = getattr(_driver, 'blocking', False)
+    _driver.blocking = True
+    try:
+        value, error = None, None
+        while True:
+            try:
+                step = coroutine.send(value) if error is None else coroutine.throw(error)
+            except StopIteration as stop:
+                return stop.value
+            try:
+                value, error = step.blocking(), None
+            except Exception as e:
+                value, error = None, e
+    finally:
+        _driver.blocking = previous
+
+def resolve_step(resolver: 'Resolver', target: str) -> IOStep:
+    return IOStep(lambda: resolver.resolve(target), lambda: resolver.aresolve(target))
+
+class ProbeMemo:
+    # Outcome of every (ip, MTU size) probed during one run, so test phases
+    # that need the same size share a single probe. With an RTT tracker, each
+    # probe's timeout adapts to the target's measured RTT; with a loss tracker,
+    # timeouts are re-probed until loss is an unlikely explanation. Callers
+    # that only scan can pass retry=False and leave a timeout unsettled until
+    # a later phase actually depends on it. With a UDP port, probes are
+    # datagrams to a responder on that port instead of ICMP echo requests.
+    # Outcomes are kept per target in a ProbeSeries. `on_event` gets a 'probe'
+    # event for every probe sent, as soon as its round is settled; whatever it
+    # raises ends the run. Probes go out through `probers` if given, else
+    # through the calling thread's probers.
+    def __init__(self, rtt: Optional[RTTTracker] = None, loss: Optional[LossTracker] = None,
+                 udp_port: Optional[int] = None,
+                 on_event: Optional[Callable[[Dict[str, Any]], None]] = None,
+                 probers: Optional['ProberSet'] = None):
+        self.rtt = rtt
+        self.loss = loss
+        self.udp_port = udp_port
+        self.on_event = on_event
+        self.probers = probers
+        self.series = {}
+        self.sent = 0
+        self.reused = 0
+        self.retries = 0
+    
+    def get(self, ip: str, mtu_size: int) -> Optional[ProbeResult]:
+        series = self.series.get(ip)
+        return series.get(mtu_size) if series is not None else None
+    
+    def probe(self, ip: str, mtu_size: int, timeout: int = 5, retry: bool = True,
+              min_attempts: int = 1) -> ProbeResult:
+        return run_blocking(self.probe_async(ip, mtu_size, timeout, retry, min_attempts))
+    
+    def probe_many(self, ip: str, mtu_sizes: Iterable[int], timeout: int = 5,
+                   retry: bool = True) -> Dict[int, ProbeResult]:
+        return run_blocking(self.probe_many_async(ip, mtu_sizes, timeout, retry))
+    
+    async def probe_async(self, ip: str, mtu_size: int, timeout: int = 5, retry: bool = True,
+                          min_attempts: int = 1) -> ProbeResult:
+        series = self._series(ip)
+        if mtu_size in series and not (retry and self._unsettled(ip, mtu_size, min_attempts)):
+            self.reused += 1
+            return series.get(mtu_size)
+        
+        await self._probe_missing(ip, [mtu_size], timeout, retry, min_attempts)
+        return series.get(mtu_size)
+    
+    async def probe_many_async(self, ip: str, mtu_sizes: Iterable[int], timeout: int = 5,
+                               retry: bool = True) -> Dict[int, ProbeResult]:
+        series = self._series(ip)
+        mtu_sizes = list(dict.fromkeys(mtu_sizes))
+        missing = [size for size in mtu_sizes
+                   if size not in series or (retry and self._unsettled(ip, size))]
+        self.reused += len(mtu_sizes) - len(missing)
+        
+        if missing:
+            await self._probe_missing(ip, missing, timeout, retry)
+        
+        return {size: series.get(size) for size in mtu_sizes}
+    
+    def stats(self) -> Dict[str, int]:
+        return {'sent': self.sent, 'reused': self.reused, 'retries': self.retries}
+    
+    async def _probe_missing(self, ip: str, mtu_sizes: List[int], timeout: int, retry: bool = True,
+                             min_attempts: int = 1):
+        # Replies and Frag-Needed errors are definitive. A timeout may just be
+        # a lost packet, so only those sizes are sent again, all together,
+        # until the sequential test settles them.
+        series = self._series(ip)
+        pending = mtu_sizes
+        while pending:
+            replies = await IOStep(lambda: self._send(ip, pending, timeout),
+                                   lambda: self._send_async(ip, pending, timeout))
+            
+            for size in pending:
+                previous = series.get(size)
+                if previous:
+                    self.retries += 1
+                
+                result = replies[size]
+                result.size = size
+                result.attempts = previous.attempts + 1 if previous else 1
+                result.confidence = 1.0
+                if result.success and self.loss:
+                    self.loss.record(ip, result.attempts)
+                series.put(result)
+            
+            sent, pending = pending, [size for size in pending if self._unsettled(ip, size, min_attempts)]
+            if self.on_event is not None:
+                # After _unsettled, so timeouts carry their updated confidence
+                for size in sent:
+                    self.on_event({'event': 'probe', 'ip': ip, **series.get(size).to_dict()})
+            if not retry:
+                break
+    
+    def _unsettled(self, ip: str, mtu_size: int, min_attempts: int = 1) -> bool:
+        # Updates the confidence of a timed out size from the evidence so far
+        series = self.series[ip]
+        if series.outcome(mtu_size) is not Outcome.FAILED:
+            return False
+        
+        timeouts = self._timeouts_at_or_below(ip, mtu_size)
+        if timeouts is None:
+            series.set_confidence(mtu_size, 1.0)
+            return False
+        if not self.loss:
+            series.set_confidence(mtu_size, 0.0)
+            return False
+        
+        series.set_confidence(mtu_size, round(self.loss.confidence_of(ip, timeouts), 4))
+        attempts = series.get(mtu_size).attempts
+        if attempts < min_attempts:
+            return True
+        return attempts < self.loss.max_attempts and not self.loss.settled(ip, timeouts)
+    
+    def _timeouts_at_or_below(self, ip: str, mtu_size: int) -> Optional[int]:
+        # If mtu_size fits, so does every smaller size, so every timeout at or
+        # below it was a lost packet and counts as evidence against it. None
+        # when a smaller size got Frag-Needed, which settles it outright.
+        series = self.series[ip]
+        timeouts = 0
+        for size, code, attempts in zip(series.sizes, series.outcomes, series.attempts):
+            if size > mtu_size:
+                continue
+            outcome = OUTCOMES[code]
+            if outcome is Outcome.MTU_EXCEEDED:
+                return None
+            if outcome is Outcome.FAILED:
+                timeouts += attempts
+        return timeouts
+    
+    def _series(self, ip: str) -> ProbeSeries:
+        series = self.series.get(ip)
+        if series is None:
+            series = self.series[ip] = ProbeSeries()
+        return series
+    
+    def _send(self, ip: str, mtu_sizes: List[int], timeout: int) -> Dict[int, ProbeResult]:
+        timeout = self.rtt.timeout(ip, timeout) if self.rtt else timeout
+        overhead = header_overhead(ip)
+        payload_sizes = [size - overhead for size in mtu_sizes]
+        if self.probers is not None:
+            payloads = self.probers.probe_sizes(ip, payload_sizes, timeout, self.udp_port)
+        elif self.udp_port is not None:
+            if len(mtu_sizes) == 1:
+                payloads = {payload_sizes[0]: udp_probe_with_size(ip, payload_sizes[0], self.udp_port, timeout)}
+            else:
+                payloads = udp_probe_sizes(ip, payload_sizes, self.udp_port, timeout)
+        elif len(mtu_sizes) == 1:
+            payloads = {payload_sizes[0]: ping_result(ip, payload_sizes[0], dont_fragment=True,
+                                                      timeout=timeout)}
+        else:
+            payloads = ping_sizes(ip, payload_sizes, dont_fragment=True, timeout=timeout)
+        return self._received(ip, mtu_sizes, payloads)
+    
+    async def _send_async(self, ip: str, mtu_sizes: List[int], timeout: int) -> Dict[int, ProbeResult]:
+        # Without a ProberSet, the thread probers are only safe to use from
+        # one thread at a time, so the blocking send runs in the executor
+        if self.probers is None:
+            import asyncio
+            
+            return await asyncio.get_running_loop().run_in_executor(None, self._send, ip, mtu_sizes, timeout)
+        
+        timeout = self.rtt.timeout(ip, timeout) if self.rtt else timeout
+        overhead = header_overhead(ip)
+        payloads = await self.probers.probe_sizes_async(ip, [size - overhead for size in mtu_sizes],
+                                                        timeout, self.udp_port)
+        return self._received(ip, mtu_sizes, payloads)
+    
+    def _received(self, ip: str, mtu_sizes: List[int],
+                  payloads: Dict[int, ProbeResult]) -> Dict[int, ProbeResult]:
+        overhead = header_overhead(ip)
+        replies = {size: payloads[size - overhead] for size in mtu_sizes}
+        
+        self.sent += len(mtu_sizes)
+        if self.rtt:
+            for result in replies.values():
+                if result.success:
+                    self.rtt.sample(ip, result.rtt)
+        return replies
+
+def plan_probes(common_sizes: List[int], jumbo_sizes: List[int], start_size: int,
+                include_jumbo: bool) -> Dict[str, List[int]]:
+    # Every size the comprehensive test phases may ask for. The common sizes
+    # test needs all of its sizes, so those are probed up front; the path MTU
+    # search and jumbo test stop at their first answer, so the rest is only
+    # probed on demand through the memo.
+    prefetch = [size for size in common_sizes if size > HEADER_OVERHEAD]
+    on_demand = [start_size] + (list(jumbo_sizes) if include_jumbo else [])
+    sizes = sorted(set(prefetch) | set(on_demand), reverse=True)
+    
+    return {
+        'sizes': sizes,
+        'prefetch': prefetch,
+        'on_demand': [size for size in sizes if size not in prefetch]
+    }
@@ -0,0 +1,79 @@
+import asyncio
+import socket
+from typing import Dict, Optional, Any, Tuple
+from ..utils.udp import DEFAULT_PORT, build_ack
+
+# Endpoint for UDP probing (`--udp`). One socket on the event loop serves any
+# number of clients; each probe is answered statelessly with a small ack.
+class ResponderProtocol(asyncio.DatagramProtocol):
+    def __init__(self):
+        self.transport = None
+        self.probes = 0
+        self.ignored = 0
+        self.largest = 0
+    
+    def connection_made(self, transport: asyncio.DatagramTransport):
+        self.transport = transport
+    
+    def datagram_received(self, data: bytes, addr: Tuple[str, int]):
+        ack = build_ack(data)
+        if ack is None:
+            self.ignored += 1
+            return
+        
+        self.probes += 1
+        self.largest = max(self.largest, len(data))
+        self.transport.sendto(ack, addr)
+    
+    def error_received(self, exc: Exception):
+        # ICMP errors for acks to clients that went away, nothing to do
+        pass
+    
+    def stats(self) -> Dict[str, Any]:
+        return {'probes': self.probes, 'ignored': self.ignored, 'largest': self.largest}
+
+async def start_responder(host: str = '::', port: int = DEFAULT_PORT
+                          ) -> Tuple[asyncio.DatagramTransport, ResponderProtocol]:
+    loop = asyncio.get_running_loop()
+    return await loop.create_datagram_endpoint(ResponderProtocol, sock=_bind(host, port))
+
+def _bind(host: str, port: int) -> socket.socket:
+    # The IPv6 wildcard also takes IPv4 probes (as v4-mapped addresses), so one
+    # responder serves both families; hosts without IPv6 fall back to 0.0.0.0
+    family = socket.AF_INET6 if ':' in host else socket.AF_INET
+    try:
+        sock = socket.socket(family, socket.SOCK_DGRAM)
+    except OSError:
+        if host != '::':
+            raise
+        host, sock = '0.0.0.0', socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    
+    try:
+        if sock.family == socket.AF_INET6 and host == '::':
+            sock.setsockopt(socket.IPPROTO_IPV6, socket.IPV6_V6ONLY, 0)
+        sock.bind((host, port))
+    except OSError:
+        sock.close()
+        raise
+    return sock
+
+def run_responder(host: str = '::', port: int = DEFAULT_PORT,
+                  ready: Optional[callable] = None) -> Dict[str, Any]:
+    # Serves until interrupted and returns the counters
+    stats = {}
+    
+    async def serve():
+        transport, protocol = await start_responder(host, port)
+        if ready is not None:
+            ready(transport.get_extra_info('sockname'))
+        try:
+            await asyncio.Event().wait()
+        finally:
+            stats.update(protocol.stats())
+            transport.close()
+    
+    try:
+        asyncio.run(serve())
+    except KeyboardInterrupt:
+        pass
+    return stats
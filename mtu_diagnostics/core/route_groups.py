@@ -0,0 +1,230 @@
+import ipaddress
+import threading
+from collections import OrderedDict
+from typing import Dict, Optional, Any, Tuple
+from .detector import MTUDetector
+from .tracepath import Tracepath
+from ..utils.ratelimit import get_rate_limiter
+
+# Targets behind the same egress interface, gateway and route MTU (and, with
+# `hops`, the same first routers towards their /24 or /64) almost always share
+# a path MTU. The first target of a group gets the full search; the others
+# wait for it and are then checked at its boundary, the path MTU itself and
+# one byte more, and only searched in full if they disagree. A group whose representative fails stays
+# open, every member is searched until one succeeds.
+class RouteGroup:
+    def __init__(self, group_id: int, key: Tuple):
+        self.id = group_id
+        self.key = key
+        self.state = 'new'  # 'new', 'probing', 'settled' or 'open'
+        self.representative = None
+        self.result = None
+        self.members = 0
+        self.verified = 0
+        self.diverged = 0
+        self.diverged_targets = []
+
+class RouteGroups:
+    def __init__(self, detector: MTUDetector, hops: int = 0, hop_timeout: float = 1,
+                 max_groups: int = 4096, max_diverged_targets: int = 20):
+        self.detector = detector
+        self.hops = hops
+        self.hop_timeout = hop_timeout
+        self.max_groups = max_groups
+        self.max_diverged_targets = max_diverged_targets
+        self.representatives = 0
+        self.verified = 0
+        self.diverged = 0
+        self.ungrouped = 0
+        self.probes_saved = 0
+        self._groups = OrderedDict()
+        self._diverged_groups = OrderedDict()
+        self._prefix_routers = OrderedDict()
+        self._tracing = set()
+        self._next_id = 0
+        self._cond = threading.Condition()
+    
+    def detect_path_mtu(self, target: str, **options) -> Dict[str, Any]:
+        key, key_probes = self._key(target)
+        if key is None:
+            with self._cond:
+                self.ungrouped += 1
+            return self.detector.detect_path_mtu(target, **options)
+        
+        with self._cond:
+            group = self._group(key)
+            group.members += 1
+            while group.state == 'probing':
+                self._cond.wait()
+            
+            role = 'member'
+            if group.state == 'new':
+                group.state = 'probing'
+                group.representative = target
+                self.representatives += 1
+                role = 'representative'
+            representative = group.result if group.state == 'settled' else None
+        
+        if representative is not None:
+            result = self._verify(target, representative)
+            with self._cond:
+                if result is not None:
+                    saved = self._search_probes(representative) - result['search']['probes'] - key_probes
+                    self.probes_saved += saved
+                    group.verified += 1
+                    self.verified += 1
+                else:
+                    group.diverged += 1
+                    self.diverged += 1
+                    if len(group.diverged_targets) < self.max_diverged_targets:
+                        group.diverged_targets.append(target)
+                    self._diverged_groups[group.id] = group
+            if result is not None:
+                result['route_group'] = {'id': group.id, 'role': role, 'representative': group.representative}
+                return result
+        
+        result = None
+        try:
+            result = self.detector.detect_path_mtu(target, **options)
+        finally:
+            # Members wait while the group is 'probing', so it must leave
+            # that state even when the search raises
+            with self._cond:
+                if role == 'representative' or group.state == 'open':
+                    if result is not None and result.get('success'):
+                        group.state = 'settled'
+                        group.result = result
+                        group.representative = target
+                        role = 'representative'
+                    else:
+                        group.state = 'open'
+                    self._cond.notify_all()
+        
+        result['route_group'] = {'id': group.id, 'role': role, 'representative': group.representative}
+        if representative is not None:
+            result['route_group']['diverged'] = True
+        return result
+    
+    def stats(self) -> Dict[str, Any]:
+        with self._cond:
+            return {
+                'groups': self._next_id,
+                'representatives': self.representatives,
+                'verified': self.verified,
+                'diverged': self.diverged,
+                'ungrouped': self.ungrouped,
+                'probes_saved': self.probes_saved,
+                'diverged_groups': [self._describe(group) for group in self._diverged_groups.values()]
+            }
+    
+    def _key(self, target: str) -> Tuple[Optional[Tuple], int]:
+        # (interface, gateway, route MTU[, first routers]) and the probes spent on it
+        ip = self.detector.resolver.resolve(target)
+        route = self.detector.interface_manager.get_route(ip) if ip else None
+        if not route:
+            return None, 0
+        
+        key = (route['interface'], route['gateway'], route['mtu'])
+        if not self.hops:
+            return key, 0
+        
+        routers, probes = self._routers(key, ip)
+        if routers is None:
+            return None, 0
+        return key + routers, probes
+    
+    def _routers(self, key: Tuple, ip: str) -> Tuple[Optional[Tuple], int]:
+        # Routers answer TTL expiry at a low rate (typically one per second
+        # after a short burst), so tracing every target would mostly time
+        # out. They are traced once per /24 (/64 for IPv6) behind each route
+        # and shared.
+        address = ipaddress.ip_address(ip)
+        prefix = key + (ipaddress.ip_network(f'{ip}/{24 if address.version == 4 else 64}', strict=False),)
+        with self._cond:
+            while prefix in self._tracing:
+                self._cond.wait()
+            if prefix in self._prefix_routers:
+                self._prefix_routers.move_to_end(prefix)
+                return self._prefix_routers[prefix], 0
+            self._tracing.add(prefix)
+        
+        # Paced like every other probe, the per-target limit included
+        tracer = Tracepath(timeout=self.hop_timeout, limiter=get_rate_limiter())
+        routers = tracer.routers(ip, self.hops)
+        
+        with self._cond:
+            self._tracing.discard(prefix)
+            if routers is not None:
+                routers = tuple(routers)
+                self._prefix_routers[prefix] = routers
+                if len(self._prefix_routers) > self.max_groups:
+                    self._prefix_routers.popitem(last=False)
+            self._cond.notify_all()
+        return routers, tracer.probes
+    
+    def _group(self, key: Tuple) -> RouteGroup:
+        group = self._groups.get(key)
+        if group is not None:
+            self._groups.move_to_end(key)
+            return group
+        
+        if len(self._groups) >= self.max_groups:
+            # Oldest first, a group still being probed has waiters
+            oldest_key, oldest = next(iter(self._groups.items()))
+            if oldest.state != 'probing':
+                del self._groups[oldest_key]
+        
+        group = self._groups[key] = RouteGroup(self._next_id, key)
+        self._next_id += 1
+        return group
+    
+    def _verify(self, target: str, representative: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        # The representative's path MTU must fit (re-probed until loss is
+        # ruled out) and one byte more must not; None if the target disagrees
+        ip = self.detector.resolver.resolve(target)
+        path_mtu = representative['path_mtu']
+        memo = self.detector.tester.new_memo()
+        
+        if not memo.probe(ip, path_mtu).success:
+            return None
+        above = memo.probe(ip, path_mtu + 1, retry=False)
+        if above.success:
+            return None
+        
+        result = {
+            'success': True,
+            'interface': representative['interface'],
+            'target': target,
+            'path_mtu': path_mtu,
+            'interface_mtu': representative['interface_mtu'],
+            'mtu_optimal': representative['mtu_optimal'],
+            'target_ip': ip,
+            'search': {'method': 'route_group', 'fanout': 1, 'rounds': memo.sent, 'probes': memo.sent,
+                       'confidence': above.confidence}
+        }
+        if representative.get('route'):
+            result['route'] = representative['route']
+        return result
+    
+    def _search_probes(self, result: Dict[str, Any]) -> int:
+        # What a full search of a member would have cost, judged by the
+        # representative's; nothing when it came from a cache
+        search = result.get('search')
+        if not search or result.get('cached') or result.get('kernel_cache'):
+            return 0
+        return search['probes']
+    
+    def _describe(self, group: RouteGroup) -> Dict[str, Any]:
+        interface, gateway, route_mtu = group.key[:3]
+        return {
+            'id': group.id,
+            'interface': interface,
+            'gateway': gateway,
+            'route_mtu': route_mtu,
+            'routers': list(group.key[3:]),
+            'representative': group.representative,
+            'path_mtu': group.result['path_mtu'] if group.result else None,
+            'members': group.members,
+            'diverged': group.diverged,
+            'diverged_targets': group.diverged_targets
+        }
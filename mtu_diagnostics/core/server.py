@@ -0,0 +1,147 @@
+import asyncio
+import io
+import json
+import os
+import socket
+import stat
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import Callable, Dict, List, Optional, Any, Tuple
+from ..utils.client import MAX_MESSAGE
+
+# sys.stdout / sys.stderr stand-in that writes to a buffer for threads
+# capturing a command's output and to the real stream for everyone else
+class ThreadLocalStream(io.TextIOBase):
+    def __init__(self, stream):
+        self.stream = stream
+        self._local = threading.local()
+    
+    @property
+    def encoding(self):
+        return 'utf-8'
+    
+    def writable(self) -> bool:
+        return True
+    
+    def isatty(self) -> bool:
+        return getattr(self._local, 'buffer', None) is None and self.stream.isatty()
+    
+    def write(self, text: str) -> int:
+        buffer = getattr(self._local, 'buffer', None)
+        return (buffer or self.stream).write(text)
+    
+    def flush(self):
+        buffer = getattr(self._local, 'buffer', None)
+        (buffer or self.stream).flush()
+    
+    @contextmanager
+    def capture(self, buffer: io.StringIO):
+        self._local.buffer = buffer
+        try:
+            yield buffer
+        finally:
+            self._local.buffer = None
+
+# Runs command lines sent over a Unix socket (see utils.client.forward) with
+# `execute`, which returns (stdout, stderr, exit code). Commands run on a
+# thread pool whose threads live as long as the server, so their probe
+# sockets are reused, and `execute` is free to keep any other state warm.
+# The socket is only accessible to its owner.
+class CommandServer:
+    def __init__(self, execute: Callable[[List[str]], Tuple[str, str, int]], path: str,
+                 workers: int = 16):
+        self.execute = execute
+        self.path = path
+        self.workers = max(1, workers)
+        self.requests = 0
+        self.failures = 0
+        self._executor = None
+    
+    async def serve(self, ready: Optional[Callable[[str], None]] = None):
+        # Runs until cancelled
+        self._prepare_path()
+        self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='mtu-server')
+        old_umask = os.umask(0o177)
+        try:
+            server = await asyncio.start_unix_server(self._handle, self.path, limit=MAX_MESSAGE)
+        finally:
+            os.umask(old_umask)
+        if ready is not None:
+            ready(self.path)
+        try:
+            await asyncio.Event().wait()
+        finally:
+            server.close()
+            self._executor.shutdown(wait=False)
+            try:
+                os.unlink(self.path)
+            except OSError:
+                pass
+    
+    def stats(self) -> Dict[str, Any]:
+        return {'requests': self.requests, 'failures': self.failures}
+    
+    def _prepare_path(self):
+        # A socket left behind by a server that died is replaced; one that
+        # still answers means another server is running
+        os.makedirs(os.path.dirname(self.path) or '.', mode=0o700, exist_ok=True)
+        try:
+            mode = os.stat(self.path).st_mode
+        except FileNotFoundError:
+            return
+        if not stat.S_ISSOCK(mode):
+            raise OSError(f'{self.path} exists and is not a socket')
+        
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as probe:
+            try:
+                probe.connect(self.path)
+            except OSError:
+                os.unlink(self.path)
+                return
+        raise OSError(f'Another server is listening on {self.path}')
+    
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        loop = asyncio.get_running_loop()
+        try:
+            line = await reader.readline()
+            try:
+                request = json.loads(line)
+                argv = [str(arg) for arg in request['argv']]
+            except (ValueError, KeyError, TypeError):
+                response = {'stdout': '', 'stderr': 'Error: Invalid request\n', 'exit_code': 1}
+            else:
+                self.requests += 1
+                stdout, stderr, exit_code = await loop.run_in_executor(self._executor, self._run, argv)
+                if exit_code:
+                    self.failures += 1
+                response = {'stdout': stdout, 'stderr': stderr, 'exit_code': exit_code}
+            
+            writer.write(json.dumps(response).encode() + b'\n')
+            await writer.drain()
+        except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, ValueError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+    
+    def _run(self, argv: List[str]) -> Tuple[str, str, int]:
+        try:
+            return self.execute(argv)
+        except Exception as e:
+            return '', f'Error: {e}\n', 1
+
+def capture_streams() -> Tuple[ThreadLocalStream, ThreadLocalStream]:
+    # Installs (once) the thread-local sys.stdout and sys.stderr
+    if not isinstance(sys.stdout, ThreadLocalStream):
+        sys.stdout = ThreadLocalStream(sys.stdout)
+    if not isinstance(sys.stderr, ThreadLocalStream):
+        sys.stderr = ThreadLocalStream(sys.stderr)
+    return sys.stdout, sys.stderr
+
+def run_server(server: CommandServer, ready: Optional[Callable[[str], None]] = None):
+    # Serves until interrupted, like run_responder
+    try:
+        asyncio.run(server.serve(ready))
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,96 @@
+import threading
+from typing import TYPE_CHECKING, Any, Dict, Optional
+from .detector import MTUDetector
+from ..utils.loss import LossTracker
+from ..utils.network import ProberSet
+from ..utils.rtt import RTTTracker
+
+if TYPE_CHECKING:
+    from ..utils.cache import PathMTUCache
+
+# One detector shared by every check for as long as the session is open:
+# resolver cache, interface snapshot, and RTT and loss estimates, so a
+# target checked again skips its RTT baseline. Every check probes through the
+# session's own sockets (a ProberSet), whichever thread or event loop it runs
+# on, and close() closes them. Those sockets are read by one event loop
+# thread the session starts on first use. The async variants run the checks
+# as coroutines on the caller's event loop and await each round of probes
+# from that thread; interface, route and result cache lookups are quick
+# blocking calls made on the caller's loop.
+#
+#   with MTUSession() as session:
+#       session.detect_path_mtu('10.0.0.5')
+#
+#   async with MTUSession() as session:
+#       results = await asyncio.gather(*(session.detect_path_mtu_async(t) for t in targets))
+class MTUSession:
+    def __init__(self, cache: Optional['PathMTUCache'] = None, rtt: Optional[RTTTracker] = None,
+                 loss: Optional[LossTracker] = None, udp_port: Optional[int] = None):
+        self.probers = ProberSet()
+        self.detector = MTUDetector(cache=cache, rtt=rtt, loss=loss, udp_port=udp_port,
+                                    probers=self.probers)
+        self.closed = False
+        self._lock = threading.Lock()
+    
+    def __enter__(self) -> 'MTUSession':
+        return self
+    
+    def __exit__(self, *exc_info):
+        self.close()
+    
+    async def __aenter__(self) -> 'MTUSession':
+        return self
+    
+    async def __aexit__(self, *exc_info):
+        self.close()
+    
+    def detect_path_mtu(self, target: str, interface_name: Optional[str] = None,
+                        **options) -> Dict[str, Any]:
+        self._check_open()
+        return self.detector.detect_path_mtu(target, interface_name, **options)
+    
+    def test_common_sizes(self, target: str, timeout: float = 5,
+                          concurrent: bool = False) -> Dict[str, Any]:
+        self._check_open()
+        return self.detector.tester.test_common_sizes(target, timeout, concurrent)
+    
+    def test_jumbo_frames(self, target: str, timeout: float = 10) -> Dict[str, Any]:
+        self._check_open()
+        return self.detector.tester.test_jumbo_frames(target, timeout)
+    
+    def comprehensive_mtu_test(self, target: str, interface_name: Optional[str] = None,
+                               **options) -> Dict[str, Any]:
+        self._check_open()
+        return self.detector.comprehensive_mtu_test(target, interface_name, **options)
+    
+    async def detect_path_mtu_async(self, target: str, interface_name: Optional[str] = None,
+                                    **options) -> Dict[str, Any]:
+        self._check_open()
+        return await self.detector.detect_path_mtu_async(target, interface_name, **options)
+    
+    async def test_common_sizes_async(self, target: str, timeout: float = 5,
+                                      concurrent: bool = False) -> Dict[str, Any]:
+        self._check_open()
+        return await self.detector.tester.test_common_sizes_async(target, timeout, concurrent)
+    
+    async def test_jumbo_frames_async(self, target: str, timeout: float = 10) -> Dict[str, Any]:
+        self._check_open()
+        return await self.detector.tester.test_jumbo_frames_async(target, timeout)
+    
+    async def comprehensive_mtu_test_async(self, target: str, interface_name: Optional[str] = None,
+                                           **options) -> Dict[str, Any]:
+        self._check_open()
+        return await self.detector.comprehensive_mtu_test_async(target, interface_name, **options)
+    
+    def close(self):
+        # Checks still probing get a RuntimeError from their next round
+        with self._lock:
+            if self.closed:
+                return
+            self.closed = True
+        self.probers.close()
+        self.detector.close()
+    
+    def _check_open(self):
+        if self.closed:
+            raise RuntimeError('MTUSession is closed')
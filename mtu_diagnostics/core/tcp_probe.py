@@ -0,0 +1,219 @@
+import asyncio
+import fcntl
+import os
+import socket
+import struct
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional, Any, Tuple
+from ..utils.icmp import FAMILY_OPTIONS, address_family, set_pmtu_discovery
+
+# IPv4 (20) and TCP (20) headers without options, IPv6 (40) and TCP
+TCP_OVERHEAD = 40
+TCP_IPV6_OVERHEAD = 60
+TCP_TIMESTAMPS_OVERHEAD = 12
+TCPI_OPT_TIMESTAMPS = 1
+
+# Bytes in the send queue the peer has not acknowledged yet
+SIOCOUTQ = 0x5411
+
+def tcp_overhead(ip: str) -> int:
+    return TCP_IPV6_OVERHEAD if address_family(ip) == socket.AF_INET6 else TCP_OVERHEAD
+
+# struct tcp_info up to tcpi_reordering: 8 u8 fields, then u32 fields from
+# tcpi_rto on
+TCP_INFO = struct.Struct('=8B21I')
+TCP_INFO_FIELDS = ('rto', 'ato', 'snd_mss', 'rcv_mss', 'unacked', 'sacked', 'lost', 'retrans',
+                   'fackets', 'last_data_sent', 'last_ack_sent', 'last_data_recv', 'last_ack_recv',
+                   'pmtu', 'rcv_ssthresh', 'rtt', 'rttvar', 'snd_ssthresh', 'snd_cwnd', 'advmss',
+                   'reordering')
+
+def read_tcp_info(sock: socket.socket) -> Optional[Dict[str, int]]:
+    try:
+        data = sock.getsockopt(socket.IPPROTO_TCP, socket.TCP_INFO, 104)
+    except (OSError, AttributeError):
+        return None
+    if len(data) < TCP_INFO.size:
+        return None
+    values = TCP_INFO.unpack_from(data)
+    info = dict(zip(TCP_INFO_FIELDS, values[8:]))
+    info['options'] = values[5]
+    return info
+
+def unacked_bytes(sock: socket.socket) -> Optional[int]:
+    try:
+        return struct.unpack('i', fcntl.ioctl(sock.fileno(), SIOCOUTQ, b'\x00' * 4))[0]
+    except OSError:
+        return None
+
+# Idle connections kept per (ip, port), so repeated probes of a service do not
+# pay a handshake each time. A connection the peer has closed is discarded
+# when it is next handed out. Only connections that never carried data are
+# pooled, a push leaves filler bytes in the stream that no protocol expects.
+class TCPConnectionPool:
+    def __init__(self, max_idle: int = 64, idle_timeout: float = 30):
+        self.max_idle = max_idle
+        self.idle_timeout = idle_timeout
+        self._idle = OrderedDict()
+        self._lock = threading.Lock()
+    
+    def acquire(self, ip: str, port: int) -> Optional[socket.socket]:
+        now = time.monotonic()
+        with self._lock:
+            connections = self._idle.get((ip, port))
+            while connections:
+                sock, released = connections.pop()
+                if not connections:
+                    del self._idle[(ip, port)]
+                if now - released < self.idle_timeout and self._alive(sock):
+                    return sock
+                sock.close()
+                connections = self._idle.get((ip, port))
+        return None
+    
+    def release(self, ip: str, port: int, sock: socket.socket):
+        with self._lock:
+            self._idle.setdefault((ip, port), []).append((sock, time.monotonic()))
+            self._idle.move_to_end((ip, port))
+            
+            while sum(len(connections) for connections in self._idle.values()) > self.max_idle:
+                key, connections = next(iter(self._idle.items()))
+                connections.pop(0)[0].close()
+                if not connections:
+                    del self._idle[key]
+    
+    def close(self):
+        with self._lock:
+            for connections in self._idle.values():
+                for sock, _ in connections:
+                    sock.close()
+            self._idle.clear()
+    
+    def _alive(self, sock: socket.socket) -> bool:
+        try:
+            return sock.recv(1, socket.MSG_PEEK | socket.MSG_DONTWAIT) != b''
+        except BlockingIOError:
+            return True
+        except OSError:
+            return False
+
+# Measures what TCP actually does on a path: the MSS negotiated with the
+# peer (after any middlebox clamping), the kernel's PMTU for the connection,
+# and optionally whether full-sized DF segments are acknowledged or stall in
+# a PMTU black hole. Every connection runs on one event loop.
+class TCPProber:
+    def __init__(self, pool: Optional[TCPConnectionPool] = None):
+        self.pool = pool or TCPConnectionPool()
+    
+    def probe(self, ip: str, port: int, timeout: float = 5, push_segments: int = 0) -> Dict[str, Any]:
+        return asyncio.run(self.probe_async(ip, port, timeout, push_segments))
+    
+    def probe_many(self, targets: List[Tuple[str, int]], timeout: float = 5,
+                   push_segments: int = 0) -> List[Dict[str, Any]]:
+        async def run():
+            return await asyncio.gather(*(self.probe_async(ip, port, timeout, push_segments)
+                                          for ip, port in targets))
+        
+        return asyncio.run(run())
+    
+    async def probe_async(self, ip: str, port: int, timeout: float = 5,
+                          push_segments: int = 0) -> Dict[str, Any]:
+        loop = asyncio.get_running_loop()
+        result = {'success': False, 'ip': ip, 'port': port}
+        
+        start = time.monotonic()
+        sock = self.pool.acquire(ip, port)
+        result['reused'] = sock is not None
+        if sock is None:
+            family = address_family(ip)
+            if family is None:
+                result['error'] = f'Not an IP address: {ip}'
+                return result
+            sock = socket.socket(family, socket.SOCK_STREAM)
+            sock.setblocking(False)
+            try:
+                # Let Frag-Needed / Packet Too Big shrink the MSS instead of fragmenting
+                set_pmtu_discovery(sock, family)
+                await asyncio.wait_for(loop.sock_connect(sock, (ip, port)), timeout)
+            except asyncio.TimeoutError:
+                sock.close()
+                result['error'] = f'Connection to {ip}:{port} timed out'
+                return result
+            except OSError as e:
+                sock.close()
+                result['error'] = f'Connection to {ip}:{port} failed: {os.strerror(e.errno) if e.errno else e}'
+                return result
+        result['connect_time'] = round(time.monotonic() - start, 6)
+        
+        info = read_tcp_info(sock)
+        if info is None:
+            sock.close()
+            result['error'] = 'TCP_INFO is not available on this platform'
+            return result
+        
+        result.update(self._segment_sizes(sock, info))
+        result['success'] = True
+        
+        if push_segments > 0:
+            result['push'] = await self._push(sock, push_segments, timeout)
+            sock.close()
+        else:
+            self.pool.release(ip, port, sock)
+        return result
+    
+    def _segment_sizes(self, sock: socket.socket, info: Dict[str, int]) -> Dict[str, Any]:
+        # snd_mss excludes the TCP options in use, add timestamps back to get
+        # the MSS the packet size is based on
+        timestamps = bool(info['options'] & TCPI_OPT_TIMESTAMPS)
+        mss = info['snd_mss'] + (TCP_TIMESTAMPS_OVERHEAD if timestamps else 0)
+        options = FAMILY_OPTIONS[sock.family]
+        try:
+            ip_mtu = sock.getsockopt(options['level'], options['mtu'])
+        except OSError:
+            ip_mtu = info['pmtu'] or None
+        
+        return {
+            'mss': mss,
+            'mss_mtu': mss + (TCP_IPV6_OVERHEAD if sock.family == socket.AF_INET6 else TCP_OVERHEAD),
+            'ip_mtu': ip_mtu,
+            'advmss': info['advmss'],
+            'timestamps': timestamps,
+            'rtt': info['rtt'] / 1e6
+        }
+    
+    async def _push(self, sock: socket.socket, segments: int, timeout: float) -> Dict[str, Any]:
+        # Full-sized segments must all be acknowledged. If the send queue does
+        # not drain, large packets are being dropped without Frag-Needed.
+        loop = asyncio.get_running_loop()
+        info = read_tcp_info(sock)
+        data = b'\x00' * (info['snd_mss'] * segments)
+        
+        start = time.monotonic()
+        deadline = start + timeout
+        unacked = None
+        try:
+            await asyncio.wait_for(loop.sock_sendall(sock, data), timeout)
+            while time.monotonic() < deadline:
+                unacked = unacked_bytes(sock)
+                if not unacked:
+                    break
+                await asyncio.sleep(min(0.01, max(0, deadline - time.monotonic())))
+            else:
+                unacked = unacked_bytes(sock)
+        except asyncio.TimeoutError:
+            unacked = unacked_bytes(sock)
+        except OSError as e:
+            return {'bytes': len(data), 'stalled': True, 'error': str(e)}
+        
+        after = read_tcp_info(sock) or info
+        return {
+            'bytes': len(data),
+            'segments': segments,
+            'stalled': bool(unacked),
+            'unacked': unacked,
+            'drain_time': round(time.monotonic() - start, 6),
+            'retransmits': after['retrans'],
+            'pmtu_after': after['pmtu'],
+            'mss_after': after['snd_mss']
+        }
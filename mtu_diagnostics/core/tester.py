@@ -1,15 +1,47 @@
-from typing import Dict, Optional, List, Tuple
-from ..utils.network import ping_with_size, resolve_hostname
+import socket
+from typing import TYPE_CHECKING, Any, Callable, Dict, Optional, List, Tuple
+from ..utils.icmp import address_family
+from ..utils.resolver import Resolver
+from ..utils.loss import LossTracker
+from ..utils.probe_result import Outcome, ProbeResult, ProbeSeries
+from ..utils.rtt import RTTTracker
 from .interface import NetworkInterface
+from .probe_plan import ProbeMemo, header_overhead, plan_probes, resolve_step, run_blocking
 
+if TYPE_CHECKING:
+    from ..utils.network import ProberSet
+
+# Smallest MTU every IPv4 link must support
+BASELINE_MTU = 68
+# Every IPv6 link carries 1280 bytes, and Packet Too Big never goes lower
+IPV6_MIN_MTU = 1280
+
+# Each test is a coroutine (the `_async` methods) driven either by asyncio or,
+# through the plain methods, by run_blocking; see IOStep.
 class MTUTester:
-    def __init__(self):
+    def __init__(self, resolver: Optional[Resolver] = None, rtt: Optional[RTTTracker] = None,
+                 loss: Optional[LossTracker] = None, udp_port: Optional[int] = None,
+                 probers: Optional['ProberSet'] = None):
+        self.resolver = resolver or Resolver()
+        self.rtt = rtt or RTTTracker()
+        self.loss = loss or LossTracker()
+        # Probe with UDP to a responder on this port instead of ICMP echo
+        self.udp_port = udp_port
+        # Probe sockets for every memo, instead of the calling thread's
+        self.probers = probers
         self.common_mtu_sizes = [1500, 1492, 1480, 1472, 1464, 1450, 1420, 1400, 1350, 1280, 1200, 576]
         self.jumbo_frame_sizes = [9000, 8000, 7000, 6000, 4000]
         
     def find_max_mtu(self, target: str, start_size: int = 1500, 
-                     min_size: int = 576, timeout: int = 5) -> Dict[str, any]:
-        ip = resolve_hostname(target)
+                     min_size: int = 576, timeout: int = 5, fanout: int = 1,
+                     use_ptb: bool = True, memo: Optional[ProbeMemo] = None) -> Dict[str, any]:
+        return run_blocking(self.find_max_mtu_async(target, start_size, min_size, timeout, fanout,
+                                                    use_ptb, memo))
+    
+    async def find_max_mtu_async(self, target: str, start_size: int = 1500,
+                                 min_size: int = 576, timeout: int = 5, fanout: int = 1,
+                                 use_ptb: bool = True, memo: Optional[ProbeMemo] = None) -> Dict[str, any]:
+        ip = await resolve_step(self.resolver, target)
         if not ip:
             return {
                 'success': False,
@@ -17,24 +49,54 @@ class MTUTester:
                 'max_mtu': None
             }
         
+        memo = memo or self.new_memo()
+        min_size = max(min_size, self._min_mtu(ip))
+        baseline = await self._measure_rtt(ip, timeout, memo)
+        if baseline and baseline.outcome is Outcome.UNREACHABLE:
+            return {
+                'success': False,
+                'error': self._unreachable_error(target),
+                'max_mtu': None
+            }
+        
+        if use_ptb:
+            ptb_result = await self._follow_ptb(ip, start_size, min_size, timeout, memo)
+            if ptb_result is not None:
+                mtu, probes = ptb_result
+                return self._with_path_stats({
+                    'success': True,
+                    'max_mtu': mtu,
+                    'target': target,
+                    'ip': ip,
+                    'search': {'method': 'ptb', 'fanout': fanout, 'rounds': probes, 'probes': probes,
+                               'confidence': 1.0}
+                }, ip, timeout)
+        
         working_size = None
         failed_size = start_size + 1
         
         for size in sorted(self.common_mtu_sizes, reverse=True):
-            if size > start_size:
+            if size > start_size or size < min_size:
                 continue
                 
-            # Account for IP (20) and ICMP (8) headers
-            payload_size = size - 28
+            # Account for IP (20 or 40) and ICMP (8) headers
+            payload_size = size - header_overhead(ip)
             if payload_size < 0:
                 continue
                 
-            result = ping_with_size(ip, payload_size, dont_fragment=True, timeout=timeout)
+            # Timeouts here stay unsettled, the search re-probes what it needs
+            result = await memo.probe_async(ip, size, timeout, retry=False)
             
-            if result['success']:
+            if result.success:
                 working_size = size
                 break
-            elif result['reason'] == 'mtu_exceeded':
+            elif result.outcome is Outcome.UNREACHABLE:
+                return {
+                    'success': False,
+                    'error': self._unreachable_error(target),
+                    'max_mtu': None
+                }
+            elif result.outcome is Outcome.MTU_EXCEEDED:
                 failed_size = min(failed_size, size)
         
         if working_size is None:
@@ -45,18 +107,54 @@ class MTUTester:
                 'failed_at': failed_size
             }
         
-        # Binary search for exact MTU between working_size and failed_size
-        exact_mtu = self._binary_search_mtu(ip, working_size, failed_size, timeout)
+        # Search for exact MTU between working_size and failed_size
+        exact_mtu, search = await self._binary_search_mtu(ip, working_size, failed_size, timeout, fanout, memo)
         
-        return {
+        # How sure we are the size just above the answer was dropped, not lost
+        bound = memo.get(ip, exact_mtu + 1)
+        search['confidence'] = bound.confidence if bound else 1.0
+        
+        return self._with_path_stats({
             'success': True,
             'max_mtu': exact_mtu,
             'target': target,
-            'ip': ip
-        }
+            'ip': ip,
+            'search': search
+        }, ip, timeout)
+    
+    def plan(self, start_size: int = 1500, include_jumbo: bool = False) -> Dict[str, List[int]]:
+        return plan_probes(self.common_mtu_sizes, self.jumbo_frame_sizes, start_size, include_jumbo)
     
-    def test_common_sizes(self, target: str, timeout: int = 5) -> Dict[str, any]:
-        ip = resolve_hostname(target)
+    def execute_plan(self, target: str, plan: Dict[str, List[int]], memo: ProbeMemo,
+                     timeout: int = 5, concurrent: bool = False) -> Optional[str]:
+        return run_blocking(self.execute_plan_async(target, plan, memo, timeout, concurrent))
+    
+    async def execute_plan_async(self, target: str, plan: Dict[str, List[int]], memo: ProbeMemo,
+                                 timeout: int = 5, concurrent: bool = False) -> Optional[str]:
+        # Probe the sizes every phase needs into the memo; the rest is probed
+        # lazily by whichever phase asks first
+        ip = await resolve_step(self.resolver, target)
+        if not ip:
+            return None
+        
+        prefetch = [size for size in plan['prefetch'] if size >= self._min_mtu(ip)]
+        if concurrent:
+            await memo.probe_many_async(ip, self._baseline_sizes(ip) + prefetch, timeout)
+        else:
+            await self._measure_rtt(ip, timeout, memo)
+            # Ascending, so timeouts at smaller sizes count as evidence for
+            # the larger ones
+            for size in sorted(prefetch):
+                await memo.probe_async(ip, size, timeout)
+        return ip
+    
+    def test_common_sizes(self, target: str, timeout: int = 5,
+                          concurrent: bool = False, memo: Optional[ProbeMemo] = None) -> Dict[str, any]:
+        return run_blocking(self.test_common_sizes_async(target, timeout, concurrent, memo))
+    
+    async def test_common_sizes_async(self, target: str, timeout: int = 5, concurrent: bool = False,
+                                      memo: Optional[ProbeMemo] = None) -> Dict[str, any]:
+        ip = await resolve_step(self.resolver, target)
         if not ip:
             return {
                 'success': False,
@@ -64,28 +162,33 @@ class MTUTester:
                 'results': []
             }
         
-        results = []
-        for mtu_size in self.common_mtu_sizes:
-            payload_size = mtu_size - 28  # IP + ICMP headers
-            if payload_size < 0:
-                continue
-                
-            result = ping_with_size(ip, payload_size, dont_fragment=True, timeout=timeout)
-            results.append({
-                'mtu_size': mtu_size,
-                'success': result['success'],
-                'reason': result['reason']
-            })
+        memo = memo or self.new_memo()
+        # Sizes below the IPv6 minimum say nothing about an IPv6 path
+        sizes = [mtu_size for mtu_size in self.common_mtu_sizes
+                 if mtu_size - header_overhead(ip) >= 0 and mtu_size >= self._min_mtu(ip)]
+        
+        if concurrent:
+            # Fire every size at once, the baseline included, so wall time is
+            # one RTT or one timeout
+            replies = await memo.probe_many_async(ip, self._baseline_sizes(ip) + sizes, timeout)
+        else:
+            await self._measure_rtt(ip, timeout, memo)
+            replies = {mtu_size: await memo.probe_async(ip, mtu_size, timeout) for mtu_size in sizes}
         
         return {
             'success': True,
             'target': target,
             'ip': ip,
-            'results': results
+            'results': ProbeSeries(replies[mtu_size] for mtu_size in sizes)
         }
     
-    def test_jumbo_frames(self, target: str, timeout: int = 10) -> Dict[str, any]:
-        ip = resolve_hostname(target)
+    def test_jumbo_frames(self, target: str, timeout: int = 10,
+                          memo: Optional[ProbeMemo] = None) -> Dict[str, any]:
+        return run_blocking(self.test_jumbo_frames_async(target, timeout, memo))
+    
+    async def test_jumbo_frames_async(self, target: str, timeout: int = 10,
+                                      memo: Optional[ProbeMemo] = None) -> Dict[str, any]:
+        ip = await resolve_step(self.resolver, target)
         if not ip:
             return {
                 'success': False,
@@ -93,18 +196,31 @@ class MTUTester:
                 'jumbo_supported': False
             }
         
+        memo = memo or self.new_memo()
+        await self._measure_rtt(ip, timeout, memo)
+        max_jumbo_mtu = None
         for size in sorted(self.jumbo_frame_sizes, reverse=True):
-            payload_size = size - 28
-            result = ping_with_size(ip, payload_size, dont_fragment=True, timeout=timeout)
+            result = await memo.probe_async(ip, size, timeout, retry=False)
             
-            if result['success']:
-                return {
-                    'success': True,
-                    'jumbo_supported': True,
-                    'max_jumbo_mtu': size,
-                    'target': target,
-                    'ip': ip
-                }
+            if result.success:
+                max_jumbo_mtu = size
+                break
+        
+        # Settle the timeouts above the answer before trusting it, any of
+        # them may have been a lost reply
+        larger = [size for size in self.jumbo_frame_sizes if size > (max_jumbo_mtu or 0)]
+        for size, result in (await memo.probe_many_async(ip, larger, timeout)).items():
+            if result.success and size > (max_jumbo_mtu or 0):
+                max_jumbo_mtu = size
+        
+        if max_jumbo_mtu:
+            return {
+                'success': True,
+                'jumbo_supported': True,
+                'max_jumbo_mtu': max_jumbo_mtu,
+                'target': target,
+                'ip': ip
+            }
         
         return {
             'success': True,
@@ -113,16 +229,79 @@ class MTUTester:
             'ip': ip
         }
     
-    def _binary_search_mtu(self, ip: str, low: int, high: int, timeout: int) -> int:
+    def _unreachable_error(self, target: str) -> str:
+        if self.udp_port is not None:
+            return f'{target} is unreachable or has no responder on UDP port {self.udp_port}'
+        return f'{target} is unreachable'
+    
+    def _min_mtu(self, ip: str) -> int:
+        return IPV6_MIN_MTU if address_family(ip) == socket.AF_INET6 else BASELINE_MTU
+    
+    def new_memo(self, on_event: Optional[Callable[[Dict[str, Any]], None]] = None) -> ProbeMemo:
+        return ProbeMemo(self.rtt, self.loss, self.udp_port, on_event, self.probers)
+    
+    async def _measure_rtt(self, ip: str, timeout: float, memo: ProbeMemo) -> Optional[ProbeResult]:
+        # Baseline with a packet every path carries, so oversized probes that
+        # are silently dropped only wait a few RTTs instead of the full timeout.
+        # Sent once: a silent target would otherwise cost a second full
+        # timeout before anything else is probed.
+        if self._baseline_sizes(ip):
+            return await memo.probe_async(ip, BASELINE_MTU, timeout, retry=False)
+        return None
+    
+    def _baseline_sizes(self, ip: str) -> List[int]:
+        # For callers that send the baseline along with their own batch
+        return [BASELINE_MTU] if self.rtt.adaptive and not self.rtt.has_estimate(ip) else []
+    
+    def _with_path_stats(self, result: Dict[str, any], ip: str, timeout: float) -> Dict[str, any]:
+        rtt = self.rtt.stats(ip, timeout)
+        if rtt:
+            result['rtt'] = rtt
+        result['loss'] = self.loss.stats(ip)
+        return result
+    
+    async def _binary_search_mtu(self, ip: str, low: int, high: int, timeout: int, fanout: int = 1,
+                                 memo: Optional[ProbeMemo] = None) -> Tuple[int, Dict[str, int]]:
+        # k-ary search: each round probes `fanout` evenly spaced sizes at once
+        # and keeps the gap between the largest success and smallest failure.
+        # A fanout of 1 is plain bisection.
+        fanout = max(1, fanout)
+        memo = memo or self.new_memo()
+        rounds = 0
+        sent = memo.sent
+        
         while high - low > 1:
-            mid = (low + high) // 2
-            payload_size = mid - 28
+            sizes = sorted({low + (high - low) * i // (fanout + 1) for i in range(1, fanout + 1)})
+            sizes = [size for size in sizes if low < size < high]
+            
+            results = await memo.probe_many_async(ip, sizes, timeout)
+            rounds += 1
+            
+            working = [size for size in sizes if results[size].success]
+            if working:
+                low = max(working)
+            failed = [size for size in sizes if size > low and not results[size].success]
+            if failed:
+                high = min(failed)
+        
+        return low, {'method': 'search', 'fanout': fanout, 'rounds': rounds, 'probes': memo.sent - sent}
+    
+    async def _follow_ptb(self, ip: str, size: int, min_size: int,
+                          timeout: int, memo: ProbeMemo) -> Optional[Tuple[int, int]]:
+        # Jump straight to the next-hop MTU reported by each Frag-Needed until
+        # a probe gets through. Returns None when the path stops reporting
+        # (black hole), leaving the caller to search.
+        probes = 0
+        while size >= min_size and probes < 16:
+            result = await memo.probe_async(ip, size, timeout, retry=False)
+            probes += 1
             
-            result = ping_with_size(ip, payload_size, dont_fragment=True, timeout=timeout)
+            if result.success:
+                return size, probes
             
-            if result['success']:
-                low = mid
-            else:
-                high = mid
+            next_hop_mtu = result.next_hop_mtu
+            if result.outcome is not Outcome.MTU_EXCEEDED or not next_hop_mtu or next_hop_mtu >= size:
+                return None
+            size = next_hop_mtu
         
-        return low
\ No newline at end of file
+        return None
\ No newline at end of file
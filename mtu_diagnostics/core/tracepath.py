@@ -0,0 +1,428 @@
+import asyncio
+import errno
+import socket
+import time
+from typing import Callable, Dict, List, Optional, Any
+from ..utils.icmp import FAMILY_OPTIONS, address_family, get_route_mtu, parse_extended_err, set_pmtu_discovery
+from ..utils.ratelimit import ProbeRateLimiter
+from ..utils.rtt import RTTTracker
+from .probe_plan import HEADER_OVERHEAD, header_overhead
+
+# Set DF but ignore the kernel's cached PMTU, so every trace sees the path as
+# it is rather than what an earlier Frag-Needed left behind
+IP_PMTUDISC_PROBE = getattr(socket, 'IP_PMTUDISC_PROBE', 3)
+SO_EE_ORIGIN_LOCAL = 1
+
+ICMP_DEST_UNREACH = 3
+ICMP_TIME_EXCEEDED = 11
+ICMP6_DEST_UNREACH = 1
+ICMP6_TIME_EXCEEDED = 3
+
+# Probes are UDP datagrams to unused high ports, one port per probe in flight.
+# The ICMP error quotes the original UDP header, so the port identifies the
+# probe even from routers that quote nothing of the payload.
+PORT_BASE = 33434
+PORT_RANGE = 4096
+
+# Largest IPv4 packet, below the loopback MTU
+MAX_PACKET = 65535
+
+# Routers rate limit ICMP errors per destination (Linux: icmp_ratelimit, a
+# burst of 6 then one per second), and a suppressed error looks exactly like
+# a packet that was too big. Locating a black hole asks one hop many
+# questions, so those probes are paced to stay within the limit, leaving a
+# little of the burst for the waves.
+ROUTER_ICMP_RATE = 1.0
+ROUTER_ICMP_BURST = 4
+ROUTER_ICMP_SLACK = 0.1
+
+# tracepath(8) as a concurrent engine: every TTL of the path is probed at once
+# with DF datagrams of the current size (a "wave"). Time-Exceeded tells which
+# hop a size reached, Frag-Needed gives the MTU of the next link, and the wave
+# is repeated at that size for the hops not yet reached, so a path costs one
+# wave per MTU drop instead of one round trip per hop. Hops silent at a large
+# size but answering a small one sit behind a black hole, whose MTU is found
+# by bisection at the first of those TTLs.
+class Tracepath:
+    def __init__(self, max_hops: int = 30, timeout: float = 2, attempts: int = 2,
+                 rtt: Optional[RTTTracker] = None,
+                 limiter: Optional[ProbeRateLimiter] = None):
+        self.max_hops = max_hops
+        self.timeout = timeout
+        self.attempts = max(1, attempts)
+        self.rtt = rtt or RTTTracker()
+        self.limiter = limiter
+        self.sock = None
+        self.family = socket.AF_INET
+        self.overhead = HEADER_OVERHEAD
+        self.probes = 0
+        self._port = 0
+        self._waiters = {}
+        # TTL of each router seen so far, by address
+        self._hop_ttls = {}
+    
+    def trace(self, ip: str, start_size: int,
+              on_hop: Optional[Callable[[Dict[str, Any]], None]] = None) -> Dict[str, Any]:
+        return asyncio.run(self.trace_async(ip, start_size, on_hop))
+    
+    async def trace_async(self, ip: str, start_size: int,
+                          on_hop: Optional[Callable[[Dict[str, Any]], None]] = None) -> Dict[str, Any]:
+        # `on_hop` gets each hop as soon as it and every hop before it are settled
+        if not self._open(ip):
+            return {'success': False, 'ip': ip, 'error': 'Could not open a UDP socket with IP_RECVERR'}
+        return await self._with_socket(self._trace(ip, start_size, on_hop))
+    
+    def routers(self, ip: str, count: int) -> Optional[List[Optional[str]]]:
+        # Addresses of the first `count` routers towards ip (None where one
+        # stays silent), from a single wave of minimal probes. The target
+        # itself is not included.
+        if not self._open(ip):
+            return None
+        return asyncio.run(self._with_socket(self._routers(ip, count)))
+    
+    async def _with_socket(self, coro):
+        loop = asyncio.get_running_loop()
+        loop.add_reader(self.sock.fileno(), self._on_readable)
+        try:
+            return await coro
+        finally:
+            loop.remove_reader(self.sock.fileno())
+            self.sock.close()
+            self.sock = None
+            self._waiters.clear()
+            self._hop_ttls.clear()
+    
+    async def _routers(self, ip: str, count: int) -> List[Optional[str]]:
+        self.probes = 0
+        results = await self._wave(ip, list(range(1, count + 1)), self.overhead)
+        routers = []
+        for ttl in range(1, count + 1):
+            result = results.get(ttl, {})
+            if result.get('reply') in ('reached', 'unreachable'):
+                break
+            routers.append(result.get('address'))
+        return routers
+    
+    async def _trace(self, ip: str, start_size: int, on_hop) -> Dict[str, Any]:
+        self.probes = 0
+        hops = {}
+        drops = []
+        emitted = 0
+        size = min(start_size, MAX_PACKET)
+        last_hop = self.max_hops
+        waves = 0
+        unreachable = None
+        
+        def emit(final=False):
+            # A silent hop is held back until a later hop answers, it may be
+            # one of the trailing ones that are dropped
+            nonlocal emitted
+            while emitted < last_hop and emitted + 1 in hops:
+                if not final and hops[emitted + 1]['reply'] == 'no_reply' and not any(
+                        hop['reply'] != 'no_reply' for ttl, hop in hops.items() if ttl > emitted + 1):
+                    break
+                emitted += 1
+                if on_hop is not None:
+                    on_hop(hops[emitted])
+        
+        while True:
+            pending = [ttl for ttl in range(1, last_hop + 1) if ttl not in hops]
+            if not pending:
+                break
+            
+            waves += 1
+            results = await self._wave(ip, pending, size)
+            
+            frag_needed = []
+            silent = []
+            for ttl in pending:
+                result = results.get(ttl)
+                if result is None:
+                    continue
+                reply = result['reply']
+                if reply in ('time_exceeded', 'reached'):
+                    hops[ttl] = self._hop(ttl, result, size)
+                    if reply == 'reached':
+                        last_hop = min(last_hop, ttl)
+                elif reply == 'mtu_exceeded':
+                    frag_needed.append((ttl, result))
+                elif reply == 'unreachable':
+                    hops[ttl] = self._hop(ttl, result, None)
+                    last_hop = min(last_hop, ttl)
+                    unreachable = result['address']
+                else:
+                    silent.append(ttl)
+            
+            # The hop whose next link is smaller is the one before the first
+            # TTL to get Frag-Needed; routers check the TTL before the MTU
+            if frag_needed:
+                ttl, result = min(frag_needed, key=lambda item: item[0])
+                mtu = result['next_hop_mtu']
+                if not mtu or mtu >= size:
+                    mtu = size - 1
+                drops.append(self._drop(ttl - 1, hops, size, mtu, result['address'], False))
+                size = mtu
+                emit()
+                continue
+            
+            if silent:
+                # Silent at this size: either a router that never answers, or
+                # a black hole in front of it. A minimal probe tells them apart.
+                small = await self._wave(ip, silent, self.overhead)
+                answering = [ttl for ttl in silent
+                             if small.get(ttl, {}).get('reply') in ('time_exceeded', 'reached')]
+                for ttl in silent:
+                    if ttl not in answering:
+                        hops[ttl] = self._hop(ttl, {'reply': 'no_reply'}, None)
+                
+                if answering:
+                    ttl = answering[0]
+                    mtu = await self._black_hole_mtu(ip, ttl, self.overhead, size)
+                    drops.append(self._drop(ttl - 1, hops, size, mtu, None, True))
+                    size = mtu
+            
+            emit()
+        
+        # Trailing hops that never answered say nothing about the path
+        while last_hop > 0 and hops.get(last_hop, {}).get('reply') == 'no_reply':
+            last_hop -= 1
+        emit(final=True)
+        
+        path = [hops[ttl] for ttl in range(1, last_hop + 1)]
+        reached = bool(path) and path[-1]['reply'] == 'reached'
+        result = {
+            'success': True,
+            'ip': ip,
+            'hops': path,
+            'drops': drops,
+            'reached': reached,
+            'path_mtu': size if reached else None,
+            'waves': waves,
+            'probes': self.probes
+        }
+        if unreachable:
+            result['unreachable_from'] = unreachable
+        return result
+    
+    def _hop(self, ttl: int, result: Dict[str, Any], size: Optional[int]) -> Dict[str, Any]:
+        return {
+            'ttl': ttl,
+            'address': result.get('address'),
+            'reply': result['reply'],
+            'rtt': result.get('rtt'),
+            'mtu': size
+        }
+    
+    def _drop(self, ttl: int, hops: Dict[int, Dict[str, Any]], before: int, after: int,
+              reported_by: Optional[str], black_hole: bool) -> Dict[str, Any]:
+        # Recorded on the hop in front of the smaller link; TTL 0 is this host
+        if ttl in hops:
+            hops[ttl]['next_mtu'] = after
+            if black_hole:
+                hops[ttl]['black_hole'] = True
+        drop = {'after_ttl': ttl, 'from': before, 'to': after, 'black_hole': black_hole}
+        if reported_by:
+            drop['reported_by'] = reported_by
+        return drop
+    
+    async def _black_hole_mtu(self, ip: str, ttl: int, low: int, high: int) -> int:
+        # Bisection at the first TTL behind the black hole, where only that
+        # hop can answer: `low` gets through and `high` does not
+        loop = asyncio.get_running_loop()
+        # Mirror of the hop's ICMP token bucket
+        bucket = [float(ROUTER_ICMP_BURST), loop.time()]
+        
+        async def paced_send(size):
+            now = loop.time()
+            bucket[0] = min(ROUTER_ICMP_BURST, bucket[0] + (now - bucket[1]) * ROUTER_ICMP_RATE)
+            bucket[1] = now
+            if bucket[0] < 1:
+                # With some slack, the hop's clock and ours drift apart
+                await asyncio.sleep((1 - bucket[0]) / ROUTER_ICMP_RATE + ROUTER_ICMP_SLACK)
+                bucket[0], bucket[1] = 1.0, loop.time()
+            result = await self._send_one(ip, ttl, size)
+            if result['reply'] != 'no_reply':
+                bucket[0] -= 1
+            return result
+        
+        # A size that got no answer is only "too big" if the hop is still
+        # answering: the next answer confirms it, and two misses in a row are
+        # followed by a minimal probe. A silent hop (limit spent, or loss)
+        # undoes the unconfirmed misses and waits for a fresh token.
+        unconfirmed = []
+        silences = 0
+        while high - low > 1 or unconfirmed:
+            if high - low > 1:
+                size = (low + high) // 2
+                result = await paced_send(size)
+                if result['reply'] != 'no_reply':
+                    low = size
+                    unconfirmed.clear()
+                    continue
+                if not unconfirmed:
+                    unconfirmed.append(high)
+                    high = size
+                    continue
+            
+            check = await paced_send(self.overhead)
+            if check['reply'] != 'no_reply' or silences >= self.attempts:
+                if high - low > 1:
+                    high = size
+                unconfirmed.clear()
+                continue
+            silences += 1
+            high = unconfirmed[0]
+            unconfirmed.clear()
+            bucket[0] = 0.0
+        return low
+    
+    async def _wave(self, ip: str, ttls: List[int], size: int) -> Dict[int, Dict[str, Any]]:
+        # Once a TTL gets to the end of the path, higher ones only add
+        # rate-limited errors from the same host and are abandoned
+        tasks = {asyncio.ensure_future(self._probe(ip, ttl, size)): ttl for ttl in ttls}
+        pending = set(tasks)
+        results = {}
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    ttl = tasks[task]
+                    results[ttl] = task.result()
+                    if results[ttl]['reply'] not in ('reached', 'unreachable'):
+                        continue
+                    for other in [task for task in pending if tasks[task] > ttl]:
+                        other.cancel()
+                        pending.discard(other)
+        finally:
+            for task in pending:
+                task.cancel()
+        return results
+    
+    async def _probe(self, ip: str, ttl: int, size: int) -> Dict[str, Any]:
+        # Retried on timeout only, any ICMP answer is definitive
+        for _ in range(self.attempts):
+            result = await self._send_one(ip, ttl, size)
+            if result['reply'] != 'no_reply':
+                break
+        return result
+    
+    async def _send_one(self, ip: str, ttl: int, size: int) -> Dict[str, Any]:
+        if self.limiter is not None:
+            await self.limiter.wait_async(ip)
+        loop = asyncio.get_running_loop()
+        port = self._next_port()
+        future = loop.create_future()
+        self._waiters[port] = future
+        start = time.monotonic()
+        
+        try:
+            self._transmit(ip, port, ttl, size)
+            self.probes += 1
+        except OSError as e:
+            self._waiters.pop(port, None)
+            if e.errno == errno.EMSGSIZE:
+                # Larger than the egress interface allows
+                return {'reply': 'mtu_exceeded', 'address': None,
+                        'next_hop_mtu': get_route_mtu(ip)}
+            return {'reply': 'no_reply', 'error': str(e)}
+        
+        # Each hop has its own estimate: one learned from a near hop would
+        # time out every farther one
+        try:
+            reply, address, next_hop_mtu, received = await asyncio.wait_for(
+                future, self.rtt.timeout((ip, ttl), self.timeout))
+        except asyncio.TimeoutError:
+            return {'reply': 'no_reply'}
+        finally:
+            self._waiters.pop(port, None)
+        
+        rtt = received - start
+        if reply == 'mtu_exceeded':
+            # Sent by a nearer hop, which is known by its address once it
+            # has answered a TTL of its own; a local error has no address
+            hop_ttl = self._hop_ttls.get(address)
+            if hop_ttl is not None:
+                self.rtt.sample((ip, hop_ttl), rtt)
+        else:
+            if address is not None:
+                self._hop_ttls.setdefault(address, ttl)
+            self.rtt.sample((ip, ttl), rtt)
+        return {'reply': reply, 'address': address, 'rtt': rtt, 'next_hop_mtu': next_hop_mtu}
+    
+    def _transmit(self, ip: str, port: int, ttl: int, size: int):
+        if self.family == socket.AF_INET6:
+            self.sock.setsockopt(socket.IPPROTO_IPV6, socket.IPV6_UNICAST_HOPS, ttl)
+        else:
+            self.sock.setsockopt(socket.IPPROTO_IP, socket.IP_TTL, ttl)
+        self.sock.sendto(b'\x00' * max(0, size - self.overhead), (ip, port))
+    
+    def _open(self, ip: str) -> bool:
+        family = address_family(ip)
+        if family is None:
+            return False
+        try:
+            sock = socket.socket(family, socket.SOCK_DGRAM)
+        except OSError:
+            return False
+        try:
+            set_pmtu_discovery(sock, family, IP_PMTUDISC_PROBE)
+        except OSError:
+            sock.close()
+            return False
+        sock.setblocking(False)
+        self.sock = sock
+        self.family = family
+        self.overhead = header_overhead(ip)
+        return True
+    
+    def _next_port(self) -> int:
+        self._port = (self._port + 1) % PORT_RANGE
+        return PORT_BASE + self._port
+    
+    def _on_readable(self):
+        while True:
+            try:
+                data, ancdata, _, addr = self.sock.recvmsg(0, 512, socket.MSG_ERRQUEUE)
+            except OSError:
+                break
+            event = self._parse_error(ancdata, addr[0] if addr else None)
+            if event is None or not addr:
+                continue
+            self._deliver(addr[1], event)
+        
+        # Nothing listens on our ports, but drain anything that does answer
+        try:
+            while self.sock.recv(65535):
+                pass
+        except OSError:
+            pass
+    
+    def _deliver(self, port: int, event):
+        # event is (reply, address, next-hop MTU) for the probe sent to port
+        future = self._waiters.get(port)
+        if future is not None and not future.done():
+            future.set_result(event + (time.monotonic(),))
+    
+    def _parse_error(self, ancdata, destination: Optional[str]):
+        error = parse_extended_err(ancdata)
+        if error is None:
+            return None
+        ee_errno, ee_origin, ee_type, ee_info, offender = error
+        
+        if ee_errno == errno.EMSGSIZE:
+            if ee_origin == SO_EE_ORIGIN_LOCAL:
+                offender = None
+            return ('mtu_exceeded', offender, ee_info or None)
+        if ee_origin == SO_EE_ORIGIN_LOCAL:
+            return None
+        if ee_origin != FAMILY_OPTIONS[self.family]['origin']:
+            return None
+        
+        v6 = self.family == socket.AF_INET6
+        if ee_type == (ICMP6_TIME_EXCEEDED if v6 else ICMP_TIME_EXCEEDED):
+            return ('time_exceeded', offender, None)
+        if ee_type == (ICMP6_DEST_UNREACH if v6 else ICMP_DEST_UNREACH):
+            # Port unreachable (or any other error) from the target itself
+            # means the probe got there
+            return ('reached' if offender == destination else 'unreachable', offender, None)
+        return None
@@ -1,5 +1,6 @@
-from typing import Dict, List, Any, Optional
+from typing import Dict, Iterable, List, Any, Optional
 from dataclasses import dataclass
+from ..utils.probe_result import ProbeResult
 
 @dataclass
 class MTURecommendation:
@@ -61,6 +62,10 @@ class DiagnosticAnalyzer:
         # Check for specific connection types
         recommendations.extend(self._check_connection_specific_issues(interface, path_mtu))
         
+        tcp_test = detection_result.get('tcp_test')
+        if tcp_test and tcp_test.get('success'):
+            recommendations.extend(self._analyze_tcp(tcp_test, path_mtu))
+        
         return recommendations
     
     def _analyze_mtu_mismatch(self, interface_mtu: int, path_mtu: int) -> List[MTURecommendation]:
@@ -89,12 +94,12 @@ class DiagnosticAnalyzer:
         
         return recommendations
     
-    def _analyze_common_sizes(self, results: List[Dict], interface_mtu: int) -> List[MTURecommendation]:
+    def _analyze_common_sizes(self, results: Iterable[ProbeResult], interface_mtu: int) -> List[MTURecommendation]:
         recommendations = []
         
         # Find the largest working MTU size
-        working_sizes = [r['mtu_size'] for r in results if r['success']]
-        failed_sizes = [r['mtu_size'] for r in results if not r['success']]
+        working_sizes = [r.size for r in results if r.success]
+        failed_sizes = [r.size for r in results if not r.success]
         
         if not working_sizes:
             recommendations.append(MTURecommendation(
@@ -158,6 +163,62 @@ class DiagnosticAnalyzer:
         
         return recommendations
     
+    def _analyze_tcp(self, tcp_test: Dict, path_mtu: Optional[int]) -> List[MTURecommendation]:
+        # Only reached after a TCP probe, which has imported it already
+        from ..core.tcp_probe import tcp_overhead
+        
+        recommendations = []
+        
+        mss = tcp_test['mss']
+        mss_mtu = tcp_test['mss_mtu']
+        port = tcp_test['port']
+        push = tcp_test.get('push') or {}
+        # Without an ICMP result, the connection's own PMTU is the reference
+        reference_mtu = path_mtu or tcp_test.get('ip_mtu')
+        # The MSS a packet size allows depends on the IP header
+        overhead = tcp_overhead(tcp_test['ip'])
+        
+        if push.get('stalled'):
+            if reference_mtu and reference_mtu < mss_mtu:
+                recommendation = (f'Clamp TCP MSS to {reference_mtu - overhead} on the path or allow '
+                                  f'ICMP Fragmentation Needed through firewalls')
+            else:
+                recommendation = ('Allow ICMP Fragmentation Needed through firewalls or enable '
+                                  'net.ipv4.tcp_mtu_probing')
+            recommendations.append(MTURecommendation(
+                issue='tcp_black_hole',
+                severity='high',
+                description=f'Full-sized TCP segments ({mss_mtu}-byte packets) to port {port} are '
+                            f'dropped without Fragmentation Needed (PMTU black hole)',
+                recommendation=recommendation,
+                optimal_mtu=reference_mtu if reference_mtu and reference_mtu < mss_mtu else None
+            ))
+        
+        elif path_mtu and mss_mtu > path_mtu:
+            # TCP only fits the path after a Frag-Needed lowers its MSS
+            if not push or push.get('pmtu_after', mss_mtu) >= mss_mtu:
+                recommendations.append(MTURecommendation(
+                    issue='mss_exceeds_path',
+                    severity='medium',
+                    description=f'TCP MSS {mss} allows {mss_mtu}-byte packets but the path MTU is '
+                                f'{path_mtu}; connections depend on PMTU discovery working',
+                    recommendation=f'Clamp TCP MSS to {path_mtu - overhead} for this path',
+                    optimal_mtu=path_mtu
+                ))
+        
+        elif reference_mtu and mss_mtu < reference_mtu:
+            clamp = reference_mtu - mss_mtu
+            recommendations.append(MTURecommendation(
+                issue='mss_clamp',
+                severity='medium' if clamp > 100 else 'low',
+                description=f'TCP MSS {mss} limits packets to {mss_mtu} bytes, {clamp} below the '
+                            f'path MTU {reference_mtu} (MSS clamping by a middlebox or the peer)',
+                recommendation=f'Raise the MSS clamp to {reference_mtu - overhead} to use full-sized segments',
+                optimal_mtu=mss_mtu
+            ))
+        
+        return recommendations
+    
     def generate_summary(self, recommendations: List[MTURecommendation]) -> Dict[str, Any]:
         if not recommendations:
             return {
@@ -1,7 +1,20 @@
 import json
-from typing import Dict, List, Any, Optional
-from .analyzer import MTURecommendation
+from typing import TYPE_CHECKING, Dict, List, Any, Optional
+from ..utils.probe_result import ProbeResult, ProbeSeries
 
+if TYPE_CHECKING:
+    from .analyzer import MTURecommendation
+
+# Progress lines for the phases of a comprehensive test
+PHASE_TITLES = {
+    'path_mtu': 'Path MTU search',
+    'common_sizes': 'Common sizes test',
+    'jumbo_frames': 'Jumbo frames test',
+    'tcp': 'TCP MSS test'
+}
+
+# With format 'ndjson', results are one compact line each, with an 'event'
+# key ('result', 'analysis') like the progress events before them
 class MTUReporter:
     def __init__(self, format_type: str = 'text'):
         self.format_type = format_type.lower()
@@ -13,7 +26,7 @@ class MTUReporter:
         interface = result['interface']
         
         if self.format_type == 'json':
-            return json.dumps(result, indent=2)
+            return json.dumps(result, indent=2, default=_json_default)
         
         output = []
         output.append("=== Interface Information ===")
@@ -30,29 +43,101 @@ class MTUReporter:
         return '\n'.join(output)
     
     def format_path_mtu_result(self, result: Dict[str, Any]) -> str:
+        if self.format_type == 'ndjson':
+            return self.format_event({'event': 'result', **result})
+        
         if not result.get('success'):
             return f"Error: {result.get('error', 'Unknown error')}"
         
         if self.format_type == 'json':
-            return json.dumps(result, indent=2)
+            return json.dumps(result, indent=2, default=_json_default)
         
         output = []
         output.append("=== Path MTU Detection ===")
         output.append(f"Target: {result['target']}")
         output.append(f"Target IP: {result.get('target_ip', 'N/A')}")
         output.append(f"Interface: {result['interface']['name']}")
+        if result.get('route'):
+            output.append(f"Gateway: {result['route']['gateway'] or 'directly connected'}")
         output.append(f"Interface MTU: {result['interface_mtu']}")
         output.append(f"Path MTU: {result['path_mtu']}")
         output.append(f"MTU Optimal: {'Yes' if result['mtu_optimal'] else 'No'}")
         
+        if result.get('kernel_cache', {}).get('source') == 'pmtu_exception':
+            output.append("Source: kernel PMTU cache (no probes sent)")
+        elif result.get('cached'):
+            output.append("Source: result cache (no probes sent)")
+        
+        search = result.get('search')
+        if search and not result.get('cached'):
+            output.append(f"Search: {search['rounds']} rounds, {search['probes']} probes (fanout {search['fanout']})")
+        
+        loss = result.get('loss')
+        confidence = (search or {}).get('confidence', 1.0)
+        if loss and (loss['lost'] or confidence < 1.0):
+            output.append(f"Loss: {loss['loss_rate']:.1%} ({loss['lost']} of {loss['sent']} probes), "
+                          f"confidence {confidence:.2%}")
+        
+        rtt = result.get('rtt')
+        if rtt:
+            output.append(f"RTT: {rtt['srtt'] * 1000:.2f} ms (probe timeout {rtt['timeout'] * 1000:.0f} ms)")
+        
+        return '\n'.join(output)
+    
+    def format_dual_stack_result(self, result: Dict[str, Any]) -> str:
+        if self.format_type == 'ndjson':
+            return self.format_event({'event': 'result', **result})
+        
+        if 'ipv4' not in result:
+            return f"Error: {result.get('error', 'Unknown error')}"
+        
+        if self.format_type == 'json':
+            return json.dumps(result, indent=2, default=_json_default)
+        
+        output = []
+        output.append("=== Dual-Stack Path MTU ===")
+        output.append(f"Target: {result['target']}")
+        
+        for family, label, record in (('ipv4', 'IPv4', 'A'), ('ipv6', 'IPv6', 'AAAA')):
+            family_result = result[family]
+            if family_result is None:
+                output.append(f"{label}: no {record} record")
+            elif not family_result['success']:
+                output.append(f"{label}: {family_result.get('target_ip')} - "
+                              f"Error: {family_result.get('error', 'MTU detection failed')}")
+            else:
+                line = (f"{label}: {family_result['target_ip']} - Path MTU {family_result['path_mtu']} "
+                        f"via {family_result['interface']['name']} (MTU {family_result['interface_mtu']})")
+                if family_result.get('cached') or family_result.get('kernel_cache', {}).get('source') == 'pmtu_exception':
+                    line += ", cached"
+                output.append(line)
+        
+        ipv4, ipv6 = result['ipv4'], result['ipv6']
+        if ipv4 and ipv6 and ipv4['success'] and ipv6['success'] and ipv4['path_mtu'] != ipv6['path_mtu']:
+            output.append(f"Path MTU differs between families: IPv4 {ipv4['path_mtu']}, IPv6 {ipv6['path_mtu']}")
+        output.append(f"Time: {result['elapsed']:.3f}s")
+        
         return '\n'.join(output)
     
+    def format_size_result(self, test_result: ProbeResult) -> str:
+        status = "✓" if test_result.success else "✗"
+        line = f"{status} {test_result.size}: {test_result.reason}"
+        if test_result.attempts > 1:
+            line += f" ({test_result.attempts} attempts"
+            if test_result.reason == 'failed':
+                line += f", {test_result.confidence:.2%} confidence"
+            line += ")"
+        return line
+    
     def format_comprehensive_test(self, result: Dict[str, Any]) -> str:
+        if self.format_type == 'ndjson':
+            return self.format_event({'event': 'result', **result})
+        
         if not result.get('success'):
             return f"Error: {result.get('error', 'Unknown error')}"
         
         if self.format_type == 'json':
-            return json.dumps(result, indent=2)
+            return json.dumps(result, indent=2, default=_json_default)
         
         output = []
         output.append("=== Comprehensive MTU Test ===")
@@ -62,17 +147,22 @@ class MTUReporter:
         # Path MTU results
         path_mtu = result.get('path_mtu', {})
         if path_mtu.get('success'):
-            output.append(f"\nPath MTU: {path_mtu['max_mtu']}")
+            cached = " (cached)" if path_mtu.get('cached') else ""
+            output.append(f"\nPath MTU: {path_mtu['max_mtu']}{cached}")
         else:
             output.append(f"\nPath MTU: Failed - {path_mtu.get('error', 'Unknown error')}")
         
+        probe_plan = result.get('probe_plan')
+        if probe_plan:
+            output.append(f"Probes: {probe_plan['sent']} sent ({probe_plan['retries']} retries), "
+                          f"{probe_plan['reused']} reused")
+        
         # Common sizes test results
         common_test = result.get('common_sizes_test', {})
         if common_test.get('success'):
             output.append("\n--- Common MTU Sizes Test ---")
             for test_result in common_test.get('results', []):
-                status = "✓" if test_result['success'] else "✗"
-                output.append(f"{status} {test_result['mtu_size']}: {test_result['reason']}")
+                output.append(self.format_size_result(test_result))
         
         # Jumbo frames test
         jumbo_test = result.get('jumbo_frames_test')
@@ -83,12 +173,113 @@ class MTUReporter:
             else:
                 output.append("✗ Jumbo frames not supported")
         
+        tcp_test = result.get('tcp_test')
+        if tcp_test:
+            output.append("\n--- TCP MSS Test ---")
+            if tcp_test.get('success'):
+                output.extend(self._tcp_lines(tcp_test))
+            else:
+                output.append(f"✗ {tcp_test.get('error', 'Unknown error')}")
+        
         return '\n'.join(output)
     
-    def format_analysis_results(self, recommendations: List[MTURecommendation], 
-                              summary: Dict[str, Any]) -> str:
+    def format_trace_result(self, result: Dict[str, Any]) -> str:
+        if self.format_type == 'ndjson':
+            return self.format_event({'event': 'result', **result})
+        
+        if not result.get('success'):
+            return f"Error: {result.get('error', 'Unknown error')}"
+        
         if self.format_type == 'json':
-            return json.dumps({
+            return json.dumps(result, indent=2, default=_json_default)
+        
+        output = [self.format_trace_header(result['target'], result['ip'])]
+        output.extend(self.format_hop(hop) for hop in result['hops'])
+        output.append(self.format_trace_summary(result))
+        
+        return '\n'.join(output)
+    
+    def format_trace_header(self, target: str, ip: str) -> str:
+        return f"Tracing path MTU to {target} ({ip})"
+    
+    def format_hop(self, hop: Dict[str, Any]) -> str:
+        address = hop['address'] or '*'
+        rtt = f"{hop['rtt'] * 1000:.2f} ms" if hop.get('rtt') is not None else ''
+        line = f"{hop['ttl']:>2}: {address:<16} {rtt:>10}"
+        
+        if hop['reply'] == 'no_reply':
+            line += "  no reply"
+        elif hop['reply'] == 'unreachable':
+            line += "  unreachable"
+        else:
+            line += f"  pmtu {hop['mtu']}"
+            if hop['reply'] == 'reached':
+                line += "  reached"
+        
+        if hop.get('next_mtu'):
+            cause = "black hole" if hop.get('black_hole') else "Frag-Needed"
+            line += f"  → next link {hop['next_mtu']} ({cause})"
+        return line
+    
+    def format_trace_summary(self, result: Dict[str, Any]) -> str:
+        output = []
+        for drop in result['drops']:
+            where = f"after hop {drop['after_ttl']}" if drop['after_ttl'] else "at this host"
+            if drop['black_hole']:
+                how = "silently dropped, found by probing"
+            else:
+                how = f"Frag-Needed from {drop.get('reported_by') or 'this host'}"
+            output.append(f"MTU drop {where}: {drop['from']} → {drop['to']} ({how})")
+        
+        stats = f"{len(result['hops'])} hops, {result['waves']} waves, {result['probes']} probes"
+        if result['reached']:
+            output.append(f"Path MTU: {result['path_mtu']} ({stats})")
+        elif result.get('unreachable_from'):
+            output.append(f"Unreachable, reported by {result['unreachable_from']} ({stats})")
+        else:
+            output.append(f"Target did not answer ({stats})")
+        return '\n'.join(output)
+    
+    def format_tcp_result(self, result: Dict[str, Any]) -> str:
+        if not result.get('success'):
+            return f"Error: {result.get('error', 'Unknown error')}"
+        
+        if self.format_type == 'json':
+            return json.dumps(result, indent=2, default=_json_default)
+        
+        output = []
+        output.append("=== TCP MSS Probe ===")
+        output.append(f"Target: {result.get('target', result['ip'])} ({result['ip']}:{result['port']})")
+        output.extend(self._tcp_lines(result))
+        
+        return '\n'.join(output)
+    
+    def _tcp_lines(self, result: Dict[str, Any]) -> List[str]:
+        output = []
+        options = ", timestamps" if result['timestamps'] else ""
+        output.append(f"MSS: {result['mss']} ({result['mss_mtu']}-byte packets{options})")
+        output.append(f"Connection PMTU: {result['ip_mtu']}")
+        reused = " (reused connection)" if result.get('reused') else ""
+        output.append(f"Connect: {result['connect_time'] * 1000:.2f} ms{reused}")
+        
+        push = result.get('push')
+        if push:
+            if push.get('error'):
+                output.append(f"✗ Push failed: {push['error']}")
+            elif push['stalled']:
+                output.append(f"✗ Push stalled: {push['unacked']} of {push['bytes']} bytes unacknowledged "
+                              f"after {push['drain_time']:.1f} s ({push['retransmits']} retransmitting)")
+            else:
+                output.append(f"✓ Push: {push['segments']} full-sized segments acknowledged in "
+                              f"{push['drain_time'] * 1000:.2f} ms")
+            if not push.get('error') and push['pmtu_after'] != result['ip_mtu']:
+                output.append(f"PMTU after push: {push['pmtu_after']} (MSS {push['mss_after']})")
+        return output
+    
+    def format_analysis_results(self, recommendations: List['MTURecommendation'], 
+                              summary: Dict[str, Any]) -> str:
+        if self.format_type in ('json', 'ndjson'):
+            analysis = {
                 'summary': summary,
                 'recommendations': [
                     {
@@ -100,7 +291,10 @@ class MTUReporter:
                     }
                     for rec in recommendations
                 ]
-            }, indent=2)
+            }
+            if self.format_type == 'ndjson':
+                return self.format_event({'event': 'analysis', **analysis})
+            return json.dumps(analysis, indent=2)
         
         output = []
         output.append("=== MTU Analysis Results ===")
@@ -138,12 +332,60 @@ class MTUReporter:
         
         return '\n'.join(output)
     
+    def format_event(self, event: Dict[str, Any]) -> str:
+        # One progress event of a running test: an NDJSON record, or a text
+        # line for a probe, a finished phase or a trace hop
+        if self.format_type == 'ndjson':
+            return self.format_batch_record(event)
+        
+        if event['event'] == 'phase':
+            return f"{PHASE_TITLES.get(event['phase'], event['phase'])} finished"
+        if event['event'] == 'hop':
+            return self.format_hop(event)
+        if event['event'] != 'probe':
+            return self.format_batch_record(event)
+        
+        status = "✓" if event['success'] else "✗"
+        details = []
+        if event.get('rtt') is not None:
+            details.append(f"{event['rtt'] * 1000:.2f} ms")
+        if event.get('next_hop_mtu'):
+            details.append(f"next hop MTU {event['next_hop_mtu']}")
+        if event['attempts'] > 1:
+            details.append(f"attempt {event['attempts']}")
+        if event['reason'] == 'failed' and event['confidence'] < 1.0:
+            details.append(f"{event['confidence']:.2%} confidence")
+        line = f"{status} {event['ip']} {event['mtu_size']}: {event['reason']}"
+        if details:
+            line += f" ({', '.join(details)})"
+        return line
+    
+    def format_batch_record(self, record: Dict[str, Any]) -> str:
+        # Batch output is always NDJSON: one compact object per line
+        return json.dumps(record, separators=(',', ':'), default=_json_default)
+    
+    def format_cache_stats(self, stats: Dict[str, Any]) -> str:
+        if self.format_type == 'json':
+            return json.dumps(stats, indent=2, default=_json_default)
+        
+        output = []
+        output.append("=== Path MTU Cache ===")
+        output.append(f"Location: {stats['path']}")
+        output.append(f"Entries: {stats['entries']}")
+        output.append(f"Hits: {stats['hits']}")
+        output.append(f"Misses: {stats['misses']}")
+        output.append(f"Invalidated (interface MTU changed): {stats['invalidations']}")
+        output.append(f"Expired: {stats['expirations']}")
+        output.append(f"Evicted: {stats['evictions']}")
+        
+        return '\n'.join(output)
+    
     def format_interfaces_list(self, result: Dict[str, Any]) -> str:
         if not result.get('success'):
             return f"Error: {result.get('error', 'Unknown error')}"
         
         if self.format_type == 'json':
-            return json.dumps(result, indent=2)
+            return json.dumps(result, indent=2, default=_json_default)
         
         output = []
         output.append("=== Network Interfaces ===")
@@ -158,4 +400,12 @@ class MTUReporter:
                 if len(interface['addresses']) > 2:
                     output.append(f"    ... and {len(interface['addresses']) - 2} more")
         
-        return '\n'.join(output)
\ No newline at end of file
+        return '\n'.join(output)
+
+def _json_default(value: Any) -> Any:
+    # Probe records are slotted objects, not dicts
+    if isinstance(value, ProbeSeries):
+        return value.to_list()
+    if isinstance(value, ProbeResult):
+        return value.to_dict()
+    raise TypeError(f'Object of type {type(value).__name__} is not JSON serializable')
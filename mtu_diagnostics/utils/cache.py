@@ -0,0 +1,141 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, Optional, Any
+
+def default_state_dir() -> str:
+    state_dir = os.environ.get('MTU_DIAG_STATE_DIR')
+    if state_dir:
+        return state_dir
+    cache_home = os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache')
+    return os.path.join(cache_home, 'mtu_diagnostics')
+
+# Path MTU results keyed by (ip, egress interface). The interface MTU is
+# stored with each entry and a lookup with a different MTU invalidates it.
+# Any storage error degrades to a cache miss.
+class PathMTUCache:
+    def __init__(self, state_dir: Optional[str] = None, ttl: float = 600,
+                 max_entries: int = 4096):
+        self.state_dir = state_dir or default_state_dir()
+        self.path = os.path.join(self.state_dir, 'path_mtu.sqlite3')
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._db = None
+        self._lock = threading.Lock()
+    
+    def get(self, ip: str, interface: str, interface_mtu: int) -> Optional[Dict[str, Any]]:
+        now = time.time()
+        try:
+            with self._lock:
+                db = self._connect()
+                with db:
+                    row = db.execute(
+                        'SELECT interface_mtu, expires, result FROM path_mtu WHERE ip = ? AND interface = ?',
+                        (ip, interface)
+                    ).fetchone()
+                    
+                    if row is None:
+                        self._count(db, 'misses')
+                        return None
+                    
+                    cached_mtu, expires, result = row
+                    if cached_mtu != interface_mtu or expires <= now:
+                        db.execute('DELETE FROM path_mtu WHERE ip = ? AND interface = ?', (ip, interface))
+                        self._count(db, 'invalidations' if cached_mtu != interface_mtu else 'expirations')
+                        self._count(db, 'misses')
+                        return None
+                    
+                    db.execute('UPDATE path_mtu SET last_used = ? WHERE ip = ? AND interface = ?',
+                               (now, ip, interface))
+                    self._count(db, 'hits')
+                    return json.loads(result)
+        except (sqlite3.Error, OSError, ValueError):
+            return None
+    
+    def put(self, ip: str, interface: str, interface_mtu: int, result: Dict[str, Any],
+            ttl: Optional[float] = None):
+        now = time.time()
+        expires = now + (self.ttl if ttl is None else ttl)
+        try:
+            with self._lock:
+                db = self._connect()
+                with db:
+                    db.execute(
+                        'INSERT OR REPLACE INTO path_mtu '
+                        '(ip, interface, interface_mtu, result, expires, last_used) VALUES (?, ?, ?, ?, ?, ?)',
+                        (ip, interface, interface_mtu, json.dumps(result), expires, now)
+                    )
+                    
+                    # Evict least recently used entries beyond the size bound
+                    excess = db.execute('SELECT COUNT(*) FROM path_mtu').fetchone()[0] - self.max_entries
+                    if excess > 0:
+                        db.execute(
+                            'DELETE FROM path_mtu WHERE rowid IN '
+                            '(SELECT rowid FROM path_mtu ORDER BY last_used LIMIT ?)',
+                            (excess,)
+                        )
+                        self._count(db, 'evictions', excess)
+        except (sqlite3.Error, OSError, TypeError):
+            pass
+    
+    def clear(self):
+        try:
+            with self._lock:
+                db = self._connect()
+                with db:
+                    db.execute('DELETE FROM path_mtu')
+                    db.execute('DELETE FROM stats')
+        except (sqlite3.Error, OSError):
+            pass
+    
+    def stats(self) -> Dict[str, Any]:
+        stats = {
+            'path': self.path,
+            'entries': 0,
+            'hits': 0,
+            'misses': 0,
+            'invalidations': 0,
+            'expirations': 0,
+            'evictions': 0
+        }
+        try:
+            with self._lock:
+                db = self._connect()
+                stats['entries'] = db.execute('SELECT COUNT(*) FROM path_mtu').fetchone()[0]
+                stats.update(dict(db.execute('SELECT name, value FROM stats')))
+        except (sqlite3.Error, OSError):
+            pass
+        return stats
+    
+    def close(self):
+        with self._lock:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
+    
+    def _connect(self) -> sqlite3.Connection:
+        if self._db is None:
+            os.makedirs(self.state_dir, exist_ok=True)
+            db = sqlite3.connect(self.path, timeout=5, check_same_thread=False)
+            with db:
+                db.execute(
+                    'CREATE TABLE IF NOT EXISTS path_mtu ('
+                    'ip TEXT NOT NULL, interface TEXT NOT NULL, interface_mtu INTEGER NOT NULL, '
+                    'result TEXT NOT NULL, expires REAL NOT NULL, last_used REAL NOT NULL, '
+                    'PRIMARY KEY (ip, interface))'
+                )
+                db.execute('CREATE INDEX IF NOT EXISTS path_mtu_last_used ON path_mtu (last_used)')
+                db.execute('CREATE TABLE IF NOT EXISTS stats (name TEXT PRIMARY KEY, value INTEGER NOT NULL)')
+            self._db = db
+        return self._db
+    
+    def _count(self, db: sqlite3.Connection, name: str, amount: int = 1):
+        # No upsert, which needs SQLite 3.24. Counters are best effort: a
+        # failed update must not turn the hit it records into a miss.
+        try:
+            db.execute('INSERT OR IGNORE INTO stats (name, value) VALUES (?, 0)', (name,))
+            db.execute('UPDATE stats SET value = value + ? WHERE name = ?', (amount, name))
+        except sqlite3.Error:
+            pass
@@ -0,0 +1,52 @@
+import json
+import os
+import socket
+from typing import Dict, List, Optional, Any
+
+# Requests and responses are one JSON object per line, one exchange per
+# connection. Kept free of heavy imports: the CLI loads this module on every
+# forwarded call.
+MAX_MESSAGE = 16 * 1024 * 1024
+
+def default_socket_path() -> str:
+    from .cache import default_state_dir
+    
+    return os.path.join(default_state_dir(), 'server.sock')
+
+def forward(path: str, argv: List[str], timeout: Optional[float] = None) -> Optional[Dict[str, Any]]:
+    # Runs a command line on the server at `path` and returns its
+    # {'stdout', 'stderr', 'exit_code'}. None only when no server is
+    # listening; once the command was sent, failures are reported as its
+    # result so it never runs twice.
+    try:
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    except (AttributeError, OSError):
+        return None
+    
+    with sock:
+        sock.settimeout(timeout)
+        try:
+            sock.connect(path)
+        except OSError:
+            return None
+        
+        try:
+            sock.sendall(json.dumps({'argv': argv}).encode() + b'\n')
+            chunks = []
+            received = 0
+            while True:
+                chunk = sock.recv(65536)
+                if not chunk:
+                    break
+                chunks.append(chunk)
+                received += len(chunk)
+                if received > MAX_MESSAGE:
+                    return _failed(f'Response from {path} is too large')
+            return json.loads(b''.join(chunks))
+        except OSError as e:
+            return _failed(f'Lost connection to {path}: {e}')
+        except ValueError:
+            return _failed(f'Invalid response from {path}')
+
+def _failed(error: str) -> Dict[str, Any]:
+    return {'stdout': '', 'stderr': f'Error: {error}\n', 'exit_code': 1}
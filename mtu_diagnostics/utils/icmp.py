@@ -0,0 +1,433 @@
+import errno
+import ipaddress
+import itertools
+import os
+import select
+import socket
+import struct
+import sys
+import threading
+import time
+from typing import Dict, List, Optional, Any, Tuple
+from .probe_result import Outcome, ProbeResult
+from .ratelimit import ProbeRateLimiter
+
+# asyncio is imported by the async paths only: it is the costliest import of
+# the package and synchronous probing never needs it
+
+# Linux socket options that the socket module does not export
+IP_MTU_DISCOVER = getattr(socket, 'IP_MTU_DISCOVER', 10)
+IP_PMTUDISC_DO = getattr(socket, 'IP_PMTUDISC_DO', 2)
+IP_RECVERR = getattr(socket, 'IP_RECVERR', 11)
+IP_MTU = getattr(socket, 'IP_MTU', 14)
+IPV6_MTU_DISCOVER = getattr(socket, 'IPV6_MTU_DISCOVER', 23)
+IPV6_MTU = getattr(socket, 'IPV6_MTU', 24)
+IPV6_RECVERR = getattr(socket, 'IPV6_RECVERR', 25)
+SO_EE_ORIGIN_ICMP = 2
+SO_EE_ORIGIN_ICMP6 = 3
+
+ICMP_ECHO_REPLY = 0
+ICMP_DEST_UNREACH = 3
+ICMP_ECHO_REQUEST = 8
+ICMP_FRAG_NEEDED = 4
+
+ICMP6_DEST_UNREACH = 1
+ICMP6_PACKET_TOO_BIG = 2
+ICMP6_ECHO_REQUEST = 128
+ICMP6_ECHO_REPLY = 129
+
+# The same options live at a different level and number for each family.
+# IP_PMTUDISC_* and IPV6_PMTUDISC_* share their values.
+FAMILY_OPTIONS = {
+    socket.AF_INET: {'level': socket.IPPROTO_IP, 'mtu_discover': IP_MTU_DISCOVER,
+                     'recverr': IP_RECVERR, 'mtu': IP_MTU, 'origin': SO_EE_ORIGIN_ICMP},
+    socket.AF_INET6: {'level': socket.IPPROTO_IPV6, 'mtu_discover': IPV6_MTU_DISCOVER,
+                      'recverr': IPV6_RECVERR, 'mtu': IPV6_MTU, 'origin': SO_EE_ORIGIN_ICMP6}
+}
+
+def address_family(ip: str) -> Optional[int]:
+    # AF_INET or AF_INET6 for an address literal, None for anything else
+    try:
+        address = ipaddress.ip_address(ip)
+    except ValueError:
+        return None
+    return socket.AF_INET6 if address.version == 6 else socket.AF_INET
+
+def set_pmtu_discovery(sock: socket.socket, family: int, mode: int = IP_PMTUDISC_DO):
+    # DF (or its IPv6 equivalent, no local fragmentation) plus ICMP errors,
+    # Frag-Needed and Packet Too Big included, on the error queue
+    options = FAMILY_OPTIONS[family]
+    sock.setsockopt(options['level'], options['mtu_discover'], mode)
+    sock.setsockopt(options['level'], options['recverr'], 1)
+
+def parse_extended_err(ancdata) -> Optional[Tuple[int, int, int, int, Optional[str]]]:
+    # (errno, origin, ICMP type, ICMP info, offender) from the IP_RECVERR or
+    # IPV6_RECVERR message of an error queue read
+    for level, cmsg_type, cmsg_data in ancdata:
+        if (level, cmsg_type) not in ((socket.IPPROTO_IP, IP_RECVERR), (socket.IPPROTO_IPV6, IPV6_RECVERR)):
+            continue
+        if len(cmsg_data) < 16:
+            continue
+        
+        # struct sock_extended_err, followed by the offender's sockaddr
+        ee_errno, ee_origin, ee_type, _, _, ee_info, _ = struct.unpack('=IBBBBII', cmsg_data[:16])
+        offender = None
+        if level == socket.IPPROTO_IP and len(cmsg_data) >= 24:
+            offender = socket.inet_ntop(socket.AF_INET, cmsg_data[20:24])
+        elif level == socket.IPPROTO_IPV6 and len(cmsg_data) >= 40:
+            offender = socket.inet_ntop(socket.AF_INET6, cmsg_data[24:40])
+        return ee_errno, ee_origin, ee_type, ee_info, offender
+    return None
+
+def icmp_checksum(data: bytes) -> int:
+    if len(data) % 2:
+        data += b'\x00'
+    total = sum(struct.unpack('!%dH' % (len(data) // 2), data))
+    total = (total >> 16) + (total & 0xffff)
+    total += total >> 16
+    return ~total & 0xffff
+
+# Sends DF echo requests from one reusable socket: an unprivileged ping
+# socket where net.ipv4.ping_group_range allows it, a raw socket otherwise.
+# One prober speaks one family, ICMP echo over IPv4 or ICMPv6 echo over IPv6.
+class ICMPProber:
+    # Echo replies must come from the address probed
+    check_source = True
+    
+    def __init__(self, family: int = socket.AF_INET):
+        self.family = family
+        self.sock = None
+        self.raw = False
+        # Raw sockets see every echo reply on the host, the id tells ours apart
+        self.ident = (os.getpid() + next(_idents)) & 0xffff
+        self.sequence = 0
+        self._loop = None
+        self._waiters = {}
+    
+    def open(self) -> bool:
+        if self.sock is not None:
+            return True
+        if not sys.platform.startswith('linux'):
+            return False
+        
+        protocol = socket.IPPROTO_ICMPV6 if self.family == socket.AF_INET6 else socket.IPPROTO_ICMP
+        for sock_type in (socket.SOCK_DGRAM, socket.SOCK_RAW):
+            try:
+                sock = socket.socket(self.family, sock_type, protocol)
+            except OSError:
+                continue
+            try:
+                # Frag-Needed / Packet Too Big errors land on the error queue
+                # with the next-hop MTU
+                set_pmtu_discovery(sock, self.family)
+            except OSError:
+                sock.close()
+                continue
+            sock.setblocking(False)
+            self.sock = sock
+            self.raw = sock_type == socket.SOCK_RAW
+            return True
+        
+        return False
+    
+    def close(self):
+        self._detach()
+        if self.sock is not None:
+            self.sock.close()
+            self.sock = None
+    
+    def probe(self, ip: str, size: int, timeout: float = 5,
+              limiter: Optional[ProbeRateLimiter] = None) -> ProbeResult:
+        if limiter is not None:
+            limiter.wait(ip)
+        seq = self._next_sequence()
+        start = time.monotonic()
+        
+        error = self._send(ip, seq, size)
+        if error is not None:
+            return error
+        
+        deadline = start + timeout
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return self._result('failed')
+            
+            ready, _, _ = select.select([self.sock], [], [], remaining)
+            if not ready:
+                continue
+            
+            for reason, reply_seq, next_hop_mtu, addr in self._receive() or []:
+                if reply_seq != seq or (reason == 'ok' and self.check_source and addr != ip):
+                    continue
+                return self._result(reason, time.monotonic() - start, next_hop_mtu)
+    
+    async def probe_async(self, ip: str, size: int, timeout: float = 5,
+                          limiter: Optional[ProbeRateLimiter] = None) -> ProbeResult:
+        # The timeout runs from the send, not from the wait for a slot
+        import asyncio
+        
+        if limiter is not None:
+            await limiter.wait_async(ip)
+        loop = asyncio.get_running_loop()
+        self._attach(loop)
+        
+        seq = self._next_sequence()
+        future = loop.create_future()
+        self._waiters[seq] = (future, ip)
+        start = time.monotonic()
+        
+        try:
+            error = self._send(ip, seq, size)
+            if error is not None:
+                return error
+            try:
+                reason, received, next_hop_mtu = await asyncio.wait_for(future, timeout)
+            except asyncio.TimeoutError:
+                return self._result('failed')
+            return self._result(reason, received - start, next_hop_mtu)
+        finally:
+            self._waiters.pop(seq, None)
+    
+    async def probe_many_async(self, ip: str, sizes: List[int], timeout: float = 5,
+                               limiter: Optional[ProbeRateLimiter] = None) -> Dict[int, ProbeResult]:
+        # All sizes go out at once, as fast as the limiter allows
+        import asyncio
+        
+        results = await asyncio.gather(*(self.probe_async(ip, size, timeout, limiter) for size in sizes))
+        return dict(zip(sizes, results))
+    
+    def probe_many(self, ip: str, sizes: List[int], timeout: float = 5,
+                   limiter: Optional[ProbeRateLimiter] = None) -> Dict[int, ProbeResult]:
+        import asyncio
+        
+        async def run():
+            try:
+                return await self.probe_many_async(ip, sizes, timeout, limiter)
+            finally:
+                self._detach()
+        
+        return asyncio.run(run())
+    
+    def _attach(self, loop: 'asyncio.AbstractEventLoop'):
+        if self._loop is loop:
+            return
+        self._detach()
+        loop.add_reader(self.sock.fileno(), self._on_readable)
+        self._loop = loop
+    
+    def _detach(self):
+        if self._loop is not None:
+            if not self._loop.is_closed():
+                self._loop.remove_reader(self.sock.fileno())
+            self._loop = None
+    
+    def _on_readable(self):
+        while True:
+            events = self._receive()
+            if events is None:
+                return
+            
+            for reason, seq, next_hop_mtu, addr in events:
+                waiter = self._waiters.get(seq)
+                if waiter is None or waiter[0].done():
+                    continue
+                future, ip = waiter
+                if reason == 'ok' and self.check_source and addr != ip:
+                    continue
+                future.set_result((reason, time.monotonic(), next_hop_mtu))
+    
+    def _receive(self) -> Optional[List[Tuple[str, int, Optional[int], Optional[str]]]]:
+        # Returns None once both the receive queue and the error queue are empty
+        consumed = False
+        events = []
+        
+        try:
+            data, addr = self.sock.recvfrom(65535)
+            consumed = True
+            reply = self._parse(data)
+            if reply is not None:
+                events.append(reply + (addr[0],))
+        except (BlockingIOError, InterruptedError):
+            pass
+        except OSError:
+            # A pending socket error, the details are on the error queue
+            consumed = True
+        
+        while True:
+            try:
+                data, ancdata, _, addr = self.sock.recvmsg(65535, 512, socket.MSG_ERRQUEUE)
+            except OSError:
+                break
+            consumed = True
+            error = self._parse_error(data, ancdata)
+            if error is not None:
+                events.append(error + (addr[0] if addr else None,))
+        
+        return events if consumed else None
+    
+    def _parse_error(self, data: bytes, ancdata) -> Optional[Tuple[str, int, Optional[int]]]:
+        error = parse_extended_err(ancdata)
+        if error is None:
+            return None
+        ee_errno, ee_origin, _, ee_info, _ = error
+        if ee_origin != FAMILY_OPTIONS[self.family]['origin']:
+            return None
+        
+        seq = self._error_seq(data)
+        if seq is None:
+            return None
+        if ee_errno == errno.EMSGSIZE:
+            return ('mtu_exceeded', seq, ee_info or None)
+        # Host, network or (for UDP) port unreachable: definitive, unlike a timeout
+        return ('unreachable', seq, None)
+    
+    def _error_seq(self, data: bytes) -> Optional[int]:
+        # The payload is the echo request that failed. Linux starts it at the
+        # ICMP header, but an IPv4 raw socket may get the IP header first
+        # (IP_HDRINCL); an echo request's type never has IPv4's version nibble.
+        if self.raw and self.family == socket.AF_INET and data and data[0] >> 4 == 4:
+            data = data[(data[0] & 0x0f) * 4:]
+        if len(data) < 8:
+            return None
+        icmp_type, _, _, ident, seq = struct.unpack('!BBHHH', data[:8])
+        if self.raw:
+            # Raw sockets see the errors for every ICMP socket on the host
+            request = ICMP6_ECHO_REQUEST if self.family == socket.AF_INET6 else ICMP_ECHO_REQUEST
+            if icmp_type != request or ident != self.ident:
+                return None
+        return seq
+    
+    def _send(self, ip: str, seq: int, size: int) -> Optional[ProbeResult]:
+        try:
+            self.sock.sendto(self._build_probe(seq, size), self._destination(ip))
+        except OSError as e:
+            if e.errno == errno.EMSGSIZE:
+                # Rejected locally against the interface MTU or a cached PMTU
+                return self._result('mtu_exceeded', next_hop_mtu=get_route_mtu(ip))
+            return ProbeResult(Outcome.FAILED, error=str(e))
+        return None
+    
+    def _result(self, reason: str, rtt: Optional[float] = None,
+                next_hop_mtu: Optional[int] = None) -> ProbeResult:
+        return ProbeResult(Outcome(reason), rtt, next_hop_mtu)
+    
+    def _next_sequence(self) -> int:
+        self.sequence = (self.sequence + 1) & 0xffff
+        return self.sequence
+    
+    def _destination(self, ip: str) -> Tuple[str, int]:
+        return (ip, 0)
+    
+    def _build_probe(self, seq: int, size: int) -> bytes:
+        payload = b'\x00' * size
+        if self.family == socket.AF_INET6:
+            # The kernel fills in the ICMPv6 checksum, it covers a pseudo-header
+            return struct.pack('!BBHHH', ICMP6_ECHO_REQUEST, 0, 0, self.ident, seq) + payload
+        header = struct.pack('!BBHHH', ICMP_ECHO_REQUEST, 0, 0, self.ident, seq)
+        csum = icmp_checksum(header + payload)
+        return struct.pack('!BBHHH', ICMP_ECHO_REQUEST, 0, csum, self.ident, seq) + payload
+    
+    def _parse(self, data: bytes) -> Optional[Tuple[str, int, Optional[int]]]:
+        if self.family == socket.AF_INET6:
+            return self._parse_v6(data)
+        
+        # Raw sockets hand us the IP header, ping sockets do not
+        if self.raw:
+            if not data:
+                return None
+            data = data[(data[0] & 0x0f) * 4:]
+        if len(data) < 8:
+            return None
+        
+        icmp_type, code, _, ident, seq = struct.unpack('!BBHHH', data[:8])
+        
+        if icmp_type == ICMP_ECHO_REPLY:
+            if self.raw and ident != self.ident:
+                return None
+            return ('ok', seq, None)
+        
+        # Only raw sockets see ICMP errors as ordinary packets
+        if icmp_type == ICMP_DEST_UNREACH and self.raw:
+            inner = data[8:]
+            if not inner:
+                return None
+            original = inner[(inner[0] & 0x0f) * 4:][:8]
+            if len(original) < 8:
+                return None
+            orig_type, _, _, orig_ident, orig_seq = struct.unpack('!BBHHH', original)
+            if orig_type != ICMP_ECHO_REQUEST or orig_ident != self.ident:
+                return None
+            if code == ICMP_FRAG_NEEDED:
+                next_hop_mtu = struct.unpack('!H', data[6:8])[0]
+                return ('mtu_exceeded', orig_seq, next_hop_mtu or None)
+            return ('unreachable', orig_seq, None)
+        
+        return None
+    
+    def _parse_v6(self, data: bytes) -> Optional[Tuple[str, int, Optional[int]]]:
+        # IPv6 raw sockets never include the IP header. They also see every
+        # ICMPv6 message on the host, neighbour discovery included.
+        if len(data) < 8:
+            return None
+        
+        icmp_type, code, _, ident, seq = struct.unpack('!BBHHH', data[:8])
+        
+        if icmp_type == ICMP6_ECHO_REPLY:
+            if self.raw and ident != self.ident:
+                return None
+            return ('ok', seq, None)
+        
+        if icmp_type in (ICMP6_PACKET_TOO_BIG, ICMP6_DEST_UNREACH) and self.raw:
+            # The invoking packet follows from its fixed 40 byte header on
+            original = data[8 + 40:8 + 48]
+            if len(original) < 8:
+                return None
+            orig_type, _, _, orig_ident, orig_seq = struct.unpack('!BBHHH', original)
+            if orig_type != ICMP6_ECHO_REQUEST or orig_ident != self.ident:
+                return None
+            if icmp_type == ICMP6_PACKET_TOO_BIG:
+                # The MTU is 32 bits here, not 16 as in Frag-Needed
+                next_hop_mtu = struct.unpack('!I', data[4:8])[0]
+                return ('mtu_exceeded', orig_seq, next_hop_mtu or None)
+            return ('unreachable', orig_seq, None)
+        
+        return None
+
+def get_route_info(ip: str) -> Optional[Tuple[int, str]]:
+    # A connected UDP socket exposes the kernel's current PMTU for the route
+    # and the source address it would use. Connecting sends nothing.
+    family = address_family(ip)
+    if family is None:
+        return None
+    try:
+        with socket.socket(family, socket.SOCK_DGRAM) as sock:
+            sock.connect((ip, 9))
+            options = FAMILY_OPTIONS[family]
+            return sock.getsockopt(options['level'], options['mtu']), sock.getsockname()[0]
+    except OSError:
+        return None
+
+def get_route_mtu(ip: str) -> Optional[int]:
+    route = get_route_info(ip)
+    return route[0] if route else None
+
+_idents = itertools.count()
+_local = threading.local()
+
+def icmp_thread_probers() -> Dict[int, Any]:
+    # The calling thread's probers by family (False where none could be
+    # opened), for owners of worker threads that close them afterwards
+    probers = getattr(_local, 'probers', None)
+    if probers is None:
+        probers = _local.probers = {}
+    return probers
+
+def get_icmp_prober(family: int = socket.AF_INET) -> Optional[ICMPProber]:
+    # One prober per thread and family: a socket's replies are consumed by
+    # whoever reads it, so threads must not share one
+    probers = icmp_thread_probers()
+    if family not in probers:
+        prober = ICMPProber(family)
+        probers[family] = prober if prober.open() else False
+    return probers[family] or None
@@ -0,0 +1,60 @@
+import threading
+from typing import Dict, Any
+
+# Per-target packet loss seen on probes that eventually got a reply, used to
+# decide when repeated timeouts at one size are a drop rather than bad luck.
+# The loss rate p has a Beta posterior, and n consecutive timeouts of a packet
+# that fits happen with probability E[p ** n] under it; a size is settled as
+# dropped once that falls below 1 - confidence. Little data keeps the
+# posterior wide, so fewer observations mean more retries. Targets that have
+# never replied are not retried.
+class LossTracker:
+    def __init__(self, confidence: float = 0.999, max_attempts: int = 8,
+                 prior_loss: float = 0.05, prior_weight: float = 2,
+                 max_targets: int = 10000):
+        self.confidence = confidence
+        self.max_attempts = max(1, max_attempts)
+        self.prior_loss = prior_loss
+        self.prior_weight = prior_weight
+        self.max_targets = max_targets
+        self._counts = {}
+        self._lock = threading.Lock()
+    
+    def record(self, ip: str, attempts: int):
+        # One size delivered after `attempts` sends, all but the last were lost
+        with self._lock:
+            counts = self._counts.get(ip)
+            if counts is None:
+                if len(self._counts) >= self.max_targets:
+                    self._counts.pop(next(iter(self._counts)))
+                counts = self._counts[ip] = [0, 0]
+            counts[0] += attempts
+            counts[1] += attempts - 1
+    
+    def loss_rate(self, ip: str) -> float:
+        sent, lost = self._counts.get(ip, (0, 0))
+        return (lost + self.prior_loss * self.prior_weight) / (sent + self.prior_weight)
+    
+    def confidence_of(self, ip: str, timeouts: int) -> float:
+        # Confidence that a size which timed out `timeouts` times in a row is
+        # really being dropped
+        if ip not in self._counts:
+            return 0.0
+        sent, lost = self._counts[ip]
+        a = lost + self.prior_loss * self.prior_weight
+        b = sent - lost + (1 - self.prior_loss) * self.prior_weight
+        
+        # E[p ** n] for p ~ Beta(a, b)
+        all_lost = 1.0
+        for i in range(timeouts):
+            all_lost *= (a + i) / (a + b + i)
+        return 1 - all_lost
+    
+    def settled(self, ip: str, timeouts: int) -> bool:
+        if ip not in self._counts:
+            return True
+        return self.confidence_of(ip, timeouts) >= self.confidence
+    
+    def stats(self, ip: str) -> Dict[str, Any]:
+        sent, lost = self._counts.get(ip, (0, 0))
+        return {'sent': sent, 'lost': lost, 'loss_rate': round(self.loss_rate(ip), 4)}
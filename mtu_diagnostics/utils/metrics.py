@@ -0,0 +1,70 @@
+import bisect
+import math
+import threading
+from typing import Dict, Iterable, List, Optional, Tuple
+
+CONTENT_TYPE = 'application/openmetrics-text; version=1.0.0; charset=utf-8'
+
+# Fixed buckets, so a histogram costs the same however many values it has
+# seen. Counts are per bucket here and only made cumulative when exposed.
+class Histogram:
+    def __init__(self, buckets: Iterable[float]):
+        self.buckets = sorted(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+        self._lock = threading.Lock()
+    
+    def observe(self, value: float):
+        with self._lock:
+            self.counts[bisect.bisect_left(self.buckets, value)] += 1
+            self.sum += value
+            self.count += 1
+    
+    def cumulative(self) -> List[Tuple[float, int]]:
+        # (upper bound, observations at or below it), ending with +Inf
+        with self._lock:
+            total = 0
+            result = []
+            for bound, count in zip(self.buckets + [math.inf], self.counts):
+                total += count
+                result.append((bound, total))
+            return result
+
+# Builds an OpenMetrics text exposition one metric family at a time
+class Exposition:
+    def __init__(self):
+        self.lines = []
+    
+    def family(self, name: str, metric_type: str, help_text: str, unit: Optional[str] = None):
+        self.lines.append(f'# TYPE {name} {metric_type}')
+        if unit:
+            self.lines.append(f'# UNIT {name} {unit}')
+        self.lines.append(f'# HELP {name} {_escape(help_text)}')
+    
+    def sample(self, name: str, value: float, labels: Optional[Dict[str, str]] = None):
+        self.lines.append(f'{name}{_labels(labels)} {_number(value)}')
+    
+    def histogram(self, name: str, histogram: Histogram, labels: Optional[Dict[str, str]] = None):
+        for bound, count in histogram.cumulative():
+            self.sample(f'{name}_bucket', count, dict(labels or {}, le=_number(float(bound))))
+        self.sample(f'{name}_count', histogram.count, labels)
+        self.sample(f'{name}_sum', histogram.sum, labels)
+    
+    def render(self) -> str:
+        return '\n'.join(self.lines + ['# EOF']) + '\n'
+
+def _labels(labels: Optional[Dict[str, str]]) -> str:
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{key}="{_escape(str(value))}"' for key, value in labels.items()) + '}'
+
+def _escape(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def _number(value: float) -> str:
+    if value == math.inf:
+        return '+Inf'
+    if isinstance(value, float) and value.is_integer() and abs(value) < 1e15:
+        return f'{value:.1f}'
+    return str(value)
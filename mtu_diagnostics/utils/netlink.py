@@ -0,0 +1,180 @@
+import ipaddress
+import os
+import socket
+import struct
+from typing import Dict, List, Optional, Any, Tuple
+
+NETLINK_ROUTE = 0
+
+NLMSG_ERROR = 2
+NLMSG_DONE = 3
+RTM_NEWROUTE = 24
+RTM_GETROUTE = 26
+
+NLM_F_REQUEST = 0x1
+NLM_F_MULTI = 0x2
+NLM_F_DUMP = 0x300
+
+RTN_UNICAST = 1
+RT_TABLE_MAIN = 254
+
+RTA_DST = 1
+RTA_OIF = 4
+RTA_GATEWAY = 5
+RTA_PRIORITY = 6
+RTA_PREFSRC = 7
+RTA_METRICS = 8
+RTA_CACHEINFO = 12
+RTA_TABLE = 15
+RTAX_MTU = 2
+
+# User-space clock ticks per second, the unit of rta_cacheinfo.rta_expires
+USER_HZ = 100
+
+NLMSGHDR = struct.Struct('=IHHII')
+RTMSG = struct.Struct('=BBBBBBBBI')
+RTATTR = struct.Struct('=HH')
+# struct rta_cacheinfo: clntref, lastuse, expires, error, used, ...
+RTA_CACHEINFO_EXPIRES = struct.Struct('=8xi')
+
+def get_route(destination: str) -> Optional[Dict[str, Any]]:
+    # Equivalent of `ip route get <destination>`: the kernel applies policy
+    # rules, VRFs and PMTU exceptions for this exact address
+    try:
+        address = ipaddress.ip_address(destination)
+    except ValueError:
+        return None
+    
+    family = socket.AF_INET if address.version == 4 else socket.AF_INET6
+    rtmsg = RTMSG.pack(family, address.max_prefixlen, 0, 0, 0, 0, 0, 0, 0)
+    request = rtmsg + _rtattr(RTA_DST, address.packed)
+    
+    routes = _request(RTM_GETROUTE, NLM_F_REQUEST, request)
+    return routes[0] if routes else None
+
+def get_default_route(family: int = socket.AF_INET) -> Optional[Dict[str, Any]]:
+    # Equivalent of `ip route show default`: lowest-metric default route in
+    # the main table
+    rtmsg = RTMSG.pack(family, 0, 0, 0, 0, 0, 0, 0, 0)
+    routes = _request(RTM_GETROUTE, NLM_F_REQUEST | NLM_F_DUMP, rtmsg)
+    if not routes:
+        return None
+    
+    defaults = [route for route in routes
+                if route['dst_len'] == 0 and route['type'] == RTN_UNICAST
+                and route['table'] == RT_TABLE_MAIN and route['ifindex']]
+    if not defaults:
+        return None
+    return min(defaults, key=lambda route: route['priority'] or 0)
+
+def _request(msg_type: int, flags: int, payload: bytes) -> Optional[List[Dict[str, Any]]]:
+    if not hasattr(socket, 'AF_NETLINK'):
+        return None
+    
+    try:
+        with socket.socket(socket.AF_NETLINK, socket.SOCK_RAW, NETLINK_ROUTE) as sock:
+            sock.settimeout(2)
+            sock.bind((0, 0))
+            seq = os.getpid() & 0xffff
+            sock.send(NLMSGHDR.pack(NLMSGHDR.size + len(payload), msg_type, flags, seq, 0) + payload)
+            
+            routes = []
+            while True:
+                data = sock.recv(65536)
+                done, error = _parse_messages(data, seq, routes)
+                if error:
+                    return None
+                if done:
+                    return routes
+    except (OSError, struct.error):
+        return None
+
+def _parse_messages(data: bytes, seq: int, routes: List[Dict[str, Any]]) -> Tuple[bool, bool]:
+    # Returns (done, error)
+    offset = 0
+    while offset + NLMSGHDR.size <= len(data):
+        length, msg_type, flags, msg_seq, _ = NLMSGHDR.unpack_from(data, offset)
+        if length < NLMSGHDR.size:
+            return True, True
+        body = data[offset + NLMSGHDR.size:offset + length]
+        offset += _align(length)
+        
+        if msg_seq != seq:
+            continue
+        if msg_type == NLMSG_DONE:
+            return True, False
+        if msg_type == NLMSG_ERROR:
+            return True, struct.unpack_from('=i', body)[0] != 0
+        if msg_type == RTM_NEWROUTE:
+            routes.append(_parse_route(body))
+            if not flags & NLM_F_MULTI:
+                return True, False
+    
+    return False, False
+
+def _parse_route(body: bytes) -> Dict[str, Any]:
+    family, dst_len, _, _, table, _, _, route_type, _ = RTMSG.unpack_from(body)
+    route = {
+        'family': family,
+        'dst_len': dst_len,
+        'type': route_type,
+        'table': table,
+        'destination': None,
+        'ifindex': None,
+        'gateway': None,
+        'source': None,
+        'priority': None,
+        'mtu': None,
+        'expires': None
+    }
+    
+    for attr_type, value in _parse_attrs(body[RTMSG.size:]):
+        if attr_type == RTA_DST:
+            route['destination'] = _address(value)
+        elif attr_type == RTA_OIF:
+            route['ifindex'] = struct.unpack('=I', value[:4])[0]
+        elif attr_type == RTA_GATEWAY:
+            route['gateway'] = _address(value)
+        elif attr_type == RTA_PREFSRC:
+            route['source'] = _address(value)
+        elif attr_type == RTA_PRIORITY:
+            route['priority'] = struct.unpack('=I', value[:4])[0]
+        elif attr_type == RTA_TABLE:
+            route['table'] = struct.unpack('=I', value[:4])[0]
+        elif attr_type == RTA_CACHEINFO and len(value) >= RTA_CACHEINFO_EXPIRES.size:
+            # Seconds until a learned exception expires ("cache expires 446sec"),
+            # 0 for configured routes
+            route['expires'] = max(0, RTA_CACHEINFO_EXPIRES.unpack_from(value)[0]) / USER_HZ
+        elif attr_type == RTA_METRICS:
+            # Nested RTAX_* attributes; RTAX_MTU is a route MTU or a PMTU
+            # exception, told apart by `expires`
+            for metric, metric_value in _parse_attrs(value):
+                if metric == RTAX_MTU:
+                    route['mtu'] = struct.unpack('=I', metric_value[:4])[0]
+    
+    return route
+
+def _parse_attrs(data: bytes) -> List[Tuple[int, bytes]]:
+    attrs = []
+    offset = 0
+    while offset + RTATTR.size <= len(data):
+        length, attr_type = RTATTR.unpack_from(data, offset)
+        if length < RTATTR.size:
+            break
+        attrs.append((attr_type, data[offset + RTATTR.size:offset + length]))
+        offset += _align(length)
+    return attrs
+
+def _rtattr(attr_type: int, value: bytes) -> bytes:
+    length = RTATTR.size + len(value)
+    return RTATTR.pack(length, attr_type) + value + b'\x00' * (_align(length) - length)
+
+def _align(length: int) -> int:
+    return (length + 3) & ~3
+
+def _address(value: bytes) -> Optional[str]:
+    if len(value) == 4:
+        return socket.inet_ntop(socket.AF_INET, value)
+    if len(value) == 16:
+        return socket.inet_ntop(socket.AF_INET6, value)
+    return None
@@ -1,20 +1,37 @@
+import re
 import socket
 import platform
-from typing import List, Dict, Optional
+import threading
+from concurrent.futures import CancelledError, Future, ThreadPoolExecutor
+from typing import Any, List, Dict, Optional
 from .platform import run_command
+from .icmp import ICMPProber, address_family, get_icmp_prober, icmp_thread_probers
+from .probe_result import Outcome, ProbeResult
+from .ratelimit import get_rate_limiter
+from .udp import DEFAULT_PORT, UDPProber, get_udp_prober, udp_thread_probers
+
+# Raw ping output is large and only read when debugging, so results carry it
+# only after set_keep_output(True)
+_keep_output = False
+
+def set_keep_output(keep: bool):
+    global _keep_output
+    _keep_output = keep
 
 def is_valid_ip(ip: str) -> bool:
-    try:
-        socket.inet_aton(ip)
-        return True
-    except socket.error:
-        return False
+    return address_family(ip) is not None
 
 def resolve_hostname(hostname: str) -> Optional[str]:
+    # First IPv4 address, else the first IPv6 one
     try:
-        return socket.gethostbyname(hostname)
-    except socket.gaierror:
+        infos = socket.getaddrinfo(hostname, None, 0, socket.SOCK_DGRAM)
+    except (socket.gaierror, UnicodeError):
         return None
+    for family in (socket.AF_INET, socket.AF_INET6):
+        for info in infos:
+            if info[0] == family:
+                return info[4][0]
+    return None
 
 def get_ping_command(target: str, size: int, dont_fragment: bool = True) -> List[str]:
     system = platform.system().lower()
@@ -37,18 +54,175 @@ def get_ping_command(target: str, size: int, dont_fragment: bool = True) -> List
     
     return cmd
 
-def ping_with_size(target: str, size: int, dont_fragment: bool = True, timeout: int = 5) -> Dict[str, any]:
+def ping_with_size(target: str, size: int, dont_fragment: bool = True, timeout: int = 5) -> Dict[str, Any]:
+    # The original dict API ('success', 'reason', 'next_hop_mtu', ...), kept
+    # for existing callers. The package itself uses ping_result.
+    return ping_result(target, size, dont_fragment, timeout).to_dict()
+
+def ping_result(target: str, size: int, dont_fragment: bool = True, timeout: int = 5) -> ProbeResult:
+    # Probe in-process where we can, spawning ping is the fallback
+    family = address_family(target)
+    prober = get_icmp_prober(family) if dont_fragment and family else None
+    limiter = get_rate_limiter()
+    if prober is not None:
+        return prober.probe(target, size, timeout, limiter)
+    
+    if limiter is not None:
+        limiter.wait(target)
     cmd = get_ping_command(target, size, dont_fragment)
     result = run_command(cmd, timeout)
     
-    success = result['success']
-    if not success and result['stderr']:
+    output = result if _keep_output else None
+    if not result['success'] and result['stderr']:
         if any(phrase in result['stderr'].lower() for phrase in 
                ['message too long', 'packet too big', 'fragmentation needed']):
-            return {'success': False, 'reason': 'mtu_exceeded', 'output': result}
+            # iputils reports the next-hop MTU as "mtu=1400" / "(mtu = 1400)"
+            match = re.search(r'mtu\s*=\s*(\d+)', result['stderr'] + result['stdout'])
+            next_hop_mtu = int(match.group(1)) if match else None
+            return ProbeResult(Outcome.MTU_EXCEEDED, next_hop_mtu=next_hop_mtu, output=output)
     
-    return {
-        'success': success,
-        'reason': 'ok' if success else 'failed',
-        'output': result
-    }
\ No newline at end of file
+    return ProbeResult(Outcome.OK if result['success'] else Outcome.FAILED, output=output)
+
+def ping_sizes(target: str, sizes: List[int], dont_fragment: bool = True,
+               timeout: int = 5) -> Dict[int, ProbeResult]:
+    family = address_family(target)
+    prober = get_icmp_prober(family) if dont_fragment and family else None
+    if prober is not None:
+        return prober.probe_many(target, sizes, timeout, get_rate_limiter())
+    
+    with ThreadPoolExecutor(max_workers=max(1, len(sizes))) as executor:
+        results = executor.map(lambda size: ping_result(target, size, dont_fragment, timeout), sizes)
+        return dict(zip(sizes, results))
+
+def udp_probe_with_size(target: str, size: int, port: int = DEFAULT_PORT,
+                        timeout: float = 5) -> ProbeResult:
+    # DF datagram to a `mtu-diag responder`, for targets that filter ICMP echo.
+    # There is no subprocess fallback.
+    family = address_family(target)
+    prober = get_udp_prober(port, family) if family else None
+    if prober is None:
+        return _udp_unavailable(target)
+    return prober.probe(target, size, timeout, get_rate_limiter())
+
+def udp_probe_sizes(target: str, sizes: List[int], port: int = DEFAULT_PORT,
+                    timeout: float = 5) -> Dict[int, ProbeResult]:
+    family = address_family(target)
+    prober = get_udp_prober(port, family) if family else None
+    if prober is None:
+        return {size: _udp_unavailable(target) for size in sizes}
+    return prober.probe_many(target, sizes, timeout, get_rate_limiter())
+
+def close_thread_probers():
+    # For worker threads about to exit: their probers would otherwise keep
+    # the sockets open until the thread object is collected. A later probe
+    # from the same thread opens new ones.
+    for probers in (icmp_thread_probers(), udp_thread_probers()):
+        for prober in probers.values():
+            if prober:
+                prober.close()
+        probers.clear()
+
+# Probe sockets owned by one client, such as an MTUSession, instead of by the
+# calling thread: one ICMP prober per family and one UDP prober per port and
+# family, opened on first use. They live on an event loop thread of their own,
+# where each socket's reader hands replies to the waiting probe by sequence
+# number, so any number of threads and event loops can probe through the same
+# sockets at once. close() closes them; probes still in flight then raise.
+class ProberSet:
+    def __init__(self):
+        self.closed = False
+        self._probers = {}
+        self._loop = None
+        self._thread = None
+        self._lock = threading.Lock()
+    
+    def probe_sizes(self, target: str, sizes: List[int], timeout: float = 5,
+                    udp_port: Optional[int] = None) -> Dict[int, ProbeResult]:
+        # Blocks the calling thread, like ping_sizes
+        try:
+            return self._submit(target, sizes, timeout, udp_port).result()
+        except CancelledError:
+            raise RuntimeError('Probe sockets closed while probing') from None
+    
+    async def probe_sizes_async(self, target: str, sizes: List[int], timeout: float = 5,
+                                udp_port: Optional[int] = None) -> Dict[int, ProbeResult]:
+        import asyncio
+        
+        try:
+            return await asyncio.wrap_future(self._submit(target, sizes, timeout, udp_port))
+        except asyncio.CancelledError:
+            # Cancelling the caller cancels the probe too; only a cancelled
+            # probe means the sockets were closed
+            if not self.closed:
+                raise
+            raise RuntimeError('Probe sockets closed while probing') from None
+    
+    def close(self):
+        with self._lock:
+            if self.closed:
+                return
+            self.closed = True
+            loop, thread = self._loop, self._thread
+        if loop is None:
+            return
+        
+        import asyncio
+        
+        asyncio.run_coroutine_threadsafe(self._shutdown(), loop).result()
+        loop.call_soon_threadsafe(loop.stop)
+        thread.join()
+        loop.close()
+    
+    def _submit(self, target: str, sizes: List[int], timeout: float, udp_port: Optional[int]) -> Future:
+        import asyncio
+        
+        # Under the lock, so that nothing is submitted after close() has
+        # started shutting the loop down
+        with self._lock:
+            if self.closed:
+                raise RuntimeError('Probe sockets are closed')
+            if self._loop is None:
+                self._loop = asyncio.new_event_loop()
+                self._thread = threading.Thread(target=self._loop.run_forever, name='mtu-probers', daemon=True)
+                self._thread.start()
+            return asyncio.run_coroutine_threadsafe(self._probe(target, sizes, timeout, udp_port), self._loop)
+    
+    async def _probe(self, target: str, sizes: List[int], timeout: float,
+                     udp_port: Optional[int]) -> Dict[int, ProbeResult]:
+        # On the loop thread, which alone opens and reads the sockets
+        family = address_family(target)
+        prober = self._prober(family, udp_port) if family else None
+        if prober is not None and len(sizes) == 1:
+            return {sizes[0]: await prober.probe_async(target, sizes[0], timeout, get_rate_limiter())}
+        if prober is not None:
+            return await prober.probe_many_async(target, sizes, timeout, get_rate_limiter())
+        if udp_port is not None:
+            return {size: _udp_unavailable(target) for size in sizes}
+        
+        # Without a socket, ping runs in subprocesses from the executor
+        import asyncio
+        
+        return await asyncio.get_running_loop().run_in_executor(None, ping_sizes, target, sizes, True, timeout)
+    
+    def _prober(self, family: int, udp_port: Optional[int]) -> Optional[ICMPProber]:
+        key = (udp_port, family)
+        if key not in self._probers:
+            prober = UDPProber(udp_port, family) if udp_port is not None else ICMPProber(family)
+            self._probers[key] = prober if prober.open() else False
+        return self._probers[key] or None
+    
+    async def _shutdown(self):
+        import asyncio
+        
+        current = asyncio.current_task()
+        tasks = [task for task in asyncio.all_tasks() if task is not current]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        for prober in self._probers.values():
+            if prober:
+                prober.close()
+        self._probers.clear()
+
+def _udp_unavailable(target: str) -> ProbeResult:
+    return ProbeResult(Outcome.FAILED, error=f'UDP probing is not available for {target}')
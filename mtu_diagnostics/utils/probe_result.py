@@ -0,0 +1,143 @@
+import enum
+import math
+from array import array
+from typing import Dict, Iterable, Iterator, List, Optional, Any
+
+class Outcome(enum.Enum):
+    OK = 'ok'
+    # Frag-Needed / Packet Too Big, or rejected locally for its size
+    MTU_EXCEEDED = 'mtu_exceeded'
+    # Timed out: dropped for its size or simply lost
+    FAILED = 'failed'
+    UNREACHABLE = 'unreachable'
+
+OUTCOMES = list(Outcome)
+_CODES = {outcome: code for code, outcome in enumerate(OUTCOMES)}
+
+# One probe of one size. Slots rather than a dataclass(slots=True), which
+# needs Python 3.10. `size` is the whole packet once ProbeMemo records it
+# (probers only know the payload). The raw output of a ping subprocess is
+# kept only when debugging, see network.set_keep_output.
+class ProbeResult:
+    __slots__ = ('outcome', 'rtt', 'next_hop_mtu', 'size', 'attempts', 'confidence', 'error', 'output')
+    
+    def __init__(self, outcome: Outcome, rtt: Optional[float] = None, next_hop_mtu: Optional[int] = None,
+                 size: Optional[int] = None, attempts: int = 1, confidence: float = 1.0,
+                 error: Optional[str] = None, output: Optional[Dict[str, Any]] = None):
+        self.outcome = outcome
+        self.rtt = rtt if outcome is Outcome.OK else None
+        self.next_hop_mtu = next_hop_mtu if outcome is Outcome.MTU_EXCEEDED else None
+        self.size = size
+        self.attempts = attempts
+        self.confidence = confidence
+        self.error = error
+        self.output = output
+    
+    @property
+    def success(self) -> bool:
+        return self.outcome is Outcome.OK
+    
+    @property
+    def reason(self) -> str:
+        return self.outcome.value
+    
+    def to_dict(self) -> Dict[str, Any]:
+        result = {
+            'mtu_size': self.size,
+            'success': self.success,
+            'reason': self.reason,
+            'attempts': self.attempts,
+            'confidence': self.confidence
+        }
+        if self.rtt is not None:
+            result['rtt'] = round(self.rtt, 6)
+        if self.next_hop_mtu:
+            result['next_hop_mtu'] = self.next_hop_mtu
+        if self.error:
+            result['error'] = self.error
+        if self.output is not None:
+            result['output'] = self.output
+        return result
+    
+    def __repr__(self) -> str:
+        return (f'ProbeResult(size={self.size}, outcome={self.outcome.name}, rtt={self.rtt}, '
+                f'next_hop_mtu={self.next_hop_mtu}, attempts={self.attempts})')
+
+# The probes of one target, one entry per size, in parallel arrays: about 30
+# bytes a probe instead of a dict each. Errors and raw output are rare and
+# live in a side table. ProbeResult records are built on access; putting a
+# size again replaces its entry in place. A target sees a few dozen sizes at
+# most, so sizes are found by a linear scan of the array rather than an index.
+class ProbeSeries:
+    __slots__ = ('sizes', 'outcomes', 'rtts', 'next_hop_mtus', 'attempts', 'confidences', '_extra')
+    
+    def __init__(self, results: Iterable[ProbeResult] = ()):
+        self.sizes = array('I')
+        self.outcomes = array('B')
+        # NaN and 0 stand for no RTT and no next-hop MTU
+        self.rtts = array('d')
+        self.next_hop_mtus = array('I')
+        self.attempts = array('I')
+        self.confidences = array('d')
+        self._extra = {}
+        for result in results:
+            self.put(result)
+    
+    def __len__(self) -> int:
+        return len(self.sizes)
+    
+    def __contains__(self, size: int) -> bool:
+        return self._find(size) is not None
+    
+    def __iter__(self) -> Iterator[ProbeResult]:
+        for i in range(len(self.sizes)):
+            yield self._record(i)
+    
+    def get(self, size: int) -> Optional[ProbeResult]:
+        i = self._find(size)
+        return None if i is None else self._record(i)
+    
+    def put(self, result: ProbeResult):
+        rtt = math.nan if result.rtt is None else result.rtt
+        i = self._find(result.size)
+        if i is None:
+            self.sizes.append(result.size)
+            self.outcomes.append(_CODES[result.outcome])
+            self.rtts.append(rtt)
+            self.next_hop_mtus.append(result.next_hop_mtu or 0)
+            self.attempts.append(result.attempts)
+            self.confidences.append(result.confidence)
+            i = len(self.sizes) - 1
+        else:
+            self.outcomes[i] = _CODES[result.outcome]
+            self.rtts[i] = rtt
+            self.next_hop_mtus[i] = result.next_hop_mtu or 0
+            self.attempts[i] = result.attempts
+            self.confidences[i] = result.confidence
+        
+        if result.error or result.output is not None:
+            self._extra[i] = (result.error, result.output)
+        else:
+            self._extra.pop(i, None)
+    
+    def set_confidence(self, size: int, confidence: float):
+        self.confidences[self.sizes.index(size)] = confidence
+    
+    def outcome(self, size: int) -> Outcome:
+        return OUTCOMES[self.outcomes[self.sizes.index(size)]]
+    
+    def to_list(self) -> List[Dict[str, Any]]:
+        return [result.to_dict() for result in self]
+    
+    def _find(self, size: int) -> Optional[int]:
+        try:
+            return self.sizes.index(size)
+        except ValueError:
+            return None
+    
+    def _record(self, i: int) -> ProbeResult:
+        rtt = self.rtts[i]
+        error, output = self._extra.get(i, (None, None))
+        return ProbeResult(OUTCOMES[self.outcomes[i]], None if math.isnan(rtt) else rtt,
+                           self.next_hop_mtus[i] or None, self.sizes[i], self.attempts[i],
+                           self.confidences[i], error, output)
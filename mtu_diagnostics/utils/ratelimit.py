@@ -0,0 +1,107 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Optional, Any
+
+# Token bucket in its virtual scheduling form (GCRA): `reserve` books the next
+# send slot and returns how long to wait for it, so callers can sleep however
+# suits them (time.sleep or asyncio.sleep) and slots are never handed out twice.
+class TokenBucket:
+    def __init__(self, rate: float, burst: int = 1):
+        self.rate = rate
+        self.burst = max(1, burst)
+        self._interval = 1 / rate if rate > 0 else 0
+        self._tolerance = (self.burst - 1) * self._interval
+        self._tat = 0.0
+    
+    def reserve(self, now: float) -> float:
+        if self._interval == 0:
+            return 0.0
+        tat = max(self._tat, now)
+        self._tat = tat + self._interval
+        return max(0.0, tat - self._tolerance - now)
+    
+    def idle(self, now: float) -> bool:
+        # A bucket with its full burst available holds no state worth keeping
+        return self._tat <= now
+
+# ICMP errors and echo replies are rate limited by hosts and routers
+# (net.ipv4.icmp_ratelimit, icmp_msgs_per_sec, CoPP), and a suppressed reply
+# looks exactly like a drop. Every probe books a slot in a global bucket and
+# in its destination's bucket and waits for the later of the two. A rate of
+# 0 disables that bucket. The per-destination default sits above routers'
+# Frag-Needed rate on purpose, see "Probe Rate Limits" in the README.
+class ProbeRateLimiter:
+    def __init__(self, rate: float = 1000, burst: int = 50,
+                 per_destination_rate: float = 100, per_destination_burst: int = 20,
+                 max_destinations: int = 10000):
+        self.rate = rate
+        self.burst = burst
+        self.per_destination_rate = per_destination_rate
+        self.per_destination_burst = per_destination_burst
+        self.max_destinations = max_destinations
+        self.probes = 0
+        self.delayed = 0
+        self.wait_time = 0.0
+        self.max_wait = 0.0
+        self._global = TokenBucket(rate, burst)
+        self._destinations = OrderedDict()
+        self._lock = threading.Lock()
+    
+    def reserve(self, destination: str) -> float:
+        now = time.monotonic()
+        with self._lock:
+            delay = self._global.reserve(now)
+            if self.per_destination_rate > 0:
+                delay = max(delay, self._bucket(destination, now).reserve(now))
+            
+            self.probes += 1
+            if delay > 0:
+                self.delayed += 1
+                self.wait_time += delay
+                self.max_wait = max(self.max_wait, delay)
+        return delay
+    
+    def wait(self, destination: str):
+        delay = self.reserve(destination)
+        if delay > 0:
+            time.sleep(delay)
+    
+    async def wait_async(self, destination: str):
+        import asyncio
+        
+        delay = self.reserve(destination)
+        if delay > 0:
+            await asyncio.sleep(delay)
+    
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'probes': self.probes,
+            'delayed': self.delayed,
+            'wait_time': round(self.wait_time, 6),
+            'max_wait': round(self.max_wait, 6)
+        }
+    
+    def _bucket(self, destination: str, now: float) -> TokenBucket:
+        bucket = self._destinations.get(destination)
+        if bucket is None:
+            if len(self._destinations) >= self.max_destinations:
+                # Oldest first; a bucket still paying off a burst is kept
+                oldest, oldest_bucket = next(iter(self._destinations.items()))
+                if oldest_bucket.idle(now):
+                    del self._destinations[oldest]
+            bucket = self._destinations[destination] = TokenBucket(self.per_destination_rate,
+                                                                   self.per_destination_burst)
+        else:
+            self._destinations.move_to_end(destination)
+        return bucket
+
+_rate_limiter = ProbeRateLimiter()
+
+def get_rate_limiter() -> Optional[ProbeRateLimiter]:
+    return _rate_limiter
+
+def set_rate_limiter(limiter: Optional[ProbeRateLimiter]):
+    # Shared by every probe in the process; None turns pacing off
+    global _rate_limiter
+    _rate_limiter = limiter
@@ -0,0 +1,127 @@
+import socket
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Dict, Iterable, List, Optional
+
+# getaddrinfo() does not expose record TTLs, so answers are kept for a fixed
+# time. Failed lookups are cached for a shorter negative TTL.
+class Resolver:
+    def __init__(self, ttl: float = 300, negative_ttl: float = 30,
+                 max_entries: int = 10000, max_workers: int = 32):
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.max_entries = max_entries
+        self.max_workers = max_workers
+        self.hits = 0
+        self.misses = 0
+        self._cache = OrderedDict()
+        self._inflight = {}
+        self._lock = threading.Lock()
+        self._executor = None
+    
+    def resolve(self, hostname: str, family: str = 'any') -> Optional[str]:
+        return self._pick(self.resolve_all(hostname), family)
+    
+    def resolve_all(self, hostname: str) -> Dict[str, List[str]]:
+        return self._lookup(hostname).result()
+    
+    def resolve_many(self, hostnames: Iterable[str]) -> Dict[str, Dict[str, List[str]]]:
+        futures = {hostname: self._lookup(hostname, background=True) for hostname in hostnames}
+        return {hostname: future.result() for hostname, future in futures.items()}
+    
+    async def aresolve(self, hostname: str, family: str = 'any') -> Optional[str]:
+        return self._pick(await self.aresolve_all(hostname), family)
+    
+    async def aresolve_all(self, hostname: str) -> Dict[str, List[str]]:
+        import asyncio
+        
+        return await asyncio.wrap_future(self._lookup(hostname, background=True))
+    
+    def clear(self):
+        with self._lock:
+            self._cache.clear()
+    
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
+    
+    def stats(self) -> Dict[str, int]:
+        return {
+            'entries': len(self._cache),
+            'hits': self.hits,
+            'misses': self.misses,
+            'inflight': len(self._inflight)
+        }
+    
+    def _lookup(self, hostname: str, background: bool = False) -> Future:
+        now = time.monotonic()
+        
+        with self._lock:
+            entry = self._cache.get(hostname)
+            if entry is not None and entry[0] > now:
+                self._cache.move_to_end(hostname)
+                self.hits += 1
+                future = Future()
+                future.set_result(entry[1])
+                return future
+            
+            # Coalesce with a lookup for the same name already in flight
+            future = self._inflight.get(hostname)
+            if future is not None:
+                self.hits += 1
+                return future
+            
+            self.misses += 1
+            future = Future()
+            self._inflight[hostname] = future
+        
+        if background:
+            self._get_executor().submit(self._run, hostname, future)
+        else:
+            self._run(hostname, future)
+        return future
+    
+    def _run(self, hostname: str, future: Future):
+        addresses = self._getaddrinfo(hostname)
+        found = addresses['ipv4'] or addresses['ipv6']
+        expires = time.monotonic() + (self.ttl if found else self.negative_ttl)
+        
+        with self._lock:
+            self._cache[hostname] = (expires, addresses)
+            self._cache.move_to_end(hostname)
+            while len(self._cache) > self.max_entries:
+                self._cache.popitem(last=False)
+            self._inflight.pop(hostname, None)
+        
+        future.set_result(addresses)
+    
+    def _getaddrinfo(self, hostname: str) -> Dict[str, List[str]]:
+        addresses = {'ipv4': [], 'ipv6': []}
+        try:
+            infos = socket.getaddrinfo(hostname, None, 0, socket.SOCK_DGRAM)
+        except (socket.gaierror, UnicodeError, OSError):
+            return addresses
+        
+        for family, _, _, _, sockaddr in infos:
+            key = 'ipv4' if family == socket.AF_INET else 'ipv6' if family == socket.AF_INET6 else None
+            if key and sockaddr[0] not in addresses[key]:
+                addresses[key].append(sockaddr[0])
+        return addresses
+    
+    def _get_executor(self) -> ThreadPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.max_workers,
+                                                    thread_name_prefix='mtu-resolver')
+            return self._executor
+    
+    def _pick(self, addresses: Dict[str, List[str]], family: str) -> Optional[str]:
+        # 'any' prefers IPv4 and falls back to IPv6 for IPv6-only names
+        if family == 'any':
+            candidates = addresses['ipv4'] + addresses['ipv6']
+        else:
+            candidates = addresses.get(family, [])
+        return candidates[0] if candidates else None
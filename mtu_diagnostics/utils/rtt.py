@@ -0,0 +1,80 @@
+import threading
+from typing import Callable, Dict, Optional, Any
+
+# Jacobson/Karels smoothing as in RFC 6298
+ALPHA = 1 / 8
+BETA = 1 / 4
+K = 4
+
+class RTTEstimator:
+    def __init__(self):
+        self.srtt = None
+        self.rttvar = None
+        self.samples = 0
+    
+    def update(self, rtt: float):
+        if self.srtt is None:
+            self.srtt = rtt
+            self.rttvar = rtt / 2
+        else:
+            self.rttvar = (1 - BETA) * self.rttvar + BETA * abs(self.srtt - rtt)
+            self.srtt = (1 - ALPHA) * self.srtt + ALPHA * rtt
+        self.samples += 1
+    
+    def rto(self) -> Optional[float]:
+        if self.srtt is None:
+            return None
+        return self.srtt + K * self.rttvar
+
+# Per-target estimators turning measured RTTs into probe timeouts. Until a
+# target has a sample, and whenever adaptive timeouts are off, the caller's
+# fixed timeout is used as is. An observer, if set, sees every sample.
+class RTTTracker:
+    def __init__(self, min_timeout: float = 0.02, max_timeout: Optional[float] = None,
+                 adaptive: bool = True, max_targets: int = 10000,
+                 observer: Optional[Callable[[float], None]] = None):
+        self.min_timeout = min_timeout
+        self.max_timeout = max_timeout
+        self.adaptive = adaptive
+        self.max_targets = max_targets
+        self.observer = observer
+        self._estimators = {}
+        self._lock = threading.Lock()
+    
+    def sample(self, ip: str, rtt: Optional[float]):
+        if rtt is None:
+            return
+        if self.observer is not None:
+            self.observer(rtt)
+        if not self.adaptive:
+            return
+        with self._lock:
+            estimator = self._estimators.get(ip)
+            if estimator is None:
+                if len(self._estimators) >= self.max_targets:
+                    self._estimators.pop(next(iter(self._estimators)))
+                estimator = self._estimators[ip] = RTTEstimator()
+            estimator.update(rtt)
+    
+    def has_estimate(self, ip: str) -> bool:
+        return ip in self._estimators
+    
+    def timeout(self, ip: str, timeout: float) -> float:
+        # The caller's timeout is the ceiling for the adaptive one
+        ceiling = timeout if self.max_timeout is None else min(timeout, self.max_timeout)
+        estimator = self._estimators.get(ip) if self.adaptive else None
+        rto = estimator.rto() if estimator else None
+        if rto is None:
+            return ceiling
+        return min(ceiling, max(self.min_timeout, rto))
+    
+    def stats(self, ip: str, timeout: float) -> Optional[Dict[str, Any]]:
+        estimator = self._estimators.get(ip)
+        if estimator is None or estimator.srtt is None:
+            return None
+        return {
+            'srtt': round(estimator.srtt, 6),
+            'rttvar': round(estimator.rttvar, 6),
+            'samples': estimator.samples,
+            'timeout': round(self.timeout(ip, timeout), 6)
+        }
@@ -0,0 +1,115 @@
+import os
+import socket
+import struct
+import sys
+import threading
+from typing import Dict, Optional, Any, Tuple
+from .icmp import ICMPProber, set_pmtu_discovery
+
+# Packetization layer PMTU discovery (RFC 4821 / RFC 8899) over UDP: a probe
+# is a DF datagram padded to the size under test, and a cooperating responder
+# acknowledges it with a small datagram carrying the size it received. Only
+# the forward path has to carry the large packet.
+DEFAULT_PORT = 4821
+
+MAGIC = b'MTUd'
+VERSION = 1
+TYPE_PROBE = 1
+TYPE_ACK = 2
+
+# magic, version, type, received length (acks only), token, sequence
+HEADER = struct.Struct('!4sBBHII')
+
+def build_probe(token: int, seq: int, size: int) -> bytes:
+    header = HEADER.pack(MAGIC, VERSION, TYPE_PROBE, 0, token, seq)
+    return header + b'\x00' * max(0, size - HEADER.size)
+
+def build_ack(probe: bytes) -> Optional[bytes]:
+    # The ack is never larger than the probe, so a responder cannot be used
+    # to amplify traffic
+    parsed = parse_header(probe)
+    if parsed is None or parsed[0] != TYPE_PROBE:
+        return None
+    _, _, token, seq = parsed
+    return HEADER.pack(MAGIC, VERSION, TYPE_ACK, min(len(probe), 0xffff), token, seq)
+
+def parse_header(data: bytes) -> Optional[Tuple[int, int, int, int]]:
+    # Returns (type, length, token, seq)
+    if len(data) < HEADER.size:
+        return None
+    magic, version, msg_type, length, token, seq = HEADER.unpack_from(data)
+    if magic != MAGIC or version != VERSION:
+        return None
+    return msg_type, length, token, seq
+
+# Same probing machinery as ICMPProber, with padded UDP datagrams to a
+# responder instead of echo requests. Sizes are UDP payload sizes, so the IP
+# packet is payload + 28 bytes (48 over IPv6) exactly as for ICMP.
+class UDPProber(ICMPProber):
+    # A responder on a wildcard address may answer from another of its
+    # addresses; the random token already identifies our acks
+    check_source = False
+    
+    def __init__(self, port: int = DEFAULT_PORT, family: int = socket.AF_INET):
+        super().__init__(family)
+        self.port = port
+        # Acks echo the token, so stray or spoofed datagrams are ignored
+        self.token = int.from_bytes(os.urandom(4), 'big')
+    
+    def open(self) -> bool:
+        if self.sock is not None:
+            return True
+        if not sys.platform.startswith('linux'):
+            return False
+        
+        try:
+            sock = socket.socket(self.family, socket.SOCK_DGRAM)
+        except OSError:
+            return False
+        try:
+            set_pmtu_discovery(sock, self.family)
+        except OSError:
+            sock.close()
+            return False
+        sock.setblocking(False)
+        self.sock = sock
+        return True
+    
+    def _destination(self, ip: str) -> Tuple[str, int]:
+        return (ip, self.port)
+    
+    def _build_probe(self, seq: int, size: int) -> bytes:
+        return build_probe(self.token, seq, size)
+    
+    def _parse(self, data: bytes) -> Optional[Tuple[str, int, Optional[int]]]:
+        parsed = parse_header(data)
+        if parsed is None:
+            return None
+        msg_type, _, token, seq = parsed
+        if msg_type != TYPE_ACK or token != self.token:
+            return None
+        return ('ok', seq, None)
+    
+    def _error_seq(self, data: bytes) -> Optional[int]:
+        # The payload is the start of the datagram that failed
+        parsed = parse_header(data)
+        if parsed is None or parsed[2] != self.token:
+            return None
+        return parsed[3]
+
+_local = threading.local()
+
+def udp_thread_probers() -> Dict[Tuple[int, int], Any]:
+    # The calling thread's probers by (port, family), like icmp_thread_probers
+    probers = getattr(_local, 'probers', None)
+    if probers is None:
+        probers = _local.probers = {}
+    return probers
+
+def get_udp_prober(port: int = DEFAULT_PORT, family: int = socket.AF_INET) -> Optional[UDPProber]:
+    # One prober per thread, port and family, like get_icmp_prober
+    probers = udp_thread_probers()
+    if (port, family) not in probers:
+        prober = UDPProber(port, family)
+        probers[(port, family)] = prober if prober.open() else False
+    return probers[(port, family)] or None
@@ -0,0 +1,48 @@
+import pytest
+from mtu_diagnostics.core.probe_plan import ProbeMemo
+from mtu_diagnostics.utils.probe_result import Outcome, ProbeResult
+
+class FakePath:
+    # Stands in for the network behind ProbeMemo._send and _send_async: sizes
+    # up to `mtu` are answered, larger ones get Frag-Needed (or vanish when
+    # `ptb` is off, or once `ptb_limit` errors have been sent, as a router's
+    # ICMP rate limit would). `lose` maps a size to how many of its first
+    # sends are lost; a silent path answers nothing.
+    def __init__(self, mtu=1500, ptb=True, silent=False, rtt=0.001):
+        self.mtu = mtu
+        self.ptb = ptb
+        self.silent = silent
+        self.rtt = rtt
+        self.ptb_limit = None
+        self.lose = {}
+        self.batches = []
+    
+    def send(self, memo, ip, sizes, timeout):
+        self.batches.append(list(sizes))
+        memo.sent += len(sizes)
+        replies = {}
+        for size in sizes:
+            if self.silent or self.lose.get(size, 0) > 0:
+                self.lose[size] = max(0, self.lose.get(size, 0) - 1)
+                replies[size] = ProbeResult(Outcome.FAILED)
+            elif size <= self.mtu:
+                replies[size] = ProbeResult(Outcome.OK, rtt=self.rtt)
+                if memo.rtt:
+                    memo.rtt.sample(ip, self.rtt)
+            elif self.ptb and self.ptb_limit != 0:
+                replies[size] = ProbeResult(Outcome.MTU_EXCEEDED, next_hop_mtu=self.mtu)
+                if self.ptb_limit is not None:
+                    self.ptb_limit -= 1
+            else:
+                replies[size] = ProbeResult(Outcome.FAILED)
+        return replies
+
+@pytest.fixture
+def fake_path(monkeypatch):
+    path = FakePath()
+    async def send_async(memo, ip, sizes, timeout):
+        return path.send(memo, ip, sizes, timeout)
+    
+    monkeypatch.setattr(ProbeMemo, '_send', lambda memo, ip, sizes, timeout: path.send(memo, ip, sizes, timeout))
+    monkeypatch.setattr(ProbeMemo, '_send_async', send_async)
+    return path
@@ -0,0 +1,23 @@
+import pytest
+from mtu_diagnostics.diagnostics.analyzer import DiagnosticAnalyzer
+
+def tcp_result(ip, mss, mss_mtu, **extra):
+    return {'success': True, 'ip': ip, 'port': 443, 'mss': mss, 'mss_mtu': mss_mtu, **extra}
+
+@pytest.mark.parametrize('ip,mss,mss_mtu,clamp', [
+    ('192.0.2.1', 1460, 1500, 1360),
+    ('2001:db8::1', 1440, 1500, 1340),
+])
+def test_mss_clamp_follows_the_address_family(ip, mss, mss_mtu, clamp):
+    analyzer = DiagnosticAnalyzer()
+    
+    exceeds, = analyzer._analyze_tcp(tcp_result(ip, mss, mss_mtu), 1400)
+    assert exceeds.issue == 'mss_exceeds_path'
+    assert exceeds.recommendation == f'Clamp TCP MSS to {clamp} for this path'
+    
+    stalled, = analyzer._analyze_tcp(tcp_result(ip, mss, mss_mtu, push={'stalled': True}), 1400)
+    assert stalled.recommendation.startswith(f'Clamp TCP MSS to {clamp} on the path')
+    
+    clamped, = analyzer._analyze_tcp(tcp_result(ip, mss - 200, mss_mtu - 200), 1400)
+    assert clamped.issue == 'mss_clamp'
+    assert clamped.recommendation == f'Raise the MSS clamp to {clamp} to use full-sized segments'
@@ -0,0 +1,43 @@
+import time
+from types import SimpleNamespace
+from mtu_diagnostics.core.batch import BatchRunner, read_targets
+
+class SlowDetector:
+    def __init__(self, delay):
+        self.delay = delay
+    
+    def detect_path_mtu(self, target, **options):
+        time.sleep(self.delay)
+        return {'success': True, 'target': target, 'path_mtu': 1500,
+                'interface': {'name': 'eth0', 'mtu': 1500}}
+
+def test_read_targets_skips_comments_and_blank_lines():
+    lines = ['10.0.0.1\n', '\n', '# comment\n', 'example.com  # inline\n']
+    assert list(read_targets(lines)) == ['10.0.0.1', 'example.com']
+
+def test_every_target_gets_a_record():
+    runner = BatchRunner(SlowDetector(0), concurrency=4)
+    records = list(runner.run(f'10.0.0.{i}' for i in range(10)))
+    
+    summary = records.pop()
+    assert sorted(record['target'] for record in records) == sorted(f'10.0.0.{i}' for i in range(10))
+    assert all(record['success'] and record['interface'] == 'eth0' for record in records)
+    assert summary['targets'] == 10 and summary['succeeded'] == 10
+
+def test_targets_after_abandoned_ones_are_still_checked():
+    # Every target outlives its deadline, so abandoned futures fill both
+    # slots; the rest must wait for a slot rather than be dropped
+    runner = BatchRunner(SlowDetector(0.3), concurrency=2, deadline=0.1)
+    records = list(runner.run(f'10.0.0.{i}' for i in range(6)))
+    
+    summary = records.pop()
+    assert len(records) == 6
+    assert all(not record['success'] and 'Deadline' in record['error'] for record in records)
+    assert summary['targets'] == 6 and summary['deadline_exceeded'] == 6
+
+def test_a_raising_check_is_reported_as_failed():
+    detector = SimpleNamespace(detect_path_mtu=lambda target, **options: 1 / 0)
+    records = list(BatchRunner(detector).run(['10.0.0.1']))
+    assert records[0] == {'target': '10.0.0.1', 'success': False, 'error': 'division by zero',
+                          'elapsed': records[0]['elapsed']}
+    assert records[1]['failed'] == 1
@@ -0,0 +1,42 @@
+from mtu_diagnostics.utils.cache import PathMTUCache
+
+RESULT = {'success': True, 'max_mtu': 1400, 'ip': '192.0.2.1'}
+
+def test_hit_miss_and_invalidation_counters(tmp_path):
+    cache = PathMTUCache(str(tmp_path))
+    assert cache.get('192.0.2.1', 'eth0', 1500) is None
+    cache.put('192.0.2.1', 'eth0', 1500, RESULT)
+    assert cache.get('192.0.2.1', 'eth0', 1500) == RESULT
+    assert cache.get('192.0.2.1', 'eth0', 1500) == RESULT
+    
+    # The egress interface MTU changed, the entry no longer applies
+    assert cache.get('192.0.2.1', 'eth0', 9000) is None
+    assert cache.get('192.0.2.1', 'eth0', 1500) is None
+    
+    stats = cache.stats()
+    assert (stats['hits'], stats['misses'], stats['invalidations']) == (2, 3, 1)
+    assert stats['entries'] == 0
+    cache.close()
+
+def test_expiry_and_eviction(tmp_path):
+    cache = PathMTUCache(str(tmp_path), max_entries=2)
+    cache.put('192.0.2.1', 'eth0', 1500, RESULT, ttl=-1)
+    assert cache.get('192.0.2.1', 'eth0', 1500) is None
+    
+    for last in range(2, 5):
+        cache.put(f'192.0.2.{last}', 'eth0', 1500, RESULT)
+    
+    stats = cache.stats()
+    assert (stats['expirations'], stats['evictions'], stats['entries']) == (1, 1, 2)
+    assert cache.get('192.0.2.2', 'eth0', 1500) is None
+    assert cache.get('192.0.2.4', 'eth0', 1500) == RESULT
+    cache.close()
+
+def test_counter_failure_keeps_the_hit(tmp_path):
+    cache = PathMTUCache(str(tmp_path))
+    cache.put('192.0.2.1', 'eth0', 1500, RESULT)
+    with cache._connect() as db:
+        db.execute('DROP TABLE stats')
+    
+    assert cache.get('192.0.2.1', 'eth0', 1500) == RESULT
+    cache.close()
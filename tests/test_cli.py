@@ -0,0 +1,66 @@
+import json
+import click
+from click.testing import CliRunner
+import cli
+from mtu_diagnostics.core.detector import MTUDetector
+from mtu_diagnostics.diagnostics.reporter import MTUReporter
+from mtu_diagnostics.utils import ratelimit
+
+def run(monkeypatch, *args):
+    # The command replaces the process-wide rate limiter, put it back after
+    monkeypatch.setattr(ratelimit, '_rate_limiter', ratelimit.get_rate_limiter())
+    monkeypatch.delenv('MTU_DIAG_SERVER', raising=False)
+    return CliRunner().invoke(cli.main, ['--rate', '0', '--target-rate', '0', *args])
+
+def test_ndjson_events_stream_to_stdout(fake_path, monkeypatch):
+    result = run(monkeypatch, 'test', '127.0.0.1', '--no-cache', '--format', 'ndjson')
+    
+    assert result.exit_code == 0, result.output
+    records = [json.loads(line) for line in result.stdout.splitlines()]
+    probes = [record for record in records if record.get('event') == 'probe']
+    assert len(probes) == sum(len(batch) for batch in fake_path.batches)
+    assert {probe['reason'] for probe in probes} == {'ok', 'mtu_exceeded'}
+    # The result comes last, after every probe
+    assert records[-1]['event'] == 'result' and records[-1]['path_mtu'] == 1500
+    assert result.stderr == ''
+
+def test_text_progress_goes_to_stderr(fake_path, monkeypatch):
+    result = run(monkeypatch, 'test', '127.0.0.1', '--no-cache')
+    
+    assert result.exit_code == 0, result.output
+    progress = result.stderr.splitlines()
+    assert progress and all(line.startswith(('✓ 127.0.0.1 ', '✗ 127.0.0.1 ')) for line in progress)
+    assert '✓ 127.0.0.1 1500: ok (1.00 ms)' in progress
+    assert '✓ 127.0.0.1 1500' not in result.stdout
+
+def test_json_output_has_no_progress():
+    assert cli.progress_printer(MTUReporter('json')) is None
+
+def test_closed_reader_stops_probing(fake_path, monkeypatch, tmp_path):
+    # The stream the reader closed is pointed at /dev/null afterwards
+    stdout = open(tmp_path / 'stdout', 'w')
+    monkeypatch.setattr(cli.sys, 'stdout', stdout)
+    
+    def echo(line, err=False):
+        raise BrokenPipeError()
+    
+    monkeypatch.setattr(click, 'echo', echo)
+    on_event = cli.progress_printer(MTUReporter('ndjson'))
+    result = MTUDetector().detect_path_mtu('127.0.0.1', on_event=on_event)
+    
+    assert result['stopped'] and not result['success']
+    assert len(fake_path.batches) == 1
+    stdout.write('discarded')
+    stdout.close()
+    assert (tmp_path / 'stdout').read_text() == ''
+
+def test_format_event_lines():
+    text = MTUReporter('text')
+    probe = {'event': 'probe', 'ip': '192.0.2.1', 'mtu_size': 1500, 'success': False,
+             'reason': 'failed', 'attempts': 3, 'confidence': 0.95, 'rtt': None}
+    assert text.format_event(probe) == '✗ 192.0.2.1 1500: failed (attempt 3, 95.00% confidence)'
+    assert text.format_event({'event': 'phase', 'phase': 'path_mtu', 'result': {}}) == 'Path MTU search finished'
+    
+    ndjson = MTUReporter('ndjson')
+    assert json.loads(ndjson.format_event(probe)) == probe
+    assert '\n' not in ndjson.format_event(probe)
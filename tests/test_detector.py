@@ -0,0 +1,72 @@
+import socket
+import struct
+import pytest
+from mtu_diagnostics.core import detector as detector_module
+from mtu_diagnostics.core.detector import MTUDetector
+from mtu_diagnostics.utils import netlink
+from mtu_diagnostics.utils.icmp import icmp_thread_probers
+from mtu_diagnostics.utils.udp import udp_thread_probers
+
+class FakeProber:
+    def __init__(self):
+        self.closed = False
+    
+    def close(self):
+        self.closed = True
+
+def test_dual_stack_closes_worker_probers(monkeypatch):
+    # Each family runs in a short-lived thread, whose probers must not
+    # outlive it
+    opened = []
+    
+    def detect_path_mtu(self, ip, **options):
+        family = socket.AF_INET6 if ':' in ip else socket.AF_INET
+        icmp, udp = FakeProber(), FakeProber()
+        icmp_thread_probers()[family] = icmp
+        udp_thread_probers()[(4821, family)] = udp
+        opened.extend([icmp, udp])
+        return {'success': True, 'target_ip': ip}
+    
+    detector = MTUDetector()
+    monkeypatch.setattr(MTUDetector, 'detect_path_mtu', detect_path_mtu)
+    monkeypatch.setattr(detector.resolver, 'resolve_all',
+                        lambda target: {'ipv4': ['192.0.2.1'], 'ipv6': ['2001:db8::1']})
+    
+    for _ in range(3):
+        result = detector.detect_dual_stack('example.test')
+        assert result['ipv4']['target_ip'] == '192.0.2.1'
+        assert result['ipv6']['target_ip'] == '2001:db8::1'
+    
+    assert len(opened) == 12
+    assert all(prober.closed for prober in opened)
+    detector.close()
+
+def route_message(mtu, expires):
+    # An RTM_NEWROUTE body as `ip route get` receives it
+    metrics = netlink._rtattr(netlink.RTAX_MTU, struct.pack('=I', mtu))
+    cacheinfo = struct.pack('=IIiIIIII', 0, 0, expires, 0, 0, 0, 0, 0)
+    return (netlink.RTMSG.pack(socket.AF_INET, 32, 0, 0, 254, 0, 0, netlink.RTN_UNICAST, 0x200)
+            + netlink._rtattr(netlink.RTA_METRICS, metrics)
+            + netlink._rtattr(netlink.RTA_CACHEINFO, cacheinfo))
+
+def test_route_expiry_is_parsed():
+    assert netlink._parse_route(route_message(1280, 44600))['expires'] == 446.0
+    assert netlink._parse_route(route_message(1400, 0))['expires'] == 0
+
+@pytest.mark.parametrize('route_mtu, expires, source', [
+    (1280, 446.0, 'pmtu_exception'),
+    # `mtu lock 1400` is configured, not learned from the path
+    (1400, 0, 'route'),
+    (1500, None, 'interface')
+])
+def test_only_expiring_routes_are_pmtu_exceptions(monkeypatch, route_mtu, expires, source):
+    detector = MTUDetector()
+    monkeypatch.setattr(detector_module, 'get_route_info', lambda ip: (route_mtu, '192.0.2.100'))
+    monkeypatch.setattr(detector.interface_manager, 'get_interface_by_ip', lambda ip: None)
+    monkeypatch.setattr(detector.interface_manager, 'get_route',
+                        lambda ip: {'mtu': route_mtu, 'expires': expires})
+    
+    cached = detector._kernel_cached_mtu('192.0.2.1', {'name': 'eth0', 'mtu': 1500})
+    assert cached['source'] == source
+    assert cached['mtu'] == route_mtu
+    detector.close()
@@ -0,0 +1,69 @@
+import asyncio
+import socket
+import struct
+import pytest
+from mtu_diagnostics.utils.icmp import ICMP_ECHO_REQUEST, ICMPProber
+from mtu_diagnostics.utils.probe_result import Outcome
+
+@pytest.fixture(params=[(socket.AF_INET, '127.0.0.1'), (socket.AF_INET6, '::1')], ids=['ipv4', 'ipv6'])
+def prober(request):
+    # Needs a raw socket or unprivileged ping sockets (net.ipv4.ping_group_range)
+    family, address = request.param
+    prober = ICMPProber(family)
+    if not prober.open():
+        pytest.skip('no ICMP socket available')
+    yield prober, address
+    prober.close()
+
+def test_echo_over_loopback(prober):
+    prober, address = prober
+    result = prober.probe(address, 100, timeout=2)
+    assert result.outcome is Outcome.OK and result.rtt > 0
+
+def test_probe_many_keeps_sizes(prober):
+    prober, address = prober
+    results = prober.probe_many(address, [100, 1000, 8000], timeout=2)
+    assert list(results) == [100, 1000, 8000]
+    assert all(result.success for result in results.values())
+
+def test_oversized_payload_is_rejected_locally():
+    prober = ICMPProber(socket.AF_INET)
+    if not prober.open():
+        pytest.skip('no ICMP socket available')
+    try:
+        # 65508 bytes of payload need more than an IPv4 packet can hold
+        result = prober.probe('127.0.0.1', 65508, timeout=2)
+        assert result.outcome is Outcome.MTU_EXCEEDED and result.next_hop_mtu == 65535
+        assert prober.probe('127.0.0.1', 65507, timeout=2).success
+    finally:
+        prober.close()
+
+def test_concurrent_probes_share_one_socket(prober):
+    # Each reply goes to the probe waiting for its sequence number
+    prober, address = prober
+    sizes = list(range(100, 4100, 200))
+    
+    async def probe_all():
+        try:
+            return await asyncio.gather(*(prober.probe_async(address, size, 2) for size in sizes))
+        finally:
+            prober._detach()
+    
+    results = asyncio.run(probe_all())
+    assert all(result.success for result in results)
+    assert not prober._waiters
+
+def test_error_payload_sequence_with_and_without_ip_header():
+    prober = ICMPProber(socket.AF_INET)
+    prober.raw = True
+    request = struct.pack('!BBHHH', ICMP_ECHO_REQUEST, 0, 0, prober.ident, 7) + b'\x00' * 20
+    ip_header = bytes([0x46]) + b'\x00' * 23  # with 4 bytes of options
+    
+    assert prober._error_seq(request) == 7
+    assert prober._error_seq(ip_header + request) == 7
+    # Another socket's echo request, or an IP header with nothing after it
+    assert prober._error_seq(request[:4] + struct.pack('!HH', prober.ident ^ 1, 7)) is None
+    assert prober._error_seq(ip_header) is None
+    
+    prober.raw = False
+    assert prober._error_seq(struct.pack('!BBHHH', 0, 0, 0, 0, 9)) == 9
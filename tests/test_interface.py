@@ -0,0 +1,70 @@
+import socket
+from types import SimpleNamespace
+import pytest
+from mtu_diagnostics.core import interface
+from mtu_diagnostics.core.interface import InterfaceManager, InterfaceSnapshot
+
+# name: (ifindex, mtu, ARPHRD type, flags, operstate, DEVTYPE, wireless dir)
+DEVICES = {
+    'lo': (1, 65536, 772, '0x9', 'unknown', None, False),
+    'eth0': (2, 1500, 1, '0x1003', 'up', None, False),
+    'wlan0': (3, 1500, 1, '0x1003', 'dormant', None, True),
+    'br0': (4, 1500, 1, '0x1003', 'up', 'bridge', False),
+    'wg0': (5, 1420, 65534, '0x91', 'unknown', 'wireguard', False),
+    'ppp0': (6, 1492, 512, '0x10d1', 'up', None, False),
+    'tun0': (7, 1500, 65534, '0x10d0', 'unknown', None, False),
+}
+
+@pytest.fixture
+def sysfs(tmp_path, monkeypatch):
+    for name, (index, mtu, arphrd, flags, operstate, devtype, wireless) in DEVICES.items():
+        path = tmp_path / name
+        path.mkdir()
+        for attribute, value in (('ifindex', index), ('mtu', mtu), ('type', arphrd), ('flags', flags),
+                                 ('operstate', operstate), ('address', '02:00:00:00:00:%02x' % index)):
+            (path / attribute).write_text(f'{value}\n')
+        (path / 'uevent').write_text(f'INTERFACE={name}\nIFINDEX={index}\n' +
+                                     (f'DEVTYPE={devtype}\n' if devtype else ''))
+        if wireless:
+            (path / 'wireless').mkdir()
+    # A device that vanished between listing and reading
+    (tmp_path / 'veth9').mkdir()
+    
+    addrs = {
+        'lo': [SimpleNamespace(family=socket.AF_INET, address='127.0.0.1')],
+        'eth0': [SimpleNamespace(family=socket.AF_INET, address='192.0.2.5'),
+                 SimpleNamespace(family=socket.AF_INET6, address='2001:db8::5')],
+    }
+    monkeypatch.setattr(interface, 'SYSFS_NET', str(tmp_path))
+    monkeypatch.setattr(interface.psutil, 'net_if_addrs', lambda: addrs)
+    return tmp_path
+
+def test_snapshot_classifies_interfaces_from_sysfs(sysfs):
+    snapshot = InterfaceSnapshot.capture('linux')
+    
+    assert [iface.name for iface in snapshot.interfaces] == ['lo', 'eth0', 'wlan0', 'br0', 'wg0', 'ppp0', 'tun0']
+    assert {iface.name: iface.type for iface in snapshot.interfaces} == {
+        'lo': 'loopback', 'eth0': 'ethernet', 'wlan0': 'wireless', 'br0': 'bridge',
+        'wg0': 'tunnel', 'ppp0': 'ppp', 'tun0': 'tunnel'
+    }
+    # operstate "unknown" counts as up only with IFF_UP set
+    assert {iface.name: iface.is_up for iface in snapshot.interfaces} == {
+        'lo': True, 'eth0': True, 'wlan0': False, 'br0': True, 'wg0': True, 'ppp0': True, 'tun0': False
+    }
+    assert snapshot.by_name['wg0'].mtu == 1420
+    assert snapshot.by_name['eth0'].addresses == ['192.0.2.5', '2001:db8::5']
+
+def test_manager_looks_interfaces_up_by_index_and_address(sysfs):
+    manager = InterfaceManager()
+    manager.system = 'linux'
+    
+    assert manager.get_interface_by_index(6).name == 'ppp0'
+    assert manager.get_interface_by_index(99) is None
+    assert manager.get_interface_by_ip('2001:db8::5').name == 'eth0'
+    assert manager.get_interface_by_name('lo').index == 1
+    
+    # Served from the snapshot until it is refreshed
+    (sysfs / 'eth0' / 'mtu').write_text('9000\n')
+    assert manager.get_interface_by_name('eth0').mtu == 1500
+    manager.refresh()
+    assert manager.get_interface_by_name('eth0').mtu == 9000
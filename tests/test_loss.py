@@ -0,0 +1,33 @@
+from mtu_diagnostics.utils.loss import LossTracker
+
+def test_loss_rate_starts_at_the_prior():
+    tracker = LossTracker(prior_loss=0.05, prior_weight=2)
+    assert tracker.loss_rate('a') == 0.05
+    
+    tracker.record('a', 3)
+    assert tracker.stats('a') == {'sent': 3, 'lost': 2, 'loss_rate': round(2.1 / 5, 4)}
+
+def test_targets_that_never_replied_are_not_retried():
+    tracker = LossTracker()
+    assert tracker.confidence_of('a', 5) == 0.0
+    assert tracker.settled('a', 1)
+
+def test_clean_paths_settle_sooner_than_lossy_ones():
+    clean, lossy = LossTracker(), LossTracker()
+    for _ in range(20):
+        clean.record('a', 1)
+        lossy.record('a', 2)
+    
+    assert not clean.settled('a', 1) and clean.settled('a', 2)
+    assert not lossy.settled('a', 4)
+    
+    confidences = [lossy.confidence_of('a', timeouts) for timeouts in range(1, 8)]
+    assert confidences == sorted(confidences) and confidences[-1] < 1
+
+def test_little_data_means_more_retries():
+    seen_once, seen_often = LossTracker(), LossTracker()
+    seen_once.record('a', 1)
+    for _ in range(50):
+        seen_often.record('a', 1)
+    
+    assert seen_once.confidence_of('a', 2) < seen_often.confidence_of('a', 2)
@@ -0,0 +1,66 @@
+from mtu_diagnostics.core.detector import MTUDetector
+from mtu_diagnostics.core.monitor import Monitor
+from mtu_diagnostics.utils.metrics import Exposition, Histogram
+
+def test_histogram_buckets_are_cumulative_when_exposed():
+    histogram = Histogram([0.5, 0.1, 1])
+    for value in (0.05, 0.1, 0.7, 3):
+        histogram.observe(value)
+    
+    assert histogram.cumulative() == [(0.1, 2), (0.5, 2), (1, 3), (float('inf'), 4)]
+    assert (histogram.count, histogram.sum) == (4, 3.85)
+
+def test_exposition_format():
+    histogram = Histogram([0.1])
+    histogram.observe(0.05)
+    exposition = Exposition()
+    exposition.family('mtu_path', 'gauge', 'Path "MTU"\nper target', 'bytes')
+    exposition.sample('mtu_path', 1500, {'target': 'a"b\\c'})
+    exposition.sample('mtu_ratio', 0.25)
+    exposition.family('mtu_rtt_seconds', 'histogram', 'RTT', 'seconds')
+    exposition.histogram('mtu_rtt_seconds', histogram, {'target': 'a'})
+    
+    assert exposition.render() == '\n'.join([
+        '# TYPE mtu_path gauge',
+        '# UNIT mtu_path bytes',
+        '# HELP mtu_path Path \\"MTU\\"\\nper target',
+        'mtu_path{target="a\\"b\\\\c"} 1500',
+        'mtu_ratio 0.25',
+        '# TYPE mtu_rtt_seconds histogram',
+        '# UNIT mtu_rtt_seconds seconds',
+        '# HELP mtu_rtt_seconds RTT',
+        'mtu_rtt_seconds_bucket{target="a",le="0.1"} 1',
+        'mtu_rtt_seconds_bucket{target="a",le="+Inf"} 1',
+        'mtu_rtt_seconds_count{target="a"} 1',
+        'mtu_rtt_seconds_sum{target="a"} 0.05',
+        '# EOF'
+    ]) + '\n'
+
+def test_monitor_exposes_checks_and_changes():
+    detector = MTUDetector()
+    monitor = Monitor(detector)
+    monitor.started = 1700000000.0
+    monitor.add('a')
+    monitor.add('b')
+    monitor._record(monitor.targets['a'], {'success': True, 'path_mtu': 1500, 'target_ip': '192.0.2.1',
+                                           'search': {'probes': 2}})
+    monitor._record(monitor.targets['a'], {'success': True, 'path_mtu': 1400, 'target_ip': '192.0.2.1',
+                                           'search': {'probes': 3}})
+    monitor._record(monitor.targets['b'], {'success': False, 'error': 'unreachable'})
+    
+    lines = monitor.metrics().splitlines()
+    assert lines[-1] == '# EOF'
+    assert 'mtu_diag_start_time_seconds 1700000000.0' in lines
+    assert 'mtu_diag_targets 2' in lines
+    assert 'mtu_diag_path_mtu_bytes{target="a"} 1400' in lines
+    assert not any(line.startswith('mtu_diag_path_mtu_bytes{target="b"}') for line in lines)
+    assert 'mtu_diag_path_mtu_previous_bytes{target="a"} 1500' in lines
+    assert 'mtu_diag_target_up{target="b"} 0' in lines
+    assert 'mtu_diag_checks_total{target="a",result="success"} 2' in lines
+    assert 'mtu_diag_checks_total{target="b",result="failure"} 1' in lines
+    assert 'mtu_diag_probes_total{target="a"} 5' in lines
+    assert 'mtu_diag_path_mtu_changes_total{target="a"} 1' in lines
+    # Counter families are named without _total, their samples with it
+    assert '# TYPE mtu_diag_checks counter' in lines
+    assert [event['event'] for event in monitor.events] == ['mtu_changed', 'down']
+    detector.close()
@@ -0,0 +1,36 @@
+import asyncio
+import threading
+from mtu_diagnostics.core.detector import MTUDetector
+from mtu_diagnostics.core.monitor import Monitor
+
+def test_checks_run_as_coroutines_on_the_monitor_loop(fake_path, monkeypatch):
+    def blocking(*args, **options):
+        raise AssertionError('the blocking search must not be used')
+    
+    monkeypatch.setattr(MTUDetector, 'detect_path_mtu', blocking)
+    detector = MTUDetector()
+    monitor = Monitor(detector, interval=0.01, jitter=0)
+    monitor.add('127.0.0.1')
+    before = set(threading.enumerate())
+    
+    async def run():
+        task = asyncio.ensure_future(monitor.run(port=0))
+        while monitor.targets['127.0.0.1'].checks < 3:
+            await asyncio.sleep(0.01)
+        probers = detector.tester.probers
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+        return probers
+    
+    try:
+        probers = asyncio.run(run())
+    finally:
+        detector.close()
+    
+    target = monitor.targets['127.0.0.1']
+    assert target.up and target.path_mtu == 1500 and target.failures == 0
+    # The probe sockets the monitor opened are closed with it
+    assert probers.closed and detector.tester.probers is None
+    new_threads = [thread for thread in threading.enumerate()
+                   if thread not in before and not thread.name.startswith('mtu-resolver')]
+    assert new_threads == []
@@ -0,0 +1,11 @@
+from mtu_diagnostics.utils.network import ping_result, ping_with_size
+from mtu_diagnostics.utils.probe_result import Outcome
+
+def test_ping_with_size_keeps_returning_dicts():
+    result = ping_with_size('127.0.0.1', 100, timeout=2)
+    
+    assert isinstance(result, dict)
+    assert result['success'] is True and result['reason'] == 'ok'
+
+def test_ping_result_returns_a_probe_result():
+    assert ping_result('127.0.0.1', 100, timeout=2).outcome is Outcome.OK
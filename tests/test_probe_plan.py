@@ -0,0 +1,100 @@
+import pytest
+from mtu_diagnostics.core.probe_plan import IOStep, ProbeMemo, plan_probes, run_blocking
+from mtu_diagnostics.utils.loss import LossTracker
+from mtu_diagnostics.utils.probe_result import Outcome, ProbeResult
+
+IP = '192.0.2.1'
+
+def memo_with(*results, loss=None):
+    memo = ProbeMemo(loss=loss)
+    for size, outcome, attempts in results:
+        memo._series(IP).put(ProbeResult(outcome, size=size, attempts=attempts))
+    return memo
+
+def test_timeouts_count_as_evidence_only_at_or_below_a_size():
+    memo = memo_with((1500, Outcome.FAILED, 2), (1400, Outcome.FAILED, 1), (1280, Outcome.OK, 1))
+    assert memo._timeouts_at_or_below(IP, 1500) == 3
+    assert memo._timeouts_at_or_below(IP, 1400) == 1
+    assert memo._timeouts_at_or_below(IP, 1280) == 0
+
+def test_frag_needed_below_a_timeout_settles_it():
+    memo = memo_with((1500, Outcome.FAILED, 1), (1400, Outcome.MTU_EXCEEDED, 1), loss=LossTracker())
+    assert memo._timeouts_at_or_below(IP, 1500) is None
+    assert not memo._unsettled(IP, 1500)
+    assert memo.series[IP].get(1500).confidence == 1.0
+
+def test_unsettled_until_loss_is_an_unlikely_explanation():
+    loss = LossTracker()
+    for _ in range(20):
+        loss.record(IP, 1)
+    memo = memo_with((1500, Outcome.FAILED, 1), loss=loss)
+    
+    assert memo._unsettled(IP, 1500)
+    assert 0.99 < memo.series[IP].get(1500).confidence < loss.confidence
+    
+    memo.series[IP].put(ProbeResult(Outcome.FAILED, size=1500, attempts=2))
+    assert not memo._unsettled(IP, 1500)
+    assert memo.series[IP].get(1500).confidence >= loss.confidence
+
+def test_without_a_loss_tracker_timeouts_settle_with_no_confidence():
+    memo = memo_with((1500, Outcome.FAILED, 1))
+    assert not memo._unsettled(IP, 1500)
+    assert memo.series[IP].get(1500).confidence == 0.0
+
+def test_min_attempts_keeps_a_timeout_unsettled():
+    loss = LossTracker()
+    loss.record(IP, 1)
+    memo = memo_with((68, Outcome.FAILED, 1), loss=loss)
+    assert memo._unsettled(IP, 68, min_attempts=2)
+
+def test_memo_reuses_answers_and_retries_timeouts(fake_path):
+    memo = ProbeMemo(loss=LossTracker())
+    memo.probe(IP, 68)
+    fake_path.lose = {1400: 2}
+    
+    assert memo.probe(IP, 1400).success
+    assert memo.probe_many(IP, [1400, 68])[68].success
+    assert memo.series[IP].get(1400).attempts == 3
+    assert memo.stats() == {'sent': 4, 'reused': 2, 'retries': 2}
+
+def test_scans_leave_timeouts_for_later_phases(fake_path):
+    memo = ProbeMemo(loss=LossTracker())
+    memo.probe(IP, 68)
+    fake_path.lose = {1400: 1}
+    
+    assert not memo.probe(IP, 1400, retry=False).success
+    assert memo.probe(IP, 1400).success
+    assert fake_path.batches == [[68], [1400], [1400]]
+
+def test_probe_events_follow_each_round(fake_path):
+    events = []
+    memo = ProbeMemo(on_event=events.append)
+    memo.probe_many(IP, [1500, 1600])
+    
+    assert [(event['mtu_size'], event['reason']) for event in events] == [(1500, 'ok'), (1600, 'mtu_exceeded')]
+
+def test_plan_prefetches_common_sizes_only():
+    plan = plan_probes([1500, 1400, 20], [9000, 8000], 1500, include_jumbo=True)
+    assert plan == {'sizes': [9000, 8000, 1500, 1400], 'prefetch': [1500, 1400], 'on_demand': [9000, 8000]}
+    
+    plan = plan_probes([1500, 1400], [9000], 1450, include_jumbo=False)
+    assert plan['sizes'] == [1500, 1450, 1400] and plan['on_demand'] == [1450]
+
+def test_run_blocking_throws_step_errors_into_the_coroutine():
+    def fail():
+        raise ValueError('no route')
+    
+    async def check():
+        first = await IOStep(lambda: 1, None)
+        try:
+            await IOStep(fail, None)
+        except ValueError as e:
+            return first, str(e)
+    
+    assert run_blocking(check()) == (1, 'no route')
+    
+    async def unhandled():
+        await IOStep(fail, None)
+    
+    with pytest.raises(ValueError):
+        run_blocking(unhandled())
@@ -0,0 +1,47 @@
+import math
+from mtu_diagnostics.utils.probe_result import Outcome, ProbeResult, ProbeSeries
+
+def test_result_keeps_only_fields_its_outcome_can_have():
+    ok = ProbeResult(Outcome.OK, rtt=0.002, next_hop_mtu=1400, size=1500)
+    assert ok.success and ok.reason == 'ok'
+    assert ok.rtt == 0.002 and ok.next_hop_mtu is None
+    
+    exceeded = ProbeResult(Outcome.MTU_EXCEEDED, rtt=0.002, next_hop_mtu=1400, size=1500)
+    assert not exceeded.success and exceeded.reason == 'mtu_exceeded'
+    assert exceeded.rtt is None and exceeded.next_hop_mtu == 1400
+
+def test_to_dict_leaves_out_unknown_fields():
+    assert ProbeResult(Outcome.FAILED, size=1500, attempts=2, confidence=0.5).to_dict() == {
+        'mtu_size': 1500, 'success': False, 'reason': 'failed', 'attempts': 2, 'confidence': 0.5
+    }
+    result = ProbeResult(Outcome.OK, rtt=0.0012345678, size=68, error='late', output={'stdout': ''})
+    assert result.to_dict() == {
+        'mtu_size': 68, 'success': True, 'reason': 'ok', 'attempts': 1, 'confidence': 1.0,
+        'rtt': 0.001235, 'error': 'late', 'output': {'stdout': ''}
+    }
+
+def test_series_round_trips_results_in_insertion_order():
+    results = [
+        ProbeResult(Outcome.OK, rtt=0.001, size=1280),
+        ProbeResult(Outcome.MTU_EXCEEDED, next_hop_mtu=1400, size=1500),
+        ProbeResult(Outcome.FAILED, size=1492, attempts=3, confidence=0.25, error='timeout')
+    ]
+    series = ProbeSeries(results)
+    
+    assert len(series) == 3 and 1500 in series and 1400 not in series
+    assert [result.to_dict() for result in results] == series.to_list()
+    assert series.get(1492).error == 'timeout'
+    assert series.get(1400) is None
+    assert math.isnan(series.rtts[1]) and series.next_hop_mtus[0] == 0
+
+def test_series_put_replaces_in_place():
+    series = ProbeSeries([ProbeResult(Outcome.FAILED, size=1500, error='timeout'),
+                          ProbeResult(Outcome.OK, size=1280)])
+    series.put(ProbeResult(Outcome.OK, rtt=0.003, size=1500, attempts=2))
+    
+    assert list(series.sizes) == [1500, 1280]
+    assert series.outcome(1500) is Outcome.OK
+    assert series.get(1500).attempts == 2 and series.get(1500).error is None
+    
+    series.set_confidence(1280, 0.5)
+    assert series.get(1280).confidence == 0.5
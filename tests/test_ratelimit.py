@@ -0,0 +1,43 @@
+import pytest
+from mtu_diagnostics.utils.ratelimit import ProbeRateLimiter, TokenBucket
+
+def test_bucket_allows_a_burst_then_paces():
+    bucket = TokenBucket(rate=10, burst=3)
+    assert [bucket.reserve(0.0) for _ in range(3)] == [0.0, 0.0, 0.0]
+    assert bucket.reserve(0.0) == pytest.approx(0.1)
+    # Slots are booked, so the next caller waits behind the last one
+    assert bucket.reserve(0.0) == pytest.approx(0.2)
+    assert not bucket.idle(0.4)
+    assert bucket.idle(0.5)
+    assert bucket.reserve(1.0) == 0.0
+
+def test_zero_rate_never_waits():
+    bucket = TokenBucket(rate=0)
+    assert all(bucket.reserve(0.0) == 0.0 for _ in range(100))
+
+def test_destinations_are_paced_independently():
+    limiter = ProbeRateLimiter(rate=0, per_destination_rate=10, per_destination_burst=1)
+    assert limiter.reserve('a') == 0.0
+    assert limiter.reserve('a') == pytest.approx(0.1, abs=0.01)
+    assert limiter.reserve('b') == 0.0
+    
+    stats = limiter.stats()
+    assert (stats['probes'], stats['delayed']) == (3, 1)
+    assert stats['max_wait'] == pytest.approx(0.1, abs=0.01)
+
+def test_global_bucket_spans_destinations():
+    limiter = ProbeRateLimiter(rate=10, burst=1, per_destination_rate=0)
+    assert limiter.reserve('a') == 0.0
+    assert limiter.reserve('b') == pytest.approx(0.1, abs=0.01)
+
+def test_idle_buckets_make_room_for_new_destinations():
+    limiter = ProbeRateLimiter(rate=0, per_destination_rate=1000, per_destination_burst=1,
+                               max_destinations=2)
+    limiter.reserve('a')
+    limiter.reserve('b')
+    limiter.reserve('b')
+    # 'a' is idle again after a millisecond, 'b' is still paying off its burst
+    limiter._bucket('c', limiter._destinations['a']._tat)
+    assert list(limiter._destinations) == ['b', 'c']
+    limiter._bucket('d', 0.0)
+    assert 'b' in limiter._destinations
@@ -0,0 +1,112 @@
+import asyncio
+import socket
+import threading
+import time
+from types import SimpleNamespace
+import pytest
+from mtu_diagnostics.utils import resolver as resolver_module
+from mtu_diagnostics.utils.resolver import Resolver
+
+class FakeDNS:
+    # Stands in for socket.getaddrinfo: names in `records` resolve, others
+    # fail, and every lookup waits for `release` once it is cleared
+    def __init__(self, records):
+        self.records = records
+        self.calls = []
+        self.release = threading.Event()
+        self.release.set()
+    
+    def getaddrinfo(self, host, port, family=0, type=0, *args):
+        self.calls.append(host)
+        self.release.wait(5)
+        if host not in self.records:
+            raise socket.gaierror(socket.EAI_NONAME, 'Name or service not known')
+        return [(socket.AF_INET6 if ':' in address else socket.AF_INET, type, 0, '',
+                 (address, 0)) for address in self.records[host]]
+
+@pytest.fixture
+def dns(monkeypatch):
+    dns = FakeDNS({'a.example': ['192.0.2.1', '2001:db8::1'], 'v6.example': ['2001:db8::2']})
+    monkeypatch.setattr(socket, 'getaddrinfo', dns.getaddrinfo)
+    return dns
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = SimpleNamespace(now=1000.0)
+    monkeypatch.setattr(resolver_module, 'time', SimpleNamespace(monotonic=lambda: clock.now))
+    return clock
+
+def test_answers_are_cached_until_their_ttl(dns, clock):
+    resolver = Resolver(ttl=300)
+    assert resolver.resolve('a.example') == '192.0.2.1'
+    assert resolver.resolve('a.example', 'ipv6') == '2001:db8::1'
+    assert resolver.resolve('v6.example') == '2001:db8::2'
+    assert dns.calls == ['a.example', 'v6.example']
+    
+    clock.now += 299
+    resolver.resolve('a.example')
+    assert dns.calls == ['a.example', 'v6.example']
+    clock.now += 2
+    resolver.resolve('a.example')
+    assert dns.calls == ['a.example', 'v6.example', 'a.example']
+    assert resolver.stats() == {'entries': 2, 'hits': 2, 'misses': 3, 'inflight': 0}
+
+def test_failures_are_cached_for_the_negative_ttl(dns, clock):
+    resolver = Resolver(ttl=300, negative_ttl=30)
+    assert resolver.resolve('missing.example') is None
+    clock.now += 29
+    assert resolver.resolve('missing.example') is None
+    assert dns.calls == ['missing.example']
+    
+    clock.now += 2
+    dns.records['missing.example'] = ['192.0.2.9']
+    assert resolver.resolve('missing.example') == '192.0.2.9'
+    assert dns.calls == ['missing.example'] * 2
+
+def test_concurrent_lookups_of_a_name_share_one_query(dns):
+    resolver = Resolver()
+    dns.release.clear()
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(resolver.resolve('a.example')))
+               for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    while resolver.stats()['hits'] < 3:
+        time.sleep(0.01)
+    dns.release.set()
+    for thread in threads:
+        thread.join(timeout=5)
+    
+    assert results == ['192.0.2.1'] * 4
+    assert dns.calls == ['a.example']
+    assert resolver.stats()['inflight'] == 0
+
+def test_background_lookups_coalesce_with_each_other(dns):
+    resolver = Resolver()
+    dns.release.clear()
+    
+    async def lookups():
+        tasks = [asyncio.ensure_future(resolver.aresolve(name))
+                 for name in ('a.example', 'a.example', 'v6.example', 'missing.example')]
+        await asyncio.sleep(0.05)
+        dns.release.set()
+        return await asyncio.gather(*tasks)
+    
+    try:
+        assert asyncio.run(lookups()) == ['192.0.2.1', '192.0.2.1', '2001:db8::2', None]
+        assert sorted(dns.calls) == ['a.example', 'missing.example', 'v6.example']
+        assert resolver.resolve_many(['a.example', 'v6.example']) == {
+            'a.example': {'ipv4': ['192.0.2.1'], 'ipv6': ['2001:db8::1']},
+            'v6.example': {'ipv4': [], 'ipv6': ['2001:db8::2']}
+        }
+        assert len(dns.calls) == 3
+    finally:
+        resolver.close()
+
+def test_oldest_names_are_evicted_beyond_the_bound(dns):
+    resolver = Resolver(max_entries=1)
+    resolver.resolve('a.example')
+    resolver.resolve('v6.example')
+    resolver.resolve('a.example')
+    assert dns.calls == ['a.example', 'v6.example', 'a.example']
+    assert resolver.stats()['entries'] == 1
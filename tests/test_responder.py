@@ -0,0 +1,71 @@
+import asyncio
+import socket
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import pytest
+from mtu_diagnostics.core.responder import start_responder
+from mtu_diagnostics.core.tester import MTUTester
+from mtu_diagnostics.utils.udp import build_ack, build_probe, parse_header, TYPE_ACK
+
+@pytest.fixture
+def responder(request):
+    # A responder on an ephemeral loopback port, served from its own loop
+    host = getattr(request, 'param', '127.0.0.1')
+    loop = asyncio.new_event_loop()
+    thread = threading.Thread(target=loop.run_forever, daemon=True)
+    thread.start()
+    transport, protocol = asyncio.run_coroutine_threadsafe(start_responder(host, 0), loop).result(5)
+    yield transport.get_extra_info('sockname')[1], protocol
+    loop.call_soon_threadsafe(transport.close)
+    loop.call_soon_threadsafe(loop.stop)
+    thread.join(5)
+    loop.close()
+
+def closed_port():
+    with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+def test_ack_echoes_token_sequence_and_length():
+    probe = build_probe(0x1234, 7, 1200)
+    assert len(probe) == 1200
+    assert parse_header(build_ack(probe)) == (TYPE_ACK, 1200, 0x1234, 7)
+    assert build_ack(build_ack(probe)) is None
+    assert build_ack(b'junk') is None
+
+def test_finds_path_mtu_over_loopback(responder):
+    port, protocol = responder
+    result = MTUTester(udp_port=port).find_max_mtu('127.0.0.1', start_size=1500, timeout=1)
+    
+    assert result['success']
+    assert result['max_mtu'] == 1500
+    assert protocol.probes > 0
+    assert protocol.largest == 1500 - 28
+
+@pytest.mark.skipif(not socket.has_ipv6, reason='no IPv6')
+@pytest.mark.parametrize('responder', ['::'], indirect=True)
+@pytest.mark.parametrize('target', ['127.0.0.1', '::1'])
+def test_wildcard_responder_answers_both_families(responder, target):
+    port, _ = responder
+    result = MTUTester(udp_port=port).find_max_mtu(target, start_size=1500, timeout=1)
+    assert result['success'] and result['max_mtu'] == 1500
+
+def test_closed_port_is_unreachable():
+    port = closed_port()
+    result = MTUTester(udp_port=port).find_max_mtu('127.0.0.1', start_size=1500, timeout=1)
+    
+    assert not result['success']
+    assert result['error'] == f'127.0.0.1 is unreachable or has no responder on UDP port {port}'
+
+def test_serves_concurrent_clients(responder):
+    port, protocol = responder
+    
+    def check(_):
+        # Each thread probes from its own socket
+        return MTUTester(udp_port=port).test_common_sizes('127.0.0.1', timeout=1, concurrent=True)
+    
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        results = list(executor.map(check, range(8)))
+    
+    assert all(all(r.success for r in result['results']) for result in results)
+    assert protocol.probes >= 8 * len(results[0]['results'])
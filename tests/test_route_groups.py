@@ -0,0 +1,60 @@
+import threading
+import time
+from types import SimpleNamespace
+from mtu_diagnostics.core import route_groups
+from mtu_diagnostics.core.route_groups import RouteGroups
+from mtu_diagnostics.core.tracepath import Tracepath
+
+class FakeDetector:
+    # Every target sits behind the same route; the search for `failing` raises
+    def __init__(self, failing):
+        self.failing = failing
+        self.resolver = SimpleNamespace(resolve=lambda target: target)
+        self.interface_manager = SimpleNamespace(
+            get_route=lambda ip: {'interface': 'eth0', 'gateway': '192.0.2.1', 'mtu': 1500})
+    
+    def detect_path_mtu(self, target, **options):
+        if target == self.failing:
+            # Give the members time to queue up behind the representative
+            time.sleep(0.2)
+            raise RuntimeError('search failed')
+        return {'success': False, 'target': target, 'error': 'No working MTU size found'}
+
+def test_members_do_not_hang_when_representative_raises():
+    groups = RouteGroups(FakeDetector('10.0.0.1'))
+    results = {}
+    
+    def check(target):
+        try:
+            results[target] = groups.detect_path_mtu(target)
+        except RuntimeError as e:
+            results[target] = e
+    
+    threads = [threading.Thread(target=check, args=('10.0.0.1',))]
+    threads[0].start()
+    time.sleep(0.05)
+    threads += [threading.Thread(target=check, args=(f'10.0.0.{i}',)) for i in range(2, 6)]
+    for thread in threads[1:]:
+        thread.start()
+    for thread in threads:
+        thread.join(timeout=5)
+    
+    assert not any(thread.is_alive() for thread in threads)
+    assert isinstance(results['10.0.0.1'], RuntimeError)
+    for i in range(2, 6):
+        assert results[f'10.0.0.{i}']['route_group']['id'] == 0
+
+def test_router_traces_are_paced(monkeypatch):
+    limiter = object()
+    limiters = []
+    
+    def routers(tracer, ip, count):
+        limiters.append(tracer.limiter)
+        return ['192.0.2.1'] * count
+    
+    monkeypatch.setattr(route_groups, 'get_rate_limiter', lambda: limiter)
+    monkeypatch.setattr(Tracepath, 'routers', routers)
+    groups = RouteGroups(FakeDetector(None), hops=2)
+    groups.detect_path_mtu('10.0.0.1')
+    
+    assert limiters == [limiter]
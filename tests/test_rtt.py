@@ -0,0 +1,46 @@
+import pytest
+from mtu_diagnostics.utils.rtt import RTTEstimator, RTTTracker
+
+def test_estimator_follows_rfc_6298():
+    estimator = RTTEstimator()
+    assert estimator.rto() is None
+    
+    estimator.update(0.1)
+    assert (estimator.srtt, estimator.rttvar) == (0.1, 0.05)
+    assert estimator.rto() == pytest.approx(0.3)
+    
+    estimator.update(0.2)
+    assert estimator.rttvar == pytest.approx(0.75 * 0.05 + 0.25 * 0.1)
+    assert estimator.srtt == pytest.approx(0.875 * 0.1 + 0.125 * 0.2)
+    assert estimator.samples == 2
+
+def test_timeout_adapts_within_bounds():
+    tracker = RTTTracker(min_timeout=0.02, max_timeout=2)
+    assert tracker.timeout('a', 5) == 2
+    assert not tracker.has_estimate('a')
+    
+    tracker.sample('a', 0.1)
+    assert tracker.timeout('a', 5) == pytest.approx(0.3)
+    # The caller's timeout stays the ceiling, min_timeout the floor
+    assert tracker.timeout('a', 0.25) == 0.25
+    tracker.sample('b', 0.001)
+    assert tracker.timeout('b', 5) == 0.02
+    
+    stats = tracker.stats('a', 5)
+    assert stats == {'srtt': 0.1, 'rttvar': 0.05, 'samples': 1, 'timeout': 0.3}
+    assert tracker.stats('c', 5) is None
+
+def test_fixed_timeouts_still_feed_the_observer():
+    seen = []
+    tracker = RTTTracker(adaptive=False, observer=seen.append)
+    tracker.sample('a', 0.1)
+    tracker.sample('a', None)
+    
+    assert seen == [0.1]
+    assert tracker.timeout('a', 5) == 5 and not tracker.has_estimate('a')
+
+def test_oldest_target_is_dropped_beyond_the_bound():
+    tracker = RTTTracker(max_targets=2)
+    for ip in ('a', 'b', 'c'):
+        tracker.sample(ip, 0.01)
+    assert [tracker.has_estimate(ip) for ip in ('a', 'b', 'c')] == [False, True, True]
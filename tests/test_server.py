@@ -0,0 +1,81 @@
+import asyncio
+import json
+import os
+import socket
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+import pytest
+from mtu_diagnostics.core.server import CommandServer
+from mtu_diagnostics.utils.client import forward
+
+def execute(argv):
+    if argv[0] == 'fail':
+        raise RuntimeError('boom')
+    if argv[0] == 'sleep':
+        time.sleep(float(argv[1]))
+    return ' '.join(argv) + '\n', '', 3 if argv[0] == 'exit' else 0
+
+@pytest.fixture
+def server(tmp_path):
+    # A server on its own loop thread, cancelled at teardown
+    server = CommandServer(execute, str(tmp_path / 'state' / 'server.sock'), workers=4)
+    loop = asyncio.new_event_loop()
+    thread = threading.Thread(target=loop.run_forever, daemon=True)
+    thread.start()
+    ready = threading.Event()
+    
+    async def start():
+        return asyncio.ensure_future(server.serve(lambda path: ready.set()))
+    
+    async def stop(task):
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+    
+    task = asyncio.run_coroutine_threadsafe(start(), loop).result(5)
+    assert ready.wait(5)
+    yield server
+    asyncio.run_coroutine_threadsafe(stop(task), loop).result(5)
+    loop.call_soon_threadsafe(loop.stop)
+    thread.join(5)
+    loop.close()
+
+def test_forwards_commands_and_their_exit_codes(server):
+    assert forward(server.path, ['test', '10.0.0.5']) == {'stdout': 'test 10.0.0.5\n', 'stderr': '',
+                                                         'exit_code': 0}
+    assert forward(server.path, ['exit'])['exit_code'] == 3
+    
+    response = forward(server.path, ['fail'])
+    assert response == {'stdout': '', 'stderr': 'Error: boom\n', 'exit_code': 1}
+    assert server.stats() == {'requests': 3, 'failures': 2}
+
+def test_socket_is_private(server):
+    assert os.stat(server.path).st_mode & 0o777 == 0o600
+
+def test_invalid_request_is_answered(server):
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.connect(server.path)
+        sock.sendall(b'{"args": []}\n')
+        response = json.loads(sock.makefile().readline())
+    assert response['exit_code'] == 1 and 'Invalid request' in response['stderr']
+
+def test_commands_run_concurrently(server):
+    start = time.monotonic()
+    with ThreadPoolExecutor(4) as executor:
+        responses = list(executor.map(lambda i: forward(server.path, ['sleep', '0.3']), range(4)))
+    assert all(response['exit_code'] == 0 for response in responses)
+    assert time.monotonic() - start < 1.0
+
+def test_no_server_means_none(tmp_path):
+    assert forward(str(tmp_path / 'missing.sock'), ['test']) is None
+
+def test_stale_socket_is_replaced_and_a_live_one_kept(tmp_path, server):
+    # `server` holds its path, a second server there must refuse to start
+    with pytest.raises(OSError):
+        CommandServer(execute, server.path)._prepare_path()
+    
+    stale = str(tmp_path / 'stale.sock')
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.bind(stale)
+    CommandServer(execute, stale)._prepare_path()
+    assert not os.path.exists(stale)
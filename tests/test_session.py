@@ -0,0 +1,61 @@
+import asyncio
+import socket
+import threading
+import pytest
+from mtu_diagnostics.core.session import MTUSession
+
+LOCALHOST = '127.0.0.1'
+
+def open_probers(session):
+    return [prober for prober in session.probers._probers.values() if prober]
+
+def test_sync_and_async_checks_share_the_session_sockets():
+    with MTUSession() as session:
+        result = session.test_common_sizes(LOCALHOST)
+        assert all(probe.success for probe in result['results'])
+        
+        async def check_all():
+            return await asyncio.gather(*(session.test_common_sizes_async(LOCALHOST, concurrent=True)
+                                          for _ in range(8)))
+        
+        for result in asyncio.run(check_all()):
+            assert all(probe.success for probe in result['results'])
+        probers = open_probers(session)
+        assert len(session.probers._probers) == 1
+    
+    # Closed with the session, along with the thread that read them
+    assert all(prober.sock is None for prober in probers)
+    assert not session.probers._thread.is_alive()
+    with pytest.raises(RuntimeError):
+        session.test_common_sizes(LOCALHOST)
+
+def test_async_checks_run_on_the_callers_loop():
+    async def check():
+        async with MTUSession() as session:
+            result = await session.detect_path_mtu_async(LOCALHOST, interface_name='lo')
+            # The sockets' reader and the resolver's lookups, no thread per check
+            started = {thread.name for thread in threading.enumerate()} - names
+            assert {name for name in started if not name.startswith('mtu-resolver')} == {'mtu-probers'}
+            return result
+    
+    names = {thread.name for thread in threading.enumerate()}
+    result = asyncio.run(check())
+    assert result['success'] and result['path_mtu'] >= 1500
+
+def test_close_ends_checks_in_flight():
+    # UDP probes to a port nobody answers on time out, close() interrupts them
+    with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as silent:
+        silent.bind((LOCALHOST, 0))
+        session = MTUSession(udp_port=silent.getsockname()[1])
+        
+        async def check():
+            task = asyncio.ensure_future(session.test_common_sizes_async(LOCALHOST, timeout=5))
+            await asyncio.sleep(0.2)
+            probers = open_probers(session)
+            session.close()
+            with pytest.raises(RuntimeError):
+                await asyncio.wait_for(task, 2)
+            return probers
+        
+        probers = asyncio.run(check())
+        assert len(probers) == 1 and probers[0].sock is None
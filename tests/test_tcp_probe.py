@@ -0,0 +1,84 @@
+import socket
+import threading
+import pytest
+from mtu_diagnostics.core.tcp_probe import TCP_OVERHEAD, TCPConnectionPool, TCPProber
+
+pytestmark = pytest.mark.skipif(not hasattr(socket, 'TCP_INFO'), reason='TCP_INFO is Linux only')
+
+@pytest.fixture
+def listener():
+    # Accepts every connection and reads whatever is pushed into it
+    server = socket.create_server(('127.0.0.1', 0))
+    
+    def drain(conn):
+        with conn:
+            while conn.recv(65536):
+                pass
+    
+    def accept():
+        while True:
+            try:
+                conn, _ = server.accept()
+            except OSError:
+                return
+            threading.Thread(target=drain, args=(conn,), daemon=True).start()
+    
+    threading.Thread(target=accept, daemon=True).start()
+    yield server.getsockname()[1]
+    server.close()
+
+def closed_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+def test_reads_mss_and_pmtu(listener):
+    port = listener
+    prober = TCPProber()
+    result = prober.probe('127.0.0.1', port, timeout=2)
+    prober.pool.close()
+    
+    assert result['success'] and not result['reused']
+    # Loopback caps the MSS well below its MTU
+    assert result['mss'] > 0 and result['advmss'] > 0
+    assert result['mss_mtu'] == result['mss'] + TCP_OVERHEAD
+    assert result['ip_mtu'] >= result['mss_mtu']
+    assert result['rtt'] >= 0
+
+def test_reuses_idle_connections(listener):
+    port = listener
+    prober = TCPProber()
+    first = prober.probe('127.0.0.1', port, timeout=2)
+    second = prober.probe('127.0.0.1', port, timeout=2)
+    prober.pool.close()
+    
+    assert first['success'] and not first['reused']
+    assert second['success'] and second['reused']
+
+def test_pushed_connections_are_not_pooled(listener):
+    port = listener
+    prober = TCPProber()
+    pushed = prober.probe('127.0.0.1', port, timeout=2, push_segments=4)
+    after = prober.probe('127.0.0.1', port, timeout=2)
+    prober.pool.close()
+    
+    assert pushed['success'] and not pushed['push']['stalled']
+    assert pushed['push']['segments'] == 4
+    assert not after['reused']
+
+def test_connection_refused():
+    port = closed_port()
+    result = TCPProber().probe('127.0.0.1', port, timeout=2)
+    
+    assert not result['success']
+    assert result['error'] == f'Connection to 127.0.0.1:{port} failed: Connection refused'
+
+def test_probe_many_keeps_target_order(listener):
+    port = listener
+    refused = closed_port()
+    prober = TCPProber(TCPConnectionPool(max_idle=1))
+    results = prober.probe_many([('127.0.0.1', port), ('127.0.0.1', refused), ('127.0.0.1', port)], timeout=2)
+    prober.pool.close()
+    
+    assert [result['success'] for result in results] == [True, False, True]
+    assert [result['port'] for result in results] == [port, refused, port]
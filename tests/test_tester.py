@@ -0,0 +1,73 @@
+import asyncio
+from mtu_diagnostics.core.tester import BASELINE_MTU, MTUTester
+from mtu_diagnostics.utils.probe_result import Outcome
+
+TARGET = '192.0.2.1'
+
+def test_finds_path_mtu_by_following_frag_needed(fake_path):
+    fake_path.mtu = 1400
+    result = MTUTester().find_max_mtu(TARGET)
+    
+    assert result['success'] and result['max_mtu'] == 1400
+    assert result['search']['method'] == 'ptb'
+
+def test_finds_path_mtu_by_search_without_frag_needed(fake_path):
+    fake_path.mtu = 1433
+    fake_path.ptb = False
+    result = MTUTester().find_max_mtu(TARGET, use_ptb=True, fanout=3)
+    
+    assert result['success'] and result['max_mtu'] == 1433
+    assert result['search']['method'] == 'search' and result['search']['fanout'] == 3
+
+def test_common_sizes_keep_size_order(fake_path):
+    fake_path.mtu = 1400
+    tester = MTUTester()
+    result = tester.test_common_sizes(TARGET)
+    
+    assert [r.size for r in result['results']] == tester.common_mtu_sizes
+    assert [r.success for r in result['results']] == [size <= 1400 for size in tester.common_mtu_sizes]
+
+def test_baseline_is_sent_once_to_a_silent_target(fake_path):
+    fake_path.silent = True
+    MTUTester().find_max_mtu(TARGET)
+    
+    assert fake_path.batches[0] == [BASELINE_MTU]
+    assert sum(batch.count(BASELINE_MTU) for batch in fake_path.batches) == 1
+
+def test_concurrent_common_sizes_send_the_baseline_in_the_same_batch(fake_path):
+    fake_path.silent = True
+    result = MTUTester().test_common_sizes(TARGET, concurrent=True)
+    
+    # One batch, retried as a whole, rather than a baseline wait first
+    sizes = {r.size for r in result['results']}
+    assert all(set(batch) == sizes | {BASELINE_MTU} for batch in fake_path.batches)
+    assert all(r.outcome is Outcome.FAILED for r in result['results'])
+
+def test_ipv6_skips_sizes_below_its_minimum(fake_path):
+    result = MTUTester().test_common_sizes('2001:db8::1')
+    assert min(r.size for r in result['results']) == 1280
+
+def test_async_search_matches_the_blocking_one(fake_path):
+    # Both drive the same coroutine, so they send the same batches
+    fake_path.mtu = 1433
+    fake_path.ptb = False
+    fake_path.lose = {1433: 1}
+    blocking = MTUTester().find_max_mtu(TARGET, fanout=2)
+    batches, fake_path.batches = fake_path.batches, []
+    
+    fake_path.lose = {1433: 1}
+    result = asyncio.run(MTUTester().find_max_mtu_async(TARGET, fanout=2))
+    
+    assert result['max_mtu'] == blocking['max_mtu'] == 1433
+    assert fake_path.batches == batches
+
+def test_suppressed_frag_needed_leaves_results_unchanged(fake_path):
+    # A router's ICMP rate limit only turns some too-big sizes into timeouts
+    fake_path.mtu = 1400
+    expected = MTUTester().test_common_sizes(TARGET, concurrent=True)['results'].to_list()
+    
+    fake_path.ptb_limit = 2
+    tester = MTUTester()
+    limited = tester.test_common_sizes(TARGET, concurrent=True)['results']
+    assert [probe['success'] for probe in limited.to_list()] == [probe['success'] for probe in expected]
+    assert tester.find_max_mtu(TARGET)['max_mtu'] == 1400
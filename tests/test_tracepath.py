@@ -0,0 +1,94 @@
+import asyncio
+import errno
+from mtu_diagnostics.core import tracepath
+from mtu_diagnostics.core.tracepath import Tracepath
+
+TARGET = '192.0.2.10'
+
+class FakeHops:
+    # Stands in for the path behind Tracepath._transmit: routers at TTL 1 to
+    # len(rtts), then the target. `mtus` maps a hop to the MTU of the link
+    # after it (0 is this host's link); a hop in `black_holes` drops what is
+    # too big without a Frag-Needed, a hop in `silent` never answers TTL
+    # expiry, and a target that is not `answering` never answers at all.
+    def __init__(self, rtts, target_rtt, mtus=None, black_holes=(), silent=(), answering=True):
+        self.rtts = rtts
+        self.target_rtt = target_rtt
+        self.mtus = mtus or {}
+        self.black_holes = set(black_holes)
+        self.silent = set(silent)
+        self.answering = answering
+    
+    def address(self, hop):
+        return f'10.0.{hop}.1'
+    
+    def transmit(self, tracer, ip, port, ttl, size):
+        loop = asyncio.get_running_loop()
+        reach = min(ttl, len(self.rtts) + 1)
+        for hop in range(reach):
+            if size <= self.mtus.get(hop, 1500):
+                continue
+            if hop == 0:
+                raise OSError(errno.EMSGSIZE, 'Message too long')
+            if hop not in self.black_holes:
+                loop.call_later(self.rtts[hop - 1], tracer._deliver, port,
+                                ('mtu_exceeded', self.address(hop), self.mtus[hop]))
+            return
+        
+        if reach > len(self.rtts):
+            if self.answering:
+                loop.call_later(self.target_rtt, tracer._deliver, port, ('reached', ip, None))
+        elif reach not in self.silent:
+            loop.call_later(self.rtts[reach - 1], tracer._deliver, port,
+                            ('time_exceeded', self.address(reach), None))
+
+def trace(monkeypatch, hops, start_size=1500, **options):
+    monkeypatch.setattr(Tracepath, '_transmit',
+                        lambda tracer, ip, port, ttl, size: hops.transmit(tracer, ip, port, ttl, size))
+    monkeypatch.setattr(tracepath, 'get_route_mtu', lambda ip: hops.mtus.get(0))
+    tracer = Tracepath(**options)
+    seen = []
+    result = tracer.trace(TARGET, start_size, seen.append)
+    return tracer, result, seen
+
+def test_far_hops_are_reached_behind_a_near_mtu_drop(monkeypatch):
+    # A PPPoE-like link right after a close first hop: the near hop answers
+    # everything at first, which must not shorten the wait for farther ones
+    hops = FakeHops([0.001] + [0.08 + i * 0.00125 for i in range(8)], 0.095, mtus={1: 1492})
+    tracer, result, seen = trace(monkeypatch, hops, timeout=0.5)
+    
+    assert result['reached'] and result['path_mtu'] == 1492
+    assert [hop['ttl'] for hop in result['hops']] == list(range(1, 11))
+    assert [hop['reply'] for hop in result['hops']] == ['time_exceeded'] * 9 + ['reached']
+    assert result['drops'] == [{'after_ttl': 1, 'from': 1500, 'to': 1492, 'black_hole': False,
+                                'reported_by': '10.0.1.1'}]
+    assert result['waves'] == 2
+    assert seen == result['hops']
+    # Frag-Needed replies count towards the estimate of the hop that sent them
+    assert tracer.rtt.stats((TARGET, 1), 0.5)['samples'] > 1
+
+def test_black_hole_mtu_is_found_by_bisection(monkeypatch):
+    monkeypatch.setattr(tracepath, 'ROUTER_ICMP_RATE', 1000.0)
+    hops = FakeHops([0.001, 0.002, 0.003, 0.004, 0.005], 0.006, mtus={3: 1400}, black_holes={3})
+    _, result, _ = trace(monkeypatch, hops, timeout=0.2)
+    
+    assert result['reached'] and result['path_mtu'] == 1400
+    assert result['drops'] == [{'after_ttl': 3, 'from': 1500, 'to': 1400, 'black_hole': True}]
+    assert result['hops'][2]['next_mtu'] == 1400 and result['hops'][2]['black_hole']
+    assert [hop['mtu'] for hop in result['hops']] == [1500] * 3 + [1400] * 3
+
+def test_trailing_silent_hops_are_dropped(monkeypatch):
+    hops = FakeHops([0.001, 0.002, 0.003, 0.004], 0.005, silent={2, 4}, answering=False)
+    _, result, seen = trace(monkeypatch, hops, max_hops=8, timeout=0.1)
+    
+    # A silent hop between answering ones stays, the silence after the last does not
+    assert [hop['reply'] for hop in result['hops']] == ['time_exceeded', 'no_reply', 'time_exceeded']
+    assert not result['reached'] and result['path_mtu'] is None
+    assert seen == result['hops']
+
+def test_local_mtu_limits_the_first_wave(monkeypatch):
+    hops = FakeHops([0.001, 0.002], 0.003, mtus={0: 1400})
+    _, result, _ = trace(monkeypatch, hops, timeout=0.2)
+    
+    assert result['reached'] and result['path_mtu'] == 1400
+    assert result['drops'] == [{'after_ttl': 0, 'from': 1500, 'to': 1400, 'black_hole': False}]